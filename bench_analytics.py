@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the portfolio analytics refresh.
+
+Seeds a throwaway test database with N users and compares the legacy
+per-user analytics loop against the grouped aggregation engine, reporting
+query counts and wall-clock time for each user count.
+
+Needs no Redis: the cache is per-process and in memory unless
+CACHE_REDIS_URL names a Redis instance.
+
+Usage:
+    python bench_analytics.py                 # 50, 200 and 1000 users
+    python bench_analytics.py 100 500 2000    # custom user counts
+"""
+
+import os
+import sys
+import time
+from decimal import Decimal
+
+import django
+
+# Add the project directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Set up Django environment, on a local cache so that Redis is not needed
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finflow.settings')
+os.environ.setdefault('CACHE_REDIS_URL', 'locmem://')
+django.setup()
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from finflow.core.analytics import PortfolioAnalyticsEngine
+from finflow.core.models import User, Portfolio, Investment, Transaction
+from finflow.core.tasks import _generate_user_analytics
+
+SYMBOLS = ['AAPL', 'MSFT', 'GOOGL', 'TSLA', 'AMZN', 'NVDA', 'META', 'NFLX']
+DEFAULT_USER_COUNTS = [50, 200, 1000]
+
+
+def seed(total_users):
+    """Top the database up to ``total_users`` users with holdings."""
+    existing = User.objects.count()
+    new_users = [
+        User(username=f'bench{index}', email=f'bench{index}@example.com')
+        for index in range(existing, total_users)
+    ]
+    User.objects.bulk_create(new_users, batch_size=1000)
+    users = User.objects.filter(username__in=[user.username for user in new_users])
+
+    portfolios = Portfolio.objects.bulk_create(
+        [Portfolio(user=user, name='Main') for user in users], batch_size=1000
+    )
+    investments = Investment.objects.bulk_create(
+        [
+            Investment(
+                portfolio=portfolio,
+                symbol=symbol,
+                quantity=Decimal('10'),
+                purchase_price=Decimal('100.00'),
+            )
+            for portfolio in portfolios
+            for symbol in SYMBOLS[:4]
+        ],
+        batch_size=1000,
+    )
+    Transaction.objects.bulk_create(
+        [
+            Transaction(investment=investment, transaction_type=kind, amount=Decimal('100.00'))
+            for investment in investments
+            for kind in ('buy', 'sell')
+        ],
+        batch_size=1000,
+    )
+
+
+def run_legacy():
+    """The original per-user loop from refresh_portfolio_analytics."""
+    portfolios = Portfolio.objects.filter(is_active=True)
+    for user in User.objects.filter(is_active=True):
+        user_portfolios = portfolios.filter(user=user)
+        if user_portfolios.exists():
+            _generate_user_analytics(user, user_portfolios)
+
+
+def run_engine():
+    """The grouped aggregation engine."""
+    engine = PortfolioAnalyticsEngine()
+    engine.write_user_cache()
+    engine.global_analytics()
+
+
+def measure(func):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+    return len(queries), elapsed
+
+
+def main():
+    user_counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_USER_COUNTS
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"{'users':>8} | {'legacy queries':>14} {'legacy s':>9} | "
+              f"{'engine queries':>14} {'engine s':>9} | {'speedup':>7}")
+        print('-' * 74)
+        for total_users in sorted(user_counts):
+            seed(total_users)
+            legacy_queries, legacy_time = measure(run_legacy)
+            engine_queries, engine_time = measure(run_engine)
+            speedup = legacy_time / engine_time if engine_time else float('inf')
+            print(f"{total_users:>8} | {legacy_queries:>14} {legacy_time:>9.3f} | "
+                  f"{engine_queries:>14} {engine_time:>9.3f} | {speedup:>6.1f}x")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
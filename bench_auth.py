@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the authentication hot path.
+
+Seeds a throwaway test database with N users and compares, in requests
+per second:
+- login: the original ``iexact`` username/email lookup against the
+  ``lower()`` lookup the backend uses now, including the password check
+- session: the original uncached ``get_user`` against the cached one
+
+Passwords use a fast hasher so the numbers reflect the lookups rather
+than the deliberately slow production password hash.
+
+Needs no Redis: the cache is per-process and in memory unless
+CACHE_REDIS_URL names a Redis instance.
+
+Usage:
+    python bench_auth.py                 # 1000, 10000 and 50000 users
+    python bench_auth.py 500 5000        # custom user counts
+"""
+
+import logging
+import os
+import random
+import sys
+import time
+
+import django
+
+# Add the project directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Set up Django environment, on a local cache so that Redis is not needed
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finflow.settings')
+os.environ.setdefault('CACHE_REDIS_URL', 'locmem://')
+django.setup()
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import override_settings, setup_test_environment
+
+from finflow.core.backends import UsernameOrEmailBackend
+from finflow.core.models import User
+
+DEFAULT_USER_COUNTS = [1000, 10000, 50000]
+REQUESTS = 2000
+ACTIVE_USERS = 200  # users making the session requests, as in a busy minute
+PASSWORD = 'benchpass123'
+
+
+def seed(total_users):
+    """Top the database up to ``total_users`` users."""
+    existing = User.objects.count()
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        [
+            User(username=f'Bench{index}', email=f'Bench{index}@Example.com', password=password)
+            for index in range(existing, total_users)
+        ],
+        batch_size=1000,
+    )
+
+
+def legacy_login(login):
+    """The original case-insensitive lookup, which cannot use an index."""
+    user = User.objects.get(Q(username__iexact=login) | Q(email__iexact=login))
+    return user if user.check_password(PASSWORD) else None
+
+
+def legacy_get_user(user_id):
+    """The original uncached session lookup."""
+    user = User.objects.get(pk=user_id)
+    return user if user.is_active else None
+
+
+def rate(func, args):
+    started = time.perf_counter()
+    for arg in args:
+        func(arg)
+    return len(args) / (time.perf_counter() - started)
+
+
+def main():
+    user_counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_USER_COUNTS
+    # Keep the backend's per-login log lines out of the timings
+    logging.disable(logging.INFO)
+    backend = UsernameOrEmailBackend()
+    picker = random.Random(1)
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            print(f"{'users':>8} | {'legacy login/s':>14} {'login/s':>9} | "
+                  f"{'legacy session/s':>16} {'session/s':>10}")
+            print('-' * 68)
+            for total_users in sorted(user_counts):
+                seed(total_users)
+                indexes = [picker.randrange(total_users) for _ in range(REQUESTS)]
+                logins = [
+                    f'bench{index}' if index % 2 else f'bench{index}@example.com'
+                    for index in indexes
+                ]
+                active = list(User.objects.order_by('?').values_list('pk', flat=True)[:ACTIVE_USERS])
+                user_ids = [picker.choice(active) for _ in range(REQUESTS)]
+
+                legacy_logins = rate(legacy_login, logins)
+                logins_rate = rate(
+                    lambda login: backend.authenticate(None, username=login, password=PASSWORD),
+                    logins
+                )
+                legacy_sessions = rate(legacy_get_user, user_ids)
+                cache.clear()
+                sessions_rate = rate(backend.get_user, user_ids)
+                print(f"{total_users:>8} | {legacy_logins:>14.0f} {logins_rate:>9.0f} | "
+                      f"{legacy_sessions:>16.0f} {sessions_rate:>10.0f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
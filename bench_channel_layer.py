@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Load test for price tick broadcasts over the Redis channel layer.
+
+Spreads N simulated sockets over P processes, the way N WebSocket
+connections are spread over P ASGI workers. Each socket owns one channel
+subscribed to the price groups of a few symbols. The parent process then
+publishes rounds of ticks through PriceFeedPublisher and every process
+reports how long ticks took from publishing to delivery.
+
+Requires CHANNEL_REDIS_URLS, the comma-separated Redis URLs of the channel
+layer. Keys are written under their own prefix and flushed afterwards.
+
+Usage:
+    python bench_channel_layer.py              # 10000 sockets over 4 processes
+    python bench_channel_layer.py 2000 2       # custom sockets and processes
+"""
+
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+import django
+
+# Add the project directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finflow.settings')
+django.setup()
+
+from channels_redis.core import RedisChannelLayer
+from django.conf import settings
+
+from finflow.core.prices import PriceFeedPublisher, SimulatedPriceSource, price_group_name
+
+DEFAULT_SOCKETS = 10000
+DEFAULT_PROCESSES = 4
+SYMBOLS = [f'SYM{index}' for index in range(50)]
+SYMBOLS_PER_SOCKET = 5
+ROUNDS = 10
+ROUND_INTERVAL = 1.0  # seconds
+RECEIVE_TIMEOUT = 30  # seconds
+
+
+def make_layer():
+    config = dict(settings.CHANNEL_LAYERS['default']['CONFIG'], prefix='finflow-bench')
+    return RedisChannelLayer(**config)
+
+
+async def run_sockets(total_sockets, seed, ready, latencies):
+    """Subscribe ``total_sockets`` channels and time every tick they receive."""
+    layer = make_layer()
+    picker = random.Random(seed)
+    channels = []
+    for _ in range(total_sockets):
+        channel = await layer.new_channel()
+        for symbol in picker.sample(SYMBOLS, SYMBOLS_PER_SOCKET):
+            await layer.group_add(price_group_name(symbol), channel)
+        channels.append(channel)
+    ready.set()
+
+    received = []
+
+    async def receive(channel):
+        for _ in range(SYMBOLS_PER_SOCKET * ROUNDS):
+            message = await layer.receive(channel)
+            published = datetime.fromisoformat(message['tick']['timestamp'])
+            received.append((datetime.now(timezone.utc) - published).total_seconds() * 1000)
+
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(receive(channel) for channel in channels)), RECEIVE_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        pass
+    latencies.put(received)
+
+
+def socket_process(total_sockets, seed, ready, latencies):
+    asyncio.run(run_sockets(total_sockets, seed, ready, latencies))
+
+
+async def publish():
+    layer = make_layer()
+    publisher = PriceFeedPublisher(source=SimulatedPriceSource(seed=1), channel_layer=layer)
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        await publisher.publish(SYMBOLS)
+        print(f"  published {len(SYMBOLS)} ticks in {(time.perf_counter() - started) * 1000:.1f}ms")
+        await asyncio.sleep(ROUND_INTERVAL)
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    if not settings.CHANNEL_REDIS_HOSTS:
+        sys.exit('Set CHANNEL_REDIS_URLS to the Redis URLs of the channel layer to run this load test.')
+
+    total_sockets = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SOCKETS
+    total_processes = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PROCESSES
+
+    print(f"Connecting {total_sockets} sockets over {total_processes} processes "
+          f"({len(settings.CHANNEL_REDIS_HOSTS)} Redis shard(s))")
+    latencies = multiprocessing.Queue()
+    processes = []
+    for index in range(total_processes):
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(
+            target=socket_process,
+            args=(total_sockets // total_processes, index, ready, latencies)
+        )
+        process.start()
+        processes.append((process, ready))
+    for _, ready in processes:
+        ready.wait()
+
+    print(f"Publishing {ROUNDS} rounds of {len(SYMBOLS)} ticks")
+    asyncio.run(publish())
+
+    received = sorted(value for _ in processes for value in latencies.get())
+    for process, _ in processes:
+        process.join()
+    asyncio.run(make_layer().flush())
+
+    expected = total_sockets // total_processes * total_processes * SYMBOLS_PER_SOCKET * ROUNDS
+    print(f"\nDelivered {len(received)} of {expected} messages")
+    if received:
+        print(f"Latency p50 {percentile(received, 0.5):.1f}ms  "
+              f"p95 {percentile(received, 0.95):.1f}ms  "
+              f"p99 {percentile(received, 0.99):.1f}ms  "
+              f"max {received[-1]:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
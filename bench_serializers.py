@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the investment and transaction list serializers.
+
+Seeds a throwaway test database and compares the ModelSerializer classes
+used for writes and detail views against the ``.values()`` based read
+serializers used by the list endpoints, reporting rows per second for a
+page of each size.
+
+Needs no Redis: the cache is per-process and in memory unless
+CACHE_REDIS_URL names a Redis instance.
+
+Usage:
+    python bench_serializers.py               # pages of 20, 100 and 500 rows
+    python bench_serializers.py 50 1000       # custom page sizes
+"""
+
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+import django
+
+# Add the project directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Set up Django environment, on a local cache so that Redis is not needed
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finflow.settings')
+os.environ.setdefault('CACHE_REDIS_URL', 'locmem://')
+django.setup()
+
+from django.db import connection
+from django.db.models import Prefetch
+from django.test.utils import setup_test_environment
+
+from finflow.core.models import User, Portfolio, Investment, Transaction
+from finflow.core.serializers import (
+    InvestmentSerializer, TransactionSerializer,
+    InvestmentReadSerializer, TransactionReadSerializer
+)
+
+DEFAULT_PAGE_SIZES = [20, 100, 500]
+TRANSACTIONS_PER_INVESTMENT = 3
+REPEATS = 5
+
+
+def seed(total_investments):
+    """Create one portfolio holding ``total_investments`` investments."""
+    user = User.objects.create(username='bench', email='bench@example.com')
+    portfolio = Portfolio.objects.create(user=user, name='Main')
+    investments = Investment.objects.bulk_create(
+        [
+            Investment(
+                portfolio=portfolio,
+                symbol=f'SYM{index}',
+                quantity=Decimal('10.5'),
+                purchase_price=Decimal('100.25'),
+            )
+            for index in range(total_investments)
+        ],
+        batch_size=1000,
+    )
+    Transaction.objects.bulk_create(
+        [
+            Transaction(investment=investment, transaction_type=kind, amount=Decimal('100.00'))
+            for investment in investments
+            for kind in ('buy', 'sell', 'dividend')[:TRANSACTIONS_PER_INVESTMENT]
+        ],
+        batch_size=1000,
+    )
+
+
+def best_time(func):
+    """
+    Return the time of one call of ``func``, from the fastest of ``REPEATS`` batches.
+
+    Each batch runs for at least 0.2 seconds, so pages taking a couple of
+    milliseconds are not timed by single, noisy calls.
+    """
+    timer = timeit.Timer(func)
+    calls, _ = timer.autorange()
+    return min(timer.repeat(repeat=REPEATS, number=calls)) / calls
+
+
+def bench_transactions(page_size):
+    queryset = Transaction.objects.all()[:page_size]
+    rows = list(TransactionReadSerializer.values_queryset(Transaction.objects.all())[:page_size])
+    instances = list(queryset)
+    model = best_time(lambda: TransactionSerializer(instances, many=True).data)
+    fast = best_time(lambda: TransactionReadSerializer(rows, many=True).data)
+    return len(rows), model, fast
+
+
+def bench_investments(page_size):
+    # Both sides fetch the nested transactions of the page, so they are timed
+    # together with the rendering
+    def model():
+        investments = Investment.objects.prefetch_related(
+            Prefetch('transactions', queryset=Transaction.objects.all())
+        )[:page_size]
+        return InvestmentSerializer(investments, many=True).data
+
+    def fast():
+        rows = InvestmentReadSerializer.values_queryset(Investment.objects.all())[:page_size]
+        return InvestmentReadSerializer(rows, many=True).data
+
+    return min(page_size, Investment.objects.count()), best_time(model), best_time(fast)
+
+
+def main():
+    page_sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_PAGE_SIZES
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        seed(max(page_sizes))
+        print(f"{'serializer':>12} {'rows':>6} | {'model rows/s':>12} | "
+              f"{'read rows/s':>12} | {'speedup':>7}")
+        print('-' * 62)
+        for name, bench in (('transaction', bench_transactions), ('investment', bench_investments)):
+            for page_size in sorted(page_sizes):
+                rows, model_time, fast_time = bench(page_size)
+                print(f"{name:>12} {rows:>6} | {rows / model_time:>12,.0f} | "
+                      f"{rows / fast_time:>12,.0f} | {model_time / fast_time:>6.1f}x")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
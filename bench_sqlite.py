@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark for concurrent SQLite writers, stock backend against the tuned one.
+
+Starts W writer processes and R reader processes on a throwaway database
+file for a few seconds each. It runs twice: once with Django's stock
+``sqlite3`` backend, and once with the ``finflow.sqlite`` settings that
+finflow uses when DATABASE_URL is unset.
+- Writers run short read-then-write transactions, the way a trade or a
+  Celery ``health_check`` does.
+- Readers repeatedly scan the table, like list and analytics requests.
+
+It reports committed writes and reads per second, and how many
+transactions failed with "database is locked".
+
+Usage:
+    python bench_sqlite.py               # 4 writers, 4 readers, 10 seconds
+    python bench_sqlite.py 8 2 5         # custom writers, readers and seconds
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import django
+
+# Add the project directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finflow.settings')
+django.setup()
+
+from django.db import OperationalError, connections, transaction
+from django.db.utils import ConnectionHandler
+
+from finflow.database import sqlite_config
+
+DEFAULT_WRITERS = 4
+DEFAULT_READERS = 4
+DEFAULT_SECONDS = 10
+ALIAS = 'bench'
+
+
+def stock_config(path):
+    """Settings of Django's stock SQLite backend, as before the tuning."""
+    return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}
+
+
+def use_database(config):
+    """Register ``config`` as the ALIAS database in this process."""
+    if ALIAS in connections.settings:
+        # Drop the connection of the previous run or inherited from the parent
+        del connections[ALIAS]
+    connections.settings[ALIAS] = ConnectionHandler({'default': config}).settings['default']
+    return connections[ALIAS]
+
+
+def create_schema(config):
+    connection = use_database(config)
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE TABLE counters (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)')
+        cursor.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, counter_id INTEGER, payload TEXT)')
+        cursor.executemany('INSERT INTO counters (id, value) VALUES (%s, 0)', [(index,) for index in range(10)])
+    connection.close()
+
+
+def writer(config, worker, deadline, results):
+    connection = use_database(config)
+    committed = locked = 0
+    while time.time() < deadline:
+        counter_id = (worker + committed) % 10
+        try:
+            with transaction.atomic(using=ALIAS):
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT value FROM counters WHERE id = %s', [counter_id])
+                    value = cursor.fetchone()[0]
+                    cursor.execute('UPDATE counters SET value = %s WHERE id = %s', [value + 1, counter_id])
+                    cursor.execute(
+                        'INSERT INTO events (counter_id, payload) VALUES (%s, %s)',
+                        [counter_id, 'x' * 200]
+                    )
+            committed += 1
+        except OperationalError:
+            locked += 1
+    connection.close()
+    results.put(('write', committed, locked))
+
+
+def reader(config, deadline, results):
+    connection = use_database(config)
+    reads = locked = 0
+    while time.time() < deadline:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT counter_id, COUNT(*) FROM events GROUP BY counter_id')
+                cursor.fetchall()
+            reads += 1
+        except OperationalError:
+            locked += 1
+    connection.close()
+    results.put(('read', reads, locked))
+
+
+def run(name, config, writers, readers, seconds):
+    create_schema(config)
+    results = multiprocessing.Queue()
+    deadline = time.time() + seconds
+    processes = [
+        multiprocessing.Process(target=writer, args=(config, index, deadline, results))
+        for index in range(writers)
+    ] + [
+        multiprocessing.Process(target=reader, args=(config, deadline, results))
+        for _ in range(readers)
+    ]
+    for process in processes:
+        process.start()
+    totals = {'write': [0, 0], 'read': [0, 0]}
+    for _ in processes:
+        kind, done, locked = results.get()
+        totals[kind][0] += done
+        totals[kind][1] += locked
+    for process in processes:
+        process.join()
+
+    print(f"{name:>7} | {totals['write'][0] / seconds:>9.0f} {totals['write'][1]:>13} | "
+          f"{totals['read'][0] / seconds:>8.0f} {totals['read'][1]:>12}")
+
+
+def main():
+    args = [int(arg) for arg in sys.argv[1:4]]
+    writers, readers, seconds = args + [DEFAULT_WRITERS, DEFAULT_READERS, DEFAULT_SECONDS][len(args):]
+    # Each process opens its own connections to the file, like separate workers
+    multiprocessing.set_start_method('fork')
+
+    print(f"{writers} writers, {readers} readers, {seconds}s each")
+    print(f"{'backend':>7} | {'writes/s':>9} {'write locked':>13} | {'reads/s':>8} {'read locked':>12}")
+    print('-' * 60)
+    with tempfile.TemporaryDirectory() as directory:
+        run('stock', stock_config(os.path.join(directory, 'stock.sqlite3')), writers, readers, seconds)
+        run('tuned', sqlite_config(os.path.join(directory, 'tuned.sqlite3')), writers, readers, seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Connection-scale benchmark for the ws/portfolio/ WebSocket.
+
+Seeds users holding varied sets of symbols, opens N concurrent
+``ws/portfolio/`` connections spread over them and drives rounds of price
+ticks, then writes a JSON report with:
+- connect rate (connections per second until connection_established)
+- tick fan-out latency percentiles, from tick timestamp to client receipt
+- CPU and RSS per connection of the process serving the sockets
+
+Two modes:
+- In-process (default): runs the websocket routes on a throwaway test
+  database and the configured channel layer, with no network stack.
+  The harness publishes the ticks itself; CPU and RSS include the
+  harness's own clients.
+- Server (``--url``): connects to a running ASGI server with the
+  ``websockets`` package, logging in through session cookies of users
+  seeded into the configured database (removed afterwards). Ticks come
+  from the server's own price feed; pass ``--server-pid`` to sample the
+  server's CPU and RSS.
+
+Needs no Redis: the cache is per-process and in memory unless
+CACHE_REDIS_URL names a Redis instance.
+
+Usage:
+    python bench_websocket.py                          # 2000 in-process connections
+    python bench_websocket.py -n 10000 --output ws.json
+    python bench_websocket.py -n 5000 --url ws://localhost:8000/ws/portfolio/ --server-pid 4242
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import django
+
+# Add the project directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Set up Django environment, on a local cache so that Redis is not needed
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finflow.settings')
+os.environ.setdefault('CACHE_REDIS_URL', 'locmem://')
+django.setup()
+
+import msgpack
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.conf import settings
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+
+from finflow.core.models import User, Portfolio, Investment
+from finflow.core.prices import PriceFeedPublisher, SimulatedPriceSource
+from finflow.core.routing import websocket_urlpatterns
+from finflow.core.testing import WebsocketCommunicator
+
+SYMBOLS = [f'SYM{index:02d}' for index in range(50)]
+MIN_SYMBOLS_PER_USER = 3
+MAX_SYMBOLS_PER_USER = 10
+USERNAME_PREFIX = 'wsbench_'
+CONNECT_CONCURRENCY = 200
+DEFAULT_CONNECTIONS = 2000
+DEFAULT_ROUNDS = 10
+DEFAULT_INTERVAL = 1.0  # seconds between in-process tick rounds
+
+
+def seed(total_users, seed_value=1):
+    """Create users holding random sets of 3 to 10 symbols each."""
+    picker = random.Random(seed_value)
+    users = User.objects.bulk_create([
+        User(username=f'{USERNAME_PREFIX}{index}', email=f'{USERNAME_PREFIX}{index}@example.com')
+        for index in range(total_users)
+    ])
+    portfolios = Portfolio.objects.bulk_create([
+        Portfolio(user=user, name='Bench') for user in users
+    ])
+    Investment.objects.bulk_create(
+        [
+            Investment(
+                portfolio=portfolio,
+                symbol=symbol,
+                quantity=Decimal(picker.randint(1, 100)),
+                purchase_price=Decimal('100.00'),
+            )
+            for portfolio in portfolios
+            for symbol in picker.sample(
+                SYMBOLS, picker.randint(MIN_SYMBOLS_PER_USER, MAX_SYMBOLS_PER_USER)
+            )
+        ],
+        batch_size=1000,
+    )
+    return users
+
+
+def read_process(pid='self'):
+    """Return ``(cpu_seconds, rss_bytes)`` of a process from /proc."""
+    with open(f'/proc/{pid}/stat') as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    with open(f'/proc/{pid}/status') as status:
+        rss = next(int(line.split()[1]) * 1024 for line in status if line.startswith('VmRSS:'))
+    return cpu, rss
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda fraction: round(values[min(int(len(values) * fraction), len(values) - 1)], 2)
+    return {
+        'count': len(values),
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'max': round(values[-1], 2),
+    }
+
+
+class Client:
+    """Collects tick latencies for one connection."""
+
+    def __init__(self, encoding, latencies):
+        self.encoding = encoding
+        self.latencies = latencies
+
+    def handle(self, frame):
+        received = datetime.now(timezone.utc)
+        if isinstance(frame, bytes):
+            message = msgpack.unpackb(frame)
+        else:
+            message = json.loads(frame)
+        if message.get('type') == 'price_tick':
+            published = datetime.fromisoformat(message['timestamp'])
+            self.latencies.append((received - published).total_seconds() * 1000)
+
+
+async def open_connections(total, connect_one):
+    """Open ``total`` connections, at most CONNECT_CONCURRENCY at a time."""
+    limit = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+    async def limited(index):
+        async with limit:
+            return await connect_one(index)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(limited(index) for index in range(total)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    connections = [result for result in results if not isinstance(result, BaseException)]
+    errors = [repr(result) for result in results if isinstance(result, BaseException)]
+    return connections, elapsed, errors
+
+
+async def run_in_process(args, users):
+    application = URLRouter(websocket_urlpatterns)
+    latencies = []
+
+    async def connect_one(index):
+        communicator = WebsocketCommunicator(application, '/ws/portfolio/', user=users[index % len(users)])
+        connected, _ = await communicator.connect(timeout=30)
+        if not connected:
+            raise RuntimeError('Connection rejected')
+        await communicator.receive_from(timeout=30)  # connection_established
+        if args.encoding != 'json':
+            await communicator.send_json_to({'type': 'set_protocol', 'encoding': args.encoding})
+            await communicator.receive_from(timeout=30)  # protocol
+            await communicator.receive_from(timeout=30)  # portfolio_data
+        client = Client(args.encoding, latencies)
+
+        async def read():
+            while True:
+                message = await communicator.receive_output(timeout=None)
+                if message['type'] != 'websocket.send':
+                    return
+                client.handle(message.get('text', message.get('bytes')))
+
+        return communicator, asyncio.create_task(read())
+
+    cpu_before, rss_before = read_process()
+    connections, connect_seconds, errors = await open_connections(args.connections, connect_one)
+    cpu_connected, rss_connected = read_process()
+
+    publisher = PriceFeedPublisher(source=SimulatedPriceSource(seed=1), channel_layer=get_channel_layer())
+    for _ in range(args.rounds):
+        await publisher.publish()
+        await asyncio.sleep(args.interval)
+    cpu_done, _ = read_process()
+
+    for communicator, reader in connections:
+        reader.cancel()
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+    for communicator, _ in connections:
+        await communicator.wait(timeout=30)
+
+    return {
+        'connections': len(connections),
+        'connect_seconds': connect_seconds,
+        'connect_errors': errors,
+        'cpu': (cpu_before, cpu_connected, cpu_done),
+        'rss': (rss_before, rss_connected),
+        'tick_seconds': args.rounds * args.interval,
+        'latencies': latencies,
+    }
+
+
+def create_sessions(users):
+    """Return a session key logging in each of ``users``."""
+    from importlib import import_module
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+
+    store_class = import_module(settings.SESSION_ENGINE).SessionStore
+    keys = []
+    for user in users:
+        session = store_class()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        keys.append(session.session_key)
+    return keys
+
+
+async def run_against_server(args, users):
+    try:
+        import websockets
+    except ImportError:
+        sys.exit('Server mode needs the websockets package: pip install websockets')
+
+    session_keys = create_sessions(users)
+    latencies = []
+    pid = args.server_pid or 'self'
+
+    async def connect_one(index):
+        headers = {'Cookie': f'{settings.SESSION_COOKIE_NAME}={session_keys[index % len(session_keys)]}'}
+        socket = await websockets.connect(args.url, additional_headers=headers, max_queue=None)
+        await socket.recv()  # connection_established
+        if args.encoding != 'json':
+            await socket.send(json.dumps({'type': 'set_protocol', 'encoding': args.encoding}))
+            await socket.recv()  # protocol
+            await socket.recv()  # portfolio_data
+        client = Client(args.encoding, latencies)
+
+        async def read():
+            async for frame in socket:
+                client.handle(frame)
+
+        return socket, asyncio.create_task(read())
+
+    cpu_before, rss_before = read_process(pid)
+    connections, connect_seconds, errors = await open_connections(args.connections, connect_one)
+    cpu_connected, rss_connected = read_process(pid)
+
+    await asyncio.sleep(args.duration)
+    cpu_done, _ = read_process(pid)
+
+    for socket, reader in connections:
+        reader.cancel()
+        await socket.close()
+
+    return {
+        'connections': len(connections),
+        'connect_seconds': connect_seconds,
+        'connect_errors': errors,
+        'cpu': (cpu_before, cpu_connected, cpu_done),
+        'rss': (rss_before, rss_connected),
+        'tick_seconds': args.duration,
+        'latencies': latencies,
+    }
+
+
+def build_report(args, result):
+    connections = result['connections'] or 1
+    cpu_before, cpu_connected, cpu_done = result['cpu']
+    rss_before, rss_connected = result['rss']
+    return {
+        'mode': 'server' if args.url else 'in-process',
+        'url': args.url,
+        'channel_layer': settings.CHANNEL_LAYERS['default']['BACKEND'],
+        'encoding': args.encoding,
+        'users': args.users,
+        'connections': result['connections'],
+        'connect_errors': len(result['connect_errors']),
+        'first_connect_errors': result['connect_errors'][:5],
+        'connect_seconds': round(result['connect_seconds'], 3),
+        'connects_per_second': round(result['connections'] / result['connect_seconds'], 1)
+        if result['connect_seconds'] else None,
+        'tick_seconds': result['tick_seconds'],
+        'ticks_received': len(result['latencies']),
+        'tick_latency_ms': percentiles(result['latencies']),
+        'cpu_ms_per_connection': {
+            'connect': round((cpu_connected - cpu_before) * 1000 / connections, 3),
+            'per_tick_second': round(
+                (cpu_done - cpu_connected) * 1000 / connections / result['tick_seconds'], 3
+            ),
+        },
+        'rss_kib_per_connection': round((rss_connected - rss_before) / 1024 / connections, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ws/portfolio/ at many connections.')
+    parser.add_argument('-n', '--connections', type=int, default=DEFAULT_CONNECTIONS)
+    parser.add_argument('--users', type=int, help='Seeded users (default: one per 10 connections)')
+    parser.add_argument('--encoding', choices=['json', 'msgpack'], default='json')
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS,
+                        help='In-process tick rounds')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help='Seconds between in-process tick rounds')
+    parser.add_argument('--url', help='ws:// URL of a running ASGI server')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='Seconds to collect server ticks for')
+    parser.add_argument('--server-pid', type=int, help='Server process to sample CPU and RSS of')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args()
+    args.users = args.users or max(args.connections // 10, 1)
+
+    if args.url:
+        users = seed(args.users)
+        try:
+            result = asyncio.run(run_against_server(args, users))
+        finally:
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+    else:
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            # The harness publishes ticks itself so their timing is known
+            with override_settings(PRICE_FEED_IN_PROCESS=False):
+                result = asyncio.run(run_in_process(args, seed(args.users)))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    report = json.dumps(build_report(args, result), indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
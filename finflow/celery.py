@@ -24,6 +24,14 @@ app.conf.beat_schedule = {
             'priority': 5,
         }
     },
+    'rebuild-portfolio-analytics': {
+        'task': 'finflow.core.tasks.rebuild_portfolio_analytics',
+        'schedule': crontab(hour=3, minute=30),  # Run daily at 3:30 AM
+        'options': {
+            'queue': 'analytics',
+            'priority': 5,
+        }
+    },
     'cleanup-old-logs': {
         'task': 'finflow.core.tasks.cleanup_old_logs',
         'schedule': crontab(hour=2, minute=0),  # Run daily at 2 AM
@@ -42,11 +50,36 @@ app.conf.beat_schedule = {
     },
 }
 
+
+@app.on_after_configure.connect
+def schedule_price_feed(sender, **kwargs):
+    """
+    Publish market price ticks from beat when the ASGI processes do not run
+    the feed themselves. Reads settings only once Django has loaded them.
+    """
+    from django.conf import settings
+    
+    if settings.PRICE_FEED_IN_PROCESS:
+        return
+    sender.conf.beat_schedule['publish-price-ticks'] = {
+        'task': 'finflow.core.tasks.publish_price_ticks',
+        'schedule': float(settings.PRICE_TICK_INTERVAL),
+        'options': {
+            'queue': 'prices',
+            'expires': settings.PRICE_TICK_INTERVAL,  # A late tick is a stale tick
+        }
+    }
+
+
 # Celery Task Routes
 app.conf.task_routes = {
     'finflow.core.tasks.refresh_portfolio_analytics': {'queue': 'analytics'},
+    'finflow.core.tasks.rebuild_portfolio_analytics': {'queue': 'analytics'},
+    'finflow.core.tasks.refresh_user_analytics_chunk': {'queue': 'analytics'},
+    'finflow.core.tasks.reduce_portfolio_analytics': {'queue': 'analytics'},
     'finflow.core.tasks.cleanup_old_logs': {'queue': 'maintenance'},
     'finflow.core.tasks.health_check': {'queue': 'monitoring'},
+    'finflow.core.tasks.publish_price_ticks': {'queue': 'prices'},
     'finflow.core.tasks.*': {'queue': 'default'},
 }
 
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from django.db.models import Sum
-from .models import User, Portfolio, Investment, Transaction
+from .models import User, Portfolio, Investment, Transaction, PortfolioStats
 
 
 @admin.register(User)
@@ -131,6 +131,23 @@ class TransactionAdmin(admin.ModelAdmin):
     is_sell.short_description = 'Is Sell'
 
 
+@admin.register(PortfolioStats)
+class PortfolioStatsAdmin(admin.ModelAdmin):
+    """
+    Read-only admin for the denormalized portfolio stats rollup.
+    """
+    list_display = ('portfolio', 'investment_count', 'unique_symbols', 'total_invested',
+                    'transaction_count', 'last_activity', 'updated_at')
+    search_fields = ('portfolio__name', 'portfolio__user__username')
+    ordering = ('-last_activity',)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # Inline admin for Portfolio to show investments
 class InvestmentInline(admin.TabularInline):
     model = Investment
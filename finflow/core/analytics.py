@@ -0,0 +1,478 @@
+"""
+Grouped aggregation engine for portfolio analytics.
+
+Computes the global and every per-user portfolio metric in a fixed number
+of GROUP BY queries, regardless of how many users exist. Each query is
+ordered by user and streamed, so per-user payloads are assembled one user
+at a time and written to the cache in batches.
+
+Every user's share of the global totals (their "contribution") is kept in
+the analytics state store, so the global payload can be maintained with
+additive deltas when only a handful of users changed.
+
+Readers go through ``get_user_analytics``, which serves the precomputed
+payload and only computes one on demand when it is missing, was written
+under another schema version or predates the user's last write.
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .cache_keys import ANALYTICS_SCHEMA_VERSION, user_analytics_key
+from .data_versions import get_user_data_version
+from .models import Portfolio, Investment, Transaction
+
+logger = logging.getLogger(__name__)
+
+CACHE_TIMEOUT = 60 * 60 * 25  # Outlives the daily full rebuild
+
+# Rows fetched per round trip while streaming the grouped queries
+STREAM_CHUNK_SIZE = 2000
+
+# Per-user cache entries written per set_many() call
+CACHE_WRITE_BATCH_SIZE = 1000
+
+# Users handled by a single fan-out chunk of the hourly refresh
+USER_CHUNK_SIZE = 5000
+
+TOTAL_FIELDS = (
+    'total_portfolios',
+    'total_investments',
+    'total_invested',
+    'total_transactions',
+    'buy_transactions',
+    'sell_transactions',
+)
+
+
+class _UserGroupedRows:
+    """
+    Walk a user-ordered row iterator one user group at a time.
+    """
+
+    def __init__(self, rows, user_field):
+        self._rows = iter(rows)
+        self._user_field = user_field
+        self._head = next(self._rows, None)
+
+    def take(self, user_id):
+        """Return all consecutive rows belonging to ``user_id``."""
+        group = []
+        while self._head is not None and self._head[self._user_field] == user_id:
+            group.append(self._head)
+            self._head = next(self._rows, None)
+        return group
+
+
+class PortfolioAnalyticsEngine:
+    """
+    Single-pass analytics over a set of portfolios.
+
+    Issues three grouped queries (portfolios by user, investments by user and
+    symbol, transactions by user and type) and merges them in user order.
+    Global totals are accumulated while the per-user payloads are streamed,
+    so ``global_analytics()`` is only complete once iteration has finished.
+    """
+
+    def __init__(self, portfolios=None, chunk_size=STREAM_CHUNK_SIZE):
+        if portfolios is None:
+            portfolios = Portfolio.objects.filter(is_active=True)
+        self.portfolios = portfolios
+        self.chunk_size = chunk_size
+        self.generated_at = timezone.now()
+        self.symbol_holders = Counter()
+        self.totals = dict.fromkeys(TOTAL_FIELDS, 0)
+
+    def _portfolio_rows(self):
+        return (
+            self.portfolios
+            .values(
+                'user_id', 'user__username', 'user__is_active',
+                'user__risk_tolerance', 'user__investment_style',
+            )
+            .annotate(portfolios_count=Count('id'))
+            .order_by('user_id')
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+    def _symbol_rows(self):
+        return (
+            Investment.objects.filter(portfolio__in=self.portfolios)
+            .values('portfolio__user_id', 'symbol')
+            .annotate(
+                investments_count=Count('id'),
+                total_quantity=Sum('quantity'),
+                total_invested=Sum(F('quantity') * F('purchase_price')),
+            )
+            .order_by('portfolio__user_id', 'symbol')
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+    def _transaction_rows(self):
+        return (
+            Transaction.objects.filter(investment__portfolio__in=self.portfolios)
+            .values('investment__portfolio__user_id', 'transaction_type')
+            .annotate(transactions_count=Count('id'))
+            .order_by('investment__portfolio__user_id', 'transaction_type')
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+    def iter_user_analytics(self):
+        """
+        Yield one analytics payload per active user owning a portfolio.
+
+        Inactive users still contribute to the global totals but do not get
+        a payload of their own.
+        """
+        for is_active, payload in self._iter_payloads():
+            if is_active:
+                yield payload
+
+    def _iter_payloads(self):
+        """Yield ``(is_active, payload)`` for every owner of a portfolio."""
+        symbol_groups = _UserGroupedRows(self._symbol_rows(), 'portfolio__user_id')
+        transaction_groups = _UserGroupedRows(
+            self._transaction_rows(), 'investment__portfolio__user_id'
+        )
+        generated_at = self.generated_at.isoformat()
+
+        for portfolio_row in self._portfolio_rows():
+            user_id = portfolio_row['user_id']
+            payload = self._build_user_payload(
+                portfolio_row,
+                symbol_groups.take(user_id),
+                transaction_groups.take(user_id),
+            )
+            payload['generated_at'] = generated_at
+            payload['schema_version'] = ANALYTICS_SCHEMA_VERSION
+            yield portfolio_row['user__is_active'], payload
+
+    def _build_user_payload(self, portfolio_row, symbol_rows, transaction_rows):
+        symbol_performance = {}
+        investments_count = 0
+        total_invested = 0.0
+        for row in symbol_rows:
+            quantity = float(row['total_quantity'] or 0)
+            invested = float(row['total_invested'] or 0)
+            symbol_performance[row['symbol']] = {
+                'total_quantity': quantity,
+                'total_invested': invested,
+                'avg_price': invested / quantity if quantity > 0 else 0,
+            }
+            investments_count += row['investments_count']
+            total_invested += invested
+            self.symbol_holders[row['symbol']] += 1
+
+        by_type = {
+            row['transaction_type']: row['transactions_count']
+            for row in transaction_rows
+        }
+        transactions_count = sum(by_type.values())
+
+        self.totals['total_portfolios'] += portfolio_row['portfolios_count']
+        self.totals['total_investments'] += investments_count
+        self.totals['total_invested'] += total_invested
+        self.totals['total_transactions'] += transactions_count
+        self.totals['buy_transactions'] += by_type.get('buy', 0)
+        self.totals['sell_transactions'] += by_type.get('sell', 0)
+
+        return {
+            'user_id': portfolio_row['user_id'],
+            'username': portfolio_row['user__username'],
+            'portfolios_count': portfolio_row['portfolios_count'],
+            'investments_count': investments_count,
+            'unique_symbols': len(symbol_performance),
+            'total_invested': total_invested,
+            'transactions_count': transactions_count,
+            'buy_transactions': by_type.get('buy', 0),
+            'sell_transactions': by_type.get('sell', 0),
+            'symbol_performance': symbol_performance,
+            'risk_tolerance': portfolio_row['user__risk_tolerance'],
+            'investment_style': portfolio_row['user__investment_style'],
+        }
+
+    def global_analytics(self):
+        """Return the global metrics accumulated so far."""
+        return global_analytics_from_state(self.state(), self.generated_at)
+
+    def state(self):
+        """
+        Return the accumulated totals in the JSON-serializable shape kept by
+        the analytics state store. Chunk results in this shape are combined
+        with ``merge_partial_results``.
+        """
+        return {
+            'totals': dict(self.totals),
+            'symbol_holders': dict(self.symbol_holders),
+        }
+
+    def write_user_cache(self, timeout=CACHE_TIMEOUT, batch_size=CACHE_WRITE_BATCH_SIZE,
+                         state_store=None):
+        """
+        Stream every per-user payload into the cache using batched set_many().
+
+        Args:
+            timeout: Cache timeout for the per-user entries
+            batch_size: Number of users written per round trip
+            state_store: Optional ``AnalyticsStateStore``; when given, the
+                contribution of every streamed user is saved alongside
+
+        Returns:
+            Number of per-user cache entries written
+        """
+        entries = {}
+        contributions = {}
+        written = 0
+        for is_active, payload in self._iter_payloads():
+            contributions[payload['user_id']] = user_contribution(payload)
+            if is_active:
+                entries[user_analytics_key(payload['user_id'])] = payload
+            if len(contributions) >= batch_size:
+                written += _flush_user_batch(entries, contributions, timeout, state_store)
+                entries, contributions = {}, {}
+        if contributions:
+            written += _flush_user_batch(entries, contributions, timeout, state_store)
+        return written
+
+
+def _flush_user_batch(entries, contributions, timeout, state_store):
+    if entries:
+        cache.set_many(entries, timeout)
+    if state_store is not None:
+        state_store.save(contributions=contributions)
+    return len(entries)
+
+
+def user_contribution(payload):
+    """Return a user's share of the global totals from their analytics payload."""
+    return {
+        'totals': {
+            'total_portfolios': payload['portfolios_count'],
+            'total_investments': payload['investments_count'],
+            'total_invested': payload['total_invested'],
+            'total_transactions': payload['transactions_count'],
+            'buy_transactions': payload['buy_transactions'],
+            'sell_transactions': payload['sell_transactions'],
+        },
+        'symbols': sorted(payload['symbol_performance']),
+    }
+
+
+def empty_state():
+    """Return analytics state with nothing accumulated."""
+    return {'totals': dict.fromkeys(TOTAL_FIELDS, 0), 'symbol_holders': {}}
+
+
+def merge_partial_results(partials):
+    """
+    Combine per-chunk partial results into a single analytics state.
+
+    Args:
+        partials: Iterable of dicts returned by ``PortfolioAnalyticsEngine.state()``
+
+    Returns:
+        Analytics state covering every chunk
+    """
+    state = empty_state()
+    holders = Counter()
+    for partial in partials:
+        for field in TOTAL_FIELDS:
+            state['totals'][field] += partial['totals'][field]
+        holders.update(partial['symbol_holders'])
+    state['symbol_holders'] = dict(holders)
+    return state
+
+
+def apply_contribution_deltas(state, old_contributions, new_contributions):
+    """
+    Move ``state`` from the old to the new contributions of a set of users.
+
+    Users missing from either mapping contribute nothing on that side, which
+    covers users who just got their first portfolio or lost their last one.
+
+    Returns:
+        The updated state (``state`` is modified in place)
+    """
+    totals = state['totals']
+    holders = Counter(state['symbol_holders'])
+    for user_id in set(old_contributions) | set(new_contributions):
+        old = old_contributions.get(user_id)
+        new = new_contributions.get(user_id)
+        if old == new:
+            continue
+        if old is not None:
+            for field in TOTAL_FIELDS:
+                totals[field] -= old['totals'][field]
+            holders.subtract(old['symbols'])
+        if new is not None:
+            for field in TOTAL_FIELDS:
+                totals[field] += new['totals'][field]
+            holders.update(new['symbols'])
+    state['symbol_holders'] = {symbol: count for symbol, count in holders.items() if count > 0}
+    return state
+
+
+def global_analytics_from_state(state, generated_at=None):
+    """Build the global analytics payload from an analytics state."""
+    payload = {
+        'timestamp': (generated_at or timezone.now()).isoformat(),
+        'schema_version': ANALYTICS_SCHEMA_VERSION,
+    }
+    payload.update(state['totals'])
+    payload['unique_symbols'] = len(state['symbol_holders'])
+    return payload
+
+
+def refresh_users(user_ids, state, state_store, timeout=CACHE_TIMEOUT):
+    """
+    Recompute the analytics of ``user_ids`` and fold the change into ``state``.
+
+    Reads the users' previous contributions from the state store, streams
+    their new payloads with the grouped queries, applies the difference to
+    the global state and saves contributions and state in one atomic step.
+    Users that no longer own an active portfolio lose their cache entry and
+    their stored contribution.
+
+    Returns:
+        Number of per-user cache entries written
+    """
+    old_contributions = state_store.get_contributions(user_ids)
+    engine = PortfolioAnalyticsEngine(
+        Portfolio.objects.filter(is_active=True, user_id__in=user_ids)
+    )
+
+    entries = {}
+    new_contributions = {}
+    for is_active, payload in engine._iter_payloads():
+        new_contributions[payload['user_id']] = user_contribution(payload)
+        if is_active:
+            entries[user_analytics_key(payload['user_id'])] = payload
+
+    apply_contribution_deltas(state, old_contributions, new_contributions)
+    state_store.save(
+        contributions=new_contributions,
+        removed_user_ids=[user_id for user_id in user_ids if user_id not in new_contributions],
+        state=state,
+    )
+
+    stale_keys = [
+        user_analytics_key(user_id)
+        for user_id in user_ids if user_id not in new_contributions
+    ]
+    if entries:
+        cache.set_many(entries, timeout)
+    if stale_keys:
+        cache.delete_many(stale_keys)
+    return len(entries)
+
+
+def partition_user_ids(chunk_size=USER_CHUNK_SIZE, portfolios=None):
+    """
+    Split the owners of active portfolios into contiguous user ID ranges.
+
+    Streams the distinct owner IDs once and cuts a new range every
+    ``chunk_size`` users, so ranges stay balanced even when IDs are sparse.
+
+    Returns:
+        List of inclusive ``(first_user_id, last_user_id)`` tuples
+    """
+    if portfolios is None:
+        portfolios = Portfolio.objects.filter(is_active=True)
+    user_ids = (
+        portfolios.order_by('user_id')
+        .values_list('user_id', flat=True)
+        .distinct()
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+
+    ranges = []
+    first_id = last_id = None
+    count = 0
+    for user_id in user_ids:
+        if first_id is None:
+            first_id = user_id
+        last_id = user_id
+        count += 1
+        if count == chunk_size:
+            ranges.append((first_id, last_id))
+            first_id = None
+            count = 0
+    if first_id is not None:
+        ranges.append((first_id, last_id))
+    return ranges
+
+
+def is_current_payload(payload, data_version=0):
+    """
+    Return whether a cached user payload can still be served.
+
+    Args:
+        payload: Cached payload, or None
+        data_version: The user's current data version
+
+    Returns:
+        True if the payload has the current schema and was generated after
+        the write that set ``data_version``
+    """
+    if not isinstance(payload, dict) or payload.get('schema_version') != ANALYTICS_SCHEMA_VERSION:
+        return False
+    generated_at = datetime.fromisoformat(payload['generated_at'])
+    return generated_at.timestamp() * 1000 > data_version
+
+
+def empty_user_payload(user):
+    """Return the analytics payload of a user without active portfolios."""
+    return {
+        'user_id': user.id,
+        'username': user.username,
+        'portfolios_count': 0,
+        'investments_count': 0,
+        'unique_symbols': 0,
+        'total_invested': 0.0,
+        'transactions_count': 0,
+        'buy_transactions': 0,
+        'sell_transactions': 0,
+        'symbol_performance': {},
+        'risk_tolerance': user.risk_tolerance,
+        'investment_style': user.investment_style,
+        'generated_at': timezone.now().isoformat(),
+        'schema_version': ANALYTICS_SCHEMA_VERSION,
+    }
+
+
+def compute_user_analytics(user):
+    """Compute one user's analytics payload with the grouped queries."""
+    engine = PortfolioAnalyticsEngine(Portfolio.objects.filter(is_active=True, user_id=user.id))
+    for payload in engine.iter_user_analytics():
+        return payload
+    return empty_user_payload(user)
+
+
+def get_user_analytics(user, timeout=CACHE_TIMEOUT):
+    """
+    Return a user's analytics payload, preferring the precomputed one.
+
+    Payloads written by the analytics tasks are served as they are; one is
+    only computed here, and cached for the tasks to overwrite later, when
+    the entry is missing, was written under another schema version or was
+    generated before the user's last write.
+
+    Args:
+        user: User to return the analytics of
+        timeout: Cache timeout of a payload computed on demand
+
+    Returns:
+        The user's analytics payload
+    """
+    key = user_analytics_key(user.id)
+    payload = cache.get(key)
+    if is_current_payload(payload, get_user_data_version(user.id)):
+        return payload
+
+    payload = compute_user_analytics(user)
+    cache.set(key, payload, timeout)
+    return payload
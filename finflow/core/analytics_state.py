@@ -0,0 +1,114 @@
+"""
+Redis-backed state for incremental portfolio analytics.
+
+Holds three pieces of shared state used by the analytics tasks:
+- A set of user IDs whose portfolios changed since the last refresh
+- Each user's contribution to the global totals
+- The global analytics state those contributions add up to
+
+A lock serializes the incremental refresh against the full rebuild, since
+both rewrite contributions and the global state.
+"""
+
+import json
+import logging
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DIRTY_USERS_KEY = 'finflow:analytics:dirty_users'
+CONTRIBUTIONS_KEY = 'finflow:analytics:contributions'
+STATE_KEY = 'finflow:analytics:state'
+LOCK_KEY = 'finflow:analytics:lock'
+
+LOCK_TIMEOUT = 60 * 60  # Released early by the task holding it
+
+
+class AnalyticsStateStore:
+    """
+    Shared analytics state kept in Redis.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                settings.ANALYTICS_REDIS_URL, decode_responses=True
+            )
+        return self._client
+
+    # Dirty user tracking
+
+    def mark_dirty(self, user_ids):
+        """Record that the analytics of ``user_ids`` need recomputing."""
+        user_ids = [user_id for user_id in user_ids if user_id is not None]
+        if user_ids:
+            self.client.sadd(DIRTY_USERS_KEY, *user_ids)
+
+    def pop_dirty(self, count):
+        """Remove and return up to ``count`` dirty user IDs."""
+        return [int(user_id) for user_id in self.client.spop(DIRTY_USERS_KEY, count) or []]
+
+    def dirty_count(self):
+        return self.client.scard(DIRTY_USERS_KEY)
+
+    # Contributions and global state
+
+    def get_contributions(self, user_ids):
+        """Return ``{user_id: contribution}`` for users that have one stored."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        values = self.client.hmget(CONTRIBUTIONS_KEY, user_ids)
+        return {
+            user_id: json.loads(value)
+            for user_id, value in zip(user_ids, values)
+            if value is not None
+        }
+
+    def get_state(self):
+        value = self.client.get(STATE_KEY)
+        return json.loads(value) if value is not None else None
+
+    def save(self, contributions=None, removed_user_ids=(), state=None):
+        """
+        Atomically store contributions, drop removed users and replace the state.
+        """
+        pipe = self.client.pipeline(transaction=True)
+        if contributions:
+            pipe.hset(CONTRIBUTIONS_KEY, mapping={
+                user_id: json.dumps(contribution)
+                for user_id, contribution in contributions.items()
+            })
+        if removed_user_ids:
+            pipe.hdel(CONTRIBUTIONS_KEY, *removed_user_ids)
+        if state is not None:
+            pipe.set(STATE_KEY, json.dumps(state))
+        pipe.execute()
+
+    def reset(self):
+        """Forget all contributions and the global state ahead of a full rebuild."""
+        self.client.delete(CONTRIBUTIONS_KEY, STATE_KEY)
+
+    # Locking
+
+    def acquire_lock(self, timeout=LOCK_TIMEOUT):
+        return bool(self.client.set(LOCK_KEY, '1', nx=True, ex=timeout))
+
+    def release_lock(self):
+        self.client.delete(LOCK_KEY)
+
+
+_state_store = None
+
+
+def get_state_store():
+    """Return the process-wide analytics state store."""
+    global _state_store
+    if _state_store is None:
+        _state_store = AnalyticsStateStore()
+    return _state_store
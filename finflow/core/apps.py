@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finflow.core'
+
+    def ready(self):
+        # Register signal handlers
+        from . import signals  # noqa: F401
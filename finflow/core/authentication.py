@@ -0,0 +1,140 @@
+"""
+Token authentication for API clients with cached token lookups.
+
+Resolving a token normally joins ``authtoken_token`` to the user on every
+request. CachedTokenAuthentication resolves it in two cache tiers instead:
+- A small in-process LRU holding the user for a few seconds
+- The shared cache mapping the token to its user ID for a minute, with
+  the user itself coming from the authentication backend's user cache
+
+Cache keys hold a SHA-256 digest of the token, never the token itself.
+Deleting a token (as ``api_logout`` does) or deactivating its user drops
+the shared entries at once; other processes' LRU entries expire within
+TOKEN_AUTH_LOCAL_CACHE_TIMEOUT seconds.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .backends import cache_user, get_cached_user
+
+TOKEN_CACHE_KEY = 'auth_token_{digest}'
+
+
+def token_digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class LocalTTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire after a timeout.
+
+    Args:
+        max_size: Entries kept before the least recently used is evicted
+        timeout: Seconds an entry stays valid
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_matching(self, predicate):
+        """Delete every entry whose value satisfies ``predicate``."""
+        with self._lock:
+            for key in [key for key, (_, value) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local_tokens = None
+
+
+def get_local_token_cache():
+    """Return this process's token LRU, sized by the TOKEN_AUTH_LOCAL_CACHE_* settings."""
+    global _local_tokens
+    if _local_tokens is None:
+        _local_tokens = LocalTTLCache(
+            settings.TOKEN_AUTH_LOCAL_CACHE_SIZE, settings.TOKEN_AUTH_LOCAL_CACHE_TIMEOUT
+        )
+    return _local_tokens
+
+
+def invalidate_cached_token(key):
+    """Forget the cached resolution of token ``key``."""
+    digest = token_digest(key)
+    cache.delete(TOKEN_CACHE_KEY.format(digest=digest))
+    get_local_token_cache().delete(digest)
+
+
+def invalidate_user_tokens(user_id):
+    """Forget this process's cached tokens of a user, e.g. once deactivated."""
+    get_local_token_cache().delete_matching(lambda user: user.pk == user_id)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication resolving tokens through the local and shared caches.
+
+    Clients authenticate exactly as with TokenAuthentication, using an
+    ``Authorization: Token <key>`` header.
+    """
+
+    def authenticate_credentials(self, key):
+        digest = token_digest(key)
+        local_tokens = get_local_token_cache()
+        user = local_tokens.get(digest)
+
+        if user is None:
+            cache_key = TOKEN_CACHE_KEY.format(digest=digest)
+            user_id = cache.get(cache_key)
+            if user_id is not None:
+                user = get_cached_user(user_id)
+            if user is None:
+                try:
+                    token = self.get_model().objects.select_related('user').get(key=key)
+                except self.get_model().DoesNotExist:
+                    raise AuthenticationFailed(_('Invalid token.'))
+                user = token.user
+                cache.set(cache_key, user.pk, settings.TOKEN_AUTH_CACHE_TIMEOUT)
+                cache_user(user)
+            local_tokens.set(digest, user)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, self.get_model()(key=key, user=user))
@@ -1,13 +1,49 @@
 import logging
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.db.models import Q
+from django.db.models.functions import Lower
 from django.utils import timezone
 
+from .throttling import get_client_ip, record_login_failure
+
 logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
+# Bump when the cached User fields change shape, so old entries are ignored
+USER_CACHE_VERSION = 1
+USER_CACHE_KEY = 'auth_user_v{version}_{user_id}'
+USER_CACHE_TIMEOUT = 60 * 5
+
+
+def user_cache_key(user_id):
+    return USER_CACHE_KEY.format(version=USER_CACHE_VERSION, user_id=user_id)
+
+
+def get_cached_user(user_id):
+    """Return the user with ``user_id`` from the cache or the database, or None."""
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        try:
+            user = User.objects.get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        cache_user(user)
+    return user
+
+
+def cache_user(user):
+    """Store a freshly loaded user for later get_cached_user() calls."""
+    cache.set(user_cache_key(user.pk), user, USER_CACHE_TIMEOUT)
+
+
+def invalidate_cached_user(user_id):
+    """Drop the cached copy of a user, e.g. after it was saved or deleted."""
+    cache.delete(user_cache_key(user_id))
+
 
 class UsernameOrEmailBackend(ModelBackend):
     """
@@ -34,10 +70,12 @@ class UsernameOrEmailBackend(ModelBackend):
             return None
             
         try:
-            # Try to find user by username or email
-            user = User.objects.get(
-                Q(username__iexact=username) | Q(email__iexact=username)
-            )
+            # Try to find user by username or email, matching the lower() indexes
+            login = username.lower()
+            user = User.objects.alias(
+                username_lower=Lower('username'),
+                email_lower=Lower('email'),
+            ).get(Q(username_lower=login) | Q(email_lower=login))
             
             # Check if user account is active
             if not user.is_active:
@@ -51,9 +89,11 @@ class UsernameOrEmailBackend(ModelBackend):
             # Verify password
             if user.check_password(password):
                 # Log successful authentication
+                client_ip = self._get_client_ip(request)
                 logger.info(
                     f"Successful authentication for user: {user.username} "
-                    f"(IP: {self._get_client_ip(request)})"
+                    f"(IP: {client_ip})",
+                    extra={'event': 'login_succeeded', 'username': user.username, 'ip': client_ip}
                 )
                 return user
             else:
@@ -95,22 +135,24 @@ class UsernameOrEmailBackend(ModelBackend):
         """
         Get user by ID.
         
+        Runs for every session-authenticated request and WebSocket connect,
+        so users are served from the cache until they are next saved.
+        
         Args:
             user_id: User ID
             
         Returns:
             User object if found and active, None otherwise
         """
-        try:
-            user = User.objects.get(pk=user_id)
-            return user if user.is_active else None
-        except User.DoesNotExist:
-            return None
+        user = get_cached_user(user_id)
+        return user if user is not None and user.is_active else None
     
     def _log_failed_attempt(self, username, reason, request=None, user_found=True):
         """
         Log failed authentication attempts for security monitoring.
         
+        The attempt is also counted towards the login throttle.
+        
         Args:
             username: Username or email that was attempted
             reason: Reason for failure
@@ -119,19 +161,30 @@ class UsernameOrEmailBackend(ModelBackend):
         """
         client_ip = self._get_client_ip(request)
         user_agent = self._get_user_agent(request)
+        record_login_failure(client_ip, username)
+        event = {
+            'event': 'login_failed',
+            'username': username,
+            'reason': reason,
+            'user_found': user_found,
+            'ip': client_ip,
+            'user_agent': user_agent,
+        }
         
         # Log with appropriate level based on severity
         if user_found:
             # More serious - someone tried to access an existing account
             logger.warning(
                 f"Failed authentication attempt - {reason} for user: {username} "
-                f"(IP: {client_ip}, User-Agent: {user_agent})"
+                f"(IP: {client_ip}, User-Agent: {user_agent})",
+                extra=event
             )
         else:
             # Less serious - someone tried a non-existent username/email
             logger.info(
                 f"Failed authentication attempt - {reason} for username/email: {username} "
-                f"(IP: {client_ip}, User-Agent: {user_agent})"
+                f"(IP: {client_ip}, User-Agent: {user_agent})",
+                extra=event
             )
     
     def _get_client_ip(self, request):
@@ -144,17 +197,7 @@ class UsernameOrEmailBackend(ModelBackend):
         Returns:
             Client IP address as string
         """
-        if not request:
-            return "Unknown"
-            
-        # Check for forwarded IP first (in case of proxy/load balancer)
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            # Take the first IP in the chain
-            return x_forwarded_for.split(',')[0].strip()
-        
-        # Fall back to remote address
-        return request.META.get('REMOTE_ADDR', 'Unknown')
+        return get_client_ip(request)
     
     def _get_user_agent(self, request):
         """
@@ -0,0 +1,170 @@
+"""
+Two-tier cache backend: a small in-process L1 in front of a shared L2.
+
+Every process (web, ASGI and Celery) reads and writes the same L2, usually
+Redis, so a payload computed by a Celery task is served by the web tier.
+Read-heavy keys are also kept in an in-process L1 for a few seconds, which
+saves the L2 round trip and unpickling for hot entries such as users and
+analytics payloads.
+
+Only keys starting with one of ``L1_KEY_PREFIXES`` go through L1; anything
+that is mutated from several processes at once, such as rate-limit
+buckets, counters and price ticks, stays L2-only. Writes and deletes go
+through to both tiers, but another process's L1 copy of a key may be
+served for up to ``L1_TIMEOUT`` seconds after it changed. Data that must
+never be served stale should be read under a versioned key: bumping the
+version (``version=``, ``incr_version()`` or a version number embedded in
+the key) moves readers to a key no L1 holds yet.
+
+Configured like any Django cache, with LOCATION naming the L2 alias::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'finflow.core.cache_backends.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'L1_TIMEOUT': 5,
+                'L1_MAX_ENTRIES': 10000,
+                'L1_KEY_PREFIXES': ['auth_user_', 'portfolio_analytics_'],
+            },
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://localhost:6379/2',
+        },
+    }
+"""
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+_missing = object()
+
+
+class TieredCache(BaseCache):
+    """
+    Cache reading through an in-process LocMemCache (L1) to a shared cache (L2).
+
+    Args:
+        location: Alias of the shared L2 cache in CACHES
+        params: Cache settings; OPTIONS may set L1_TIMEOUT, L1_MAX_ENTRIES
+            and L1_KEY_PREFIXES
+    """
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS', {}))
+        self.l2_alias = location
+        self.l1_timeout = options.pop('L1_TIMEOUT', 5)
+        l1_max_entries = options.pop('L1_MAX_ENTRIES', 10000)
+        self.l1_key_prefixes = tuple(options.pop('L1_KEY_PREFIXES', ()))
+        super().__init__({**params, 'OPTIONS': options})
+        # LocMemCache instances of the same name share storage, so every
+        # thread's instance of this cache shares one L1 per process
+        self.l1 = LocMemCache(
+            f'finflow-l1-{location}',
+            {'TIMEOUT': self.l1_timeout, 'OPTIONS': {'MAX_ENTRIES': l1_max_entries}},
+        )
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    def in_l1(self, key):
+        return key.startswith(self.l1_key_prefixes)
+
+    def _version(self, version):
+        return self.version if version is None else version
+
+    def _l1_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.l1_timeout
+        return min(timeout, self.l1_timeout)
+
+    def get(self, key, default=None, version=None):
+        version = self._version(version)
+        if self.in_l1(key):
+            value = self.l1.get(key, _missing, version=version)
+            if value is not _missing:
+                return value
+        value = self.l2.get(key, _missing, version=version)
+        if value is _missing:
+            return default
+        if self.in_l1(key):
+            self.l1.set(key, value, version=version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        self.l2.set(key, value, timeout, version=version)
+        if self.in_l1(key):
+            self.l1.set(key, value, self._l1_timeout(timeout), version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        added = self.l2.add(key, value, timeout, version=version)
+        if added and self.in_l1(key):
+            self.l1.set(key, value, self._l1_timeout(timeout), version=version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        version = self._version(version)
+        self.l1.delete(key, version=version)
+        return self.l2.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        version = self._version(version)
+        return (
+            self.in_l1(key) and self.l1.has_key(key, version=version)
+        ) or self.l2.has_key(key, version=version)
+
+    def get_many(self, keys, version=None):
+        version = self._version(version)
+        keys = list(keys)
+        l1_keys = [key for key in keys if self.in_l1(key)]
+        found = self.l1.get_many(l1_keys, version=version) if l1_keys else {}
+        missing = [key for key in keys if key not in found]
+        if missing:
+            fetched = self.l2.get_many(missing, version=version)
+            l1_entries = {key: value for key, value in fetched.items() if self.in_l1(key)}
+            if l1_entries:
+                self.l1.set_many(l1_entries, version=version)
+            found.update(fetched)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        failed = self.l2.set_many(data, timeout, version=version)
+        l1_entries = {
+            key: value for key, value in data.items() if self.in_l1(key) and key not in failed
+        }
+        if l1_entries:
+            self.l1.set_many(l1_entries, self._l1_timeout(timeout), version=version)
+        return failed
+
+    def delete_many(self, keys, version=None):
+        version = self._version(version)
+        keys = list(keys)
+        self.l1.delete_many(keys, version=version)
+        self.l2.delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        version = self._version(version)
+        self.l1.delete(key, version=version)
+        return self.l2.incr(key, delta, version=version)
+
+    def clear(self):
+        """Clear both tiers; other processes' L1 entries still expire on their own."""
+        self.l1.clear()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
@@ -0,0 +1,61 @@
+"""
+Cache keys shared between the Celery tasks, the views and the consumers.
+
+Every entry written by one component and read by another is named here,
+so writers and readers cannot drift apart.
+
+Analytics payloads are schema-versioned: ANALYTICS_SCHEMA_VERSION is part
+of their keys and of the payloads themselves. Bump it whenever the payload
+shape changes; every process then stops reading entries in the old shape
+and recomputes or waits for the next precomputation instead.
+"""
+
+ANALYTICS_SCHEMA_VERSION = 1
+
+GLOBAL_ANALYTICS_KEY = 'portfolio_analytics_v{schema}_global'
+USER_ANALYTICS_KEY = 'portfolio_analytics_v{schema}_user_{user_id}'
+PORTFOLIO_REPORT_KEY = 'portfolio_report_user_{user_id}_{date}'
+
+# Entries embedding a user's data version are replaced, not updated, on writes
+USER_DATA_VERSION_KEY = 'user_data_version_{user_id}'
+ANALYTICS_PAGE_KEY = 'portfolio_analytics_v{schema}_page_{user_id}_{version}'
+PORTFOLIO_SUMMARY_KEY = 'portfolio_summary_user_{user_id}_{portfolio_id}_{version}'
+
+# Owner of a background import, so only they can read its progress
+IMPORT_OWNER_KEY = 'import_owner_{task_id}'
+
+LATEST_PRICE_KEY = 'price_latest_{symbol}'
+HELD_SYMBOLS_KEY = 'price_feed_held_symbols'
+
+
+def global_analytics_key():
+    return GLOBAL_ANALYTICS_KEY.format(schema=ANALYTICS_SCHEMA_VERSION)
+
+
+def user_analytics_key(user_id):
+    return USER_ANALYTICS_KEY.format(schema=ANALYTICS_SCHEMA_VERSION, user_id=user_id)
+
+
+def portfolio_report_key(user_id, date):
+    """Key of a user's portfolio report for the day of ``date``, a date or datetime."""
+    return PORTFOLIO_REPORT_KEY.format(user_id=user_id, date=date.strftime('%Y%m%d'))
+
+
+def import_owner_key(task_id):
+    return IMPORT_OWNER_KEY.format(task_id=task_id)
+
+
+def user_data_version_key(user_id):
+    return USER_DATA_VERSION_KEY.format(user_id=user_id)
+
+
+def analytics_page_key(user_id, version):
+    return ANALYTICS_PAGE_KEY.format(schema=ANALYTICS_SCHEMA_VERSION, user_id=user_id, version=version)
+
+
+def portfolio_summary_key(user_id, portfolio_id, version):
+    return PORTFOLIO_SUMMARY_KEY.format(user_id=user_id, portfolio_id=portfolio_id, version=version)
+
+
+def latest_price_key(symbol):
+    return LATEST_PRICE_KEY.format(symbol=symbol)
@@ -1,10 +1,147 @@
-import json
 import asyncio
-import random
-from decimal import Decimal
+import json
+import logging
+import time
 from datetime import datetime
+import msgpack
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db.models import Sum, F
+
+from .models import Investment
+from .outbound import OutboundQueue, OutboundQueueFull, websocket_metrics
+from .prices import ensure_in_process_feed, get_latest_ticks, price_group_name
+
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_ENCODINGS = ('json', 'msgpack')
+
+# "Try Again Later": the client is reading too slowly to keep up
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+# Delta frames carry only the fields that changed since the last frame, under
+# these short keys: {'t': 'd', 'n': seq, 's': symbol, 'p': 175.2, 'tv': 1752.0}
+POSITION_DELTA_KEYS = {
+    'price': 'p',
+    'change': 'c',
+    'change_percent': 'cp',
+    'value': 'v',
+}
+TOTAL_DELTA_KEYS = {
+    'total_value': 'tv',
+    'total_change': 'tc',
+    'total_change_percent': 'tp',
+}
+
+
+def positions_group_name(user_id):
+    """Return the group notified when a user's positions change."""
+    return f'positions.{user_id}'
+
+
+def _extend_encoded(text, fields):
+    """Append ``fields`` to an already JSON-encoded object without decoding it."""
+    return f'{text[:-1]}, {json.dumps(fields)[1:]}'
+
+
+class PortfolioValuation:
+    """
+    In-memory mark-to-market valuation of one user's positions.
+    
+    Totals are adjusted by the difference each tick makes to its symbol,
+    so applying a tick costs the same however many positions are held.
+    """
+    
+    def __init__(self, holdings, ticks):
+        """
+        Args:
+            holdings: Rows with ``symbol``, ``total_quantity`` and ``cost``
+            ticks: Latest known tick per symbol, as from get_latest_ticks()
+        """
+        self.positions = {}
+        self.total_value = 0.0
+        self.total_change = 0.0
+        for holding in holdings:
+            quantity = float(holding['total_quantity'])
+            tick = ticks.get(holding['symbol'])
+            if tick:
+                price, change, change_percent = tick['price'], tick['change'], tick['change_percent']
+            else:
+                # Until the feed has priced a symbol, value it at cost
+                price = float(holding['cost']) / quantity if quantity else 0.0
+                change, change_percent = 0.0, 0.0
+            self.positions[holding['symbol']] = {
+                'quantity': quantity,
+                'price': price,
+                'change': change,
+                'change_percent': change_percent,
+            }
+            self.total_value += price * quantity
+            self.total_change += change * quantity
+    
+    @property
+    def symbols(self):
+        return list(self.positions)
+    
+    @property
+    def total_change_percent(self):
+        opening_value = self.total_value - self.total_change
+        return round(self.total_change / opening_value * 100, 2) if opening_value else 0.0
+    
+    def apply_tick(self, tick):
+        """
+        Revalue the position in ``tick['symbol']``.
+        
+        Returns:
+            dict: The position value and new portfolio totals, or None if the
+            symbol is not held
+        """
+        position = self.positions.get(tick['symbol'])
+        if position is None:
+            return None
+        quantity = position['quantity']
+        self.total_value += (tick['price'] - position['price']) * quantity
+        self.total_change += (tick['change'] - position['change']) * quantity
+        position['price'] = tick['price']
+        position['change'] = tick['change']
+        position['change_percent'] = tick['change_percent']
+        return self.position_fields(tick['symbol'])
+    
+    def position_fields(self, symbol):
+        """Return the value of ``symbol``'s position and the portfolio totals, or None if not held."""
+        position = self.positions.get(symbol)
+        if position is None:
+            return None
+        return {
+            'value': round(position['price'] * position['quantity'], 2),
+            'total_value': round(self.total_value, 2),
+            'total_change': round(self.total_change, 2),
+            'total_change_percent': self.total_change_percent,
+        }
+    
+    def snapshot(self):
+        """Return the full valuation in the portfolio_data message format."""
+        return {
+            'portfolio_id': 'all',
+            'portfolio_name': 'All Portfolios',
+            'total_value': round(self.total_value, 2),
+            'total_change': round(self.total_change, 2),
+            'total_change_percent': self.total_change_percent,
+            'investments': [
+                {
+                    'symbol': symbol,
+                    'name': symbol,
+                    'current_price': position['price'],
+                    'change': position['change'],
+                    'change_percent': position['change_percent'],
+                    'quantity': position['quantity'],
+                    'value': round(position['price'] * position['quantity'], 2)
+                }
+                for symbol, position in sorted(self.positions.items())
+            ]
+        }
 
 
 class PortfolioConsumer(AsyncWebsocketConsumer):
@@ -13,15 +150,37 @@ class PortfolioConsumer(AsyncWebsocketConsumer):
     
     Features:
     - Accepts WebSocket connections at ws/portfolio/
-    - Broadcasts random portfolio price updates every 5 seconds
-    - Supports user-specific portfolio data
+    - Loads the user's positions once and values them in memory
+    - Subscribes to the shared price feed for the symbols the user holds
+    - Extends each pre-encoded price tick with the new valuation
+    - Lets clients opt into delta frames and msgpack binary encoding
+    - Sends through a bounded queue that keeps only the latest tick per
+      symbol, and disconnects clients that stop reading
     - Handles connection/disconnection gracefully
+    
+    Protocol:
+    Clients start on JSON text frames carrying whole ticks. Sending
+    ``{"type": "set_protocol", "encoding": "msgpack", "delta": true}``
+    switches to binary msgpack frames and/or delta frames. Delta frames
+    carry a sequence number; a full ``portfolio_data`` snapshot follows the
+    switch, every PORTFOLIO_SNAPSHOT_INTERVAL seconds, and any
+    ``get_portfolio_data`` request, so clients that miss a frame can resync.
     """
     
     async def connect(self):
         """Handle WebSocket connection."""
         self.room_group_name = 'portfolio_updates'
         self.user = self.scope.get("user")
+        self.price_groups = []
+        self.positions_group_name = None
+        self.updates_enabled = True
+        self.encoding = 'json'
+        self.delta = False
+        self.frame_seq = 0
+        self.sent_fields = {}
+        self.last_snapshot = 0.0
+        self.outbound = OutboundQueue(settings.WEBSOCKET_OUTBOUND_QUEUE_SIZE)
+        self.writer = None
         
         # Join room group
         await self.channel_layer.group_add(
@@ -29,18 +188,25 @@ class PortfolioConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
+        # Load positions and subscribe to the price feed
+        self.valuation = await self.load_valuation()
+        if self.is_authenticated():
+            self.positions_group_name = positions_group_name(self.user.id)
+            await self.channel_layer.group_add(self.positions_group_name, self.channel_name)
+        ensure_in_process_feed()
+        await self.start_price_updates()
+        
         await self.accept()
+        websocket_metrics.connections += 1
+        self.writer = asyncio.create_task(self.write_outbound())
         
         # Send initial connection confirmation
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'connection_established',
             'message': 'Connected to portfolio price feed',
             'timestamp': datetime.now().isoformat(),
             'user': getattr(self.user, 'username', 'anonymous') if self.user else 'anonymous'
-        }))
-        
-        # Start the price update loop
-        await self.start_price_updates()
+        })
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
@@ -49,157 +215,257 @@ class PortfolioConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        if self.positions_group_name:
+            await self.channel_layer.group_discard(self.positions_group_name, self.channel_name)
+        await self.stop_price_updates()
+        
+        if self.writer:
+            self.writer.cancel()
+            websocket_metrics.connections -= 1
+        self.outbound.clear()
     
-    async def receive(self, text_data):
-        """Handle messages received from WebSocket."""
+    async def receive(self, text_data=None, bytes_data=None):
+        """Handle JSON text or msgpack binary messages received from WebSocket."""
         try:
-            text_data_json = json.loads(text_data)
-            message_type = text_data_json.get('type', '')
+            if bytes_data is not None:
+                message = msgpack.unpackb(bytes_data)
+            else:
+                message = json.loads(text_data)
+            message_type = message.get('type', '')
             
             if message_type == 'get_portfolio_data':
                 # Send current portfolio data
-                portfolio_data = await self.get_user_portfolio_data()
-                await self.send(text_data=json.dumps({
-                    'type': 'portfolio_data',
-                    'data': portfolio_data,
-                    'timestamp': datetime.now().isoformat()
-                }))
+                await self.send_snapshot()
+            
+            elif message_type == 'set_protocol':
+                await self.set_protocol(message)
             
             elif message_type == 'start_updates':
                 # Start price updates
+                self.updates_enabled = True
                 await self.start_price_updates()
             
             elif message_type == 'stop_updates':
                 # Stop price updates
+                self.updates_enabled = False
                 await self.stop_price_updates()
                 
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+        except ValueError:
+            # Covers json.JSONDecodeError and msgpack's unpacking errors
+            await self.send_frame({
                 'type': 'error',
-                'message': 'Invalid JSON format'
-            }))
+                'message': 'Invalid JSON format' if bytes_data is None else 'Invalid msgpack format'
+            })
         except Exception as e:
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 'type': 'error',
                 'message': f'Error processing message: {str(e)}'
-            }))
+            })
     
-    async def start_price_updates(self):
-        """Start broadcasting price updates every 5 seconds."""
-        if hasattr(self, 'update_task') and not self.update_task.done():
-            return  # Already running
+    async def set_protocol(self, options):
+        """Switch the frame encoding and delta mode, then send a snapshot to resync on."""
+        encoding = options.get('encoding', 'json')
+        if encoding not in PROTOCOL_ENCODINGS:
+            await self.send_frame({
+                'type': 'error',
+                'message': f"Unsupported encoding {encoding!r}; expected one of {', '.join(PROTOCOL_ENCODINGS)}"
+            })
+            return
         
-        self.update_task = asyncio.create_task(self.price_update_loop())
+        self.encoding = encoding
+        self.delta = bool(options.get('delta', False))
+        await self.send_frame({
+            'type': 'protocol',
+            'encoding': self.encoding,
+            'delta': self.delta,
+            'snapshot_interval': settings.PORTFOLIO_SNAPSHOT_INTERVAL,
+        })
+        await self.send_snapshot()
     
-    async def stop_price_updates(self):
-        """Stop broadcasting price updates."""
-        if hasattr(self, 'update_task'):
-            self.update_task.cancel()
-            try:
-                await self.update_task
-            except asyncio.CancelledError:
-                pass
+    def encode_frame(self, frame):
+        """Return the send() arguments for ``frame`` in the negotiated encoding."""
+        if self.encoding == 'msgpack':
+            return {'bytes_data': msgpack.packb(frame)}
+        return {'text_data': json.dumps(frame)}
+    
+    async def send_frame(self, frame):
+        """Queue ``frame`` to be sent in the negotiated encoding."""
+        await self.enqueue(lambda: self.encode_frame(frame))
+    
+    async def send_snapshot(self):
+        """Queue the full valuation, to be taken when the frame is sent."""
+        await self.enqueue(self.render_snapshot, key='snapshot')
     
-    async def price_update_loop(self):
-        """Main loop for broadcasting price updates."""
+    async def enqueue(self, render, key=None):
+        """Queue a frame renderer, disconnecting the client if it has fallen too far behind."""
+        if self.writer is None or self.writer.done():
+            return  # Closing
         try:
-            while True:
-                # Generate mock price data
-                price_data = await self.generate_mock_price_data()
-                
-                # Send to WebSocket
-                await self.send(text_data=json.dumps({
-                    'type': 'price_update',
-                    'data': price_data,
-                    'timestamp': datetime.now().isoformat()
-                }))
-                
-                # Wait 5 seconds
-                await asyncio.sleep(5)
-                
-        except asyncio.CancelledError:
-            # Task was cancelled, exit gracefully
-            pass
-        except Exception as e:
-            # Send error message
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': f'Price update error: {str(e)}'
-            }))
+            self.outbound.put(render, key)
+        except OutboundQueueFull as e:
+            await self.disconnect_slow_client(str(e))
     
-    async def generate_mock_price_data(self):
-        """Generate mock portfolio price data."""
-        # Return sample data for all users (simplified for testing)
-        return {
-            'portfolio_id': 'sample',
-            'portfolio_name': 'Sample Portfolio',
-            'total_value': round(random.uniform(45000, 55000), 2),
-            'total_change': round(random.uniform(-500, 500), 2),
-            'total_change_percent': round(random.uniform(-2, 2), 2),
-            'investments': [
-                {
-                    'symbol': 'AAPL',
-                    'name': 'Apple Inc.',
-                    'current_price': round(random.uniform(150, 200), 2),
-                    'change': round(random.uniform(-5, 5), 2),
-                    'change_percent': round(random.uniform(-3, 3), 2),
-                    'quantity': 100,
-                    'value': round(random.uniform(15000, 20000), 2)
-                },
-                {
-                    'symbol': 'MSFT',
-                    'name': 'Microsoft Corporation',
-                    'current_price': round(random.uniform(300, 400), 2),
-                    'change': round(random.uniform(-8, 8), 2),
-                    'change_percent': round(random.uniform(-2, 2), 2),
-                    'quantity': 50,
-                    'value': round(random.uniform(15000, 20000), 2)
-                },
-                {
-                    'symbol': 'GOOGL',
-                    'name': 'Alphabet Inc.',
-                    'current_price': round(random.uniform(120, 150), 2),
-                    'change': round(random.uniform(-3, 3), 2),
-                    'change_percent': round(random.uniform(-2, 2), 2),
-                    'quantity': 75,
-                    'value': round(random.uniform(9000, 11250), 2)
-                }
-            ]
+    async def write_outbound(self):
+        """Send queued frames as fast as the client reads them."""
+        while True:
+            render = await self.outbound.get()
+            message = render()
+            if message is None:
+                continue
+            try:
+                await asyncio.wait_for(self.send(**message), settings.WEBSOCKET_SLOW_CLIENT_TIMEOUT)
+            except asyncio.TimeoutError:
+                await self.disconnect_slow_client(
+                    f'send blocked for {settings.WEBSOCKET_SLOW_CLIENT_TIMEOUT}s'
+                )
+                return
+    
+    async def disconnect_slow_client(self, reason):
+        """Close a connection whose client is not keeping up with its updates."""
+        websocket_metrics.slow_disconnects += 1
+        logger.warning(
+            f"Disconnecting slow WebSocket client {getattr(self.user, 'username', 'anonymous')}: "
+            f"{reason}, {self.outbound.dropped} stale frames dropped"
+        )
+        writer, self.writer = self.writer, None
+        self.outbound.clear()
+        await self.close(code=SLOW_CLIENT_CLOSE_CODE)
+        if writer is not asyncio.current_task():
+            writer.cancel()
+        websocket_metrics.connections -= 1
+    
+    def render_snapshot(self):
+        """Return the full valuation frame and make it the base for later delta frames."""
+        snapshot = self.valuation.snapshot()
+        frame = {
+            'type': 'portfolio_data',
+            'data': snapshot,
+            'timestamp': datetime.now().isoformat()
         }
+        if self.delta:
+            self.frame_seq += 1
+            frame['seq'] = self.frame_seq
+            self.sent_fields = {
+                investment['symbol']: {
+                    'price': investment['current_price'],
+                    'change': investment['change'],
+                    'change_percent': investment['change_percent'],
+                    'value': investment['value'],
+                }
+                for investment in snapshot['investments']
+            }
+            self.sent_fields[None] = {field: snapshot[field] for field in TOTAL_DELTA_KEYS}
+            self.last_snapshot = time.monotonic()
+        return self.encode_frame(frame)
     
-    async def get_user_portfolio_data(self):
-        """Get user's portfolio data (simplified for testing)."""
-        # Return mock data for now
-        return {
-            'portfolio_id': 'mock',
-            'portfolio_name': 'Mock Portfolio',
-            'total_value': 50000,
-            'total_change': 0,
-            'total_change_percent': 0,
-            'investments': []
+    def render_tick(self, event):
+        """Return the frame for the latest tick of a symbol in the negotiated protocol."""
+        tick = event['tick']
+        valuation = self.valuation.position_fields(tick['symbol'])
+        if self.encoding == 'json' and not self.delta:
+            # Reuse the publisher's encoding of the tick
+            if valuation is None:
+                return {'text_data': event['text']}
+            return {'text_data': _extend_encoded(event['text'], valuation)}
+        if valuation is None:
+            return None  # Not held since the last positions reload
+        if not self.delta:
+            return self.encode_frame({'type': 'price_tick', **tick, **valuation})
+        if time.monotonic() - self.last_snapshot >= settings.PORTFOLIO_SNAPSHOT_INTERVAL:
+            return self.render_snapshot()
+        return self.render_delta(tick, valuation)
+    
+    def render_delta(self, tick, valuation):
+        """Return a frame of the fields that changed since the last frame, or None."""
+        fields = {
+            'price': tick['price'],
+            'change': tick['change'],
+            'change_percent': tick['change_percent'],
+            **valuation,
         }
+        changes = {}
+        for sent_key, keys in ((tick['symbol'], POSITION_DELTA_KEYS), (None, TOTAL_DELTA_KEYS)):
+            sent = self.sent_fields.setdefault(sent_key, {})
+            for field, key in keys.items():
+                if sent.get(field) != fields[field]:
+                    changes[key] = sent[field] = fields[field]
+        if not changes:
+            return None
+        
+        self.frame_seq += 1
+        return self.encode_frame({'t': 'd', 'n': self.frame_seq, 's': tick['symbol'], **changes})
+    
+    async def start_price_updates(self):
+        """Subscribe to the price groups of every symbol the user holds."""
+        if self.price_groups:
+            return  # Already subscribed
+        
+        self.price_groups = [price_group_name(symbol) for symbol in self.valuation.symbols]
+        for group in self.price_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+    
+    async def stop_price_updates(self):
+        """Unsubscribe from all price groups."""
+        for group in self.price_groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.price_groups = []
+    
+    def is_authenticated(self):
+        return bool(self.user and self.user.is_authenticated)
+    
+    @database_sync_to_async
+    def load_valuation(self):
+        """Load the user's positions in active portfolios with a single query."""
+        holdings = []
+        if self.is_authenticated():
+            holdings = list(
+                Investment.objects.filter(portfolio__user=self.user, portfolio__is_active=True)
+                .values('symbol')
+                .annotate(
+                    total_quantity=Sum('quantity'),
+                    cost=Sum(F('quantity') * F('purchase_price')),
+                )
+                .order_by('symbol')
+            )
+        return PortfolioValuation(holdings, get_latest_ticks([row['symbol'] for row in holdings]))
     
     # Handle different message types from the group
+    async def price_tick(self, event):
+        """Revalue the ticked position and queue its frame, replacing any stale one."""
+        valuation = self.valuation.apply_tick(event['tick'])
+        if valuation is None and (self.encoding != 'json' or self.delta):
+            return
+        symbol = event['tick']['symbol']
+        await self.enqueue(lambda: self.render_tick(event), key=('tick', symbol))
+    
+    async def positions_changed(self, event):
+        """Reload positions after the user's investments changed."""
+        self.valuation = await self.load_valuation()
+        if self.updates_enabled:
+            await self.stop_price_updates()
+            await self.start_price_updates()
+        await self.send_snapshot()
+    
     async def portfolio_update(self, event):
         """Handle portfolio update messages from the group."""
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'portfolio_update',
             'data': event['data'],
             'timestamp': event['timestamp']
-        }))
+        })
     
     async def price_update(self, event):
         """Handle price update messages from the group."""
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'price_update',
             'data': event['data'],
             'timestamp': event['timestamp']
-        }))
+        })
     
     async def error_message(self, event):
         """Handle error messages from the group."""
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'error',
             'message': event['message'],
             'timestamp': event['timestamp']
-        }))
+        })
@@ -0,0 +1,83 @@
+"""
+Per-user data versions for exact cache invalidation.
+
+A user's data version is the time, in milliseconds, of the last write to
+their portfolios, investments or transactions. It lives in the shared
+cache without expiry and the signal handlers move it on with every write.
+
+The cache may still evict it. A missing version is seeded with the current
+time rather than read as 0, so it never goes back to a value entries were
+already cached under; everything cached before the eviction just counts
+as stale. Versions only work if every process shares the cache, as
+CACHE_IS_SHARED says. Without that, a write in one process cannot reach
+the others, so every read gets a new version and nothing cached from a
+user's data is served again.
+
+Cached entries derived from a user's data either embed the version in
+their key or record when they were computed and count as stale once the
+version is newer. Either way they can be kept for hours without ever being
+served after the data changed. The version doubles as the ETag and
+Last-Modified of responses built from that data.
+"""
+
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_keys import user_data_version_key
+
+
+def _new_version():
+    return int(time.time() * 1000)
+
+
+def _seed_version(key):
+    """Store a new version under ``key`` unless another process just did, and return it."""
+    version = _new_version()
+    if cache.add(key, version, None):
+        return version
+    return cache.get(key) or version
+
+
+def get_user_data_version(user_id):
+    """
+    Return a user's data version.
+
+    Args:
+        user_id: ID of the user
+
+    Returns:
+        Milliseconds since the epoch of the user's last write, or of the
+        first read after their version went missing
+    """
+    if not settings.CACHE_IS_SHARED:
+        return _new_version()
+    key = user_data_version_key(user_id)
+    return cache.get(key) or _seed_version(key)
+
+
+def get_user_data_versions(user_ids):
+    """Return the data versions of several users as a dict, with one cache round trip."""
+    if not settings.CACHE_IS_SHARED:
+        return dict.fromkeys(user_ids, _new_version())
+    keys = {user_data_version_key(user_id): user_id for user_id in user_ids}
+    found = cache.get_many(keys)
+    return {user_id: found.get(key) or _seed_version(key) for key, user_id in keys.items()}
+
+
+def bump_user_data_version(user_id):
+    """Move a user's data version on after their data changed, and return it."""
+    key = user_data_version_key(user_id)
+    # Strictly increasing even for writes within the same millisecond
+    version = max(_new_version(), (cache.get(key) or 0) + 1)
+    cache.set(key, version, None)
+    return version
+
+
+def version_last_modified(version):
+    """Return the time a data version was set, or None for version 0."""
+    if not version:
+        return None
+    return datetime.fromtimestamp(version / 1000, tz=timezone.utc)
+
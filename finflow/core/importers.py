@@ -0,0 +1,332 @@
+"""
+Bulk import of transactions from CSV or NDJSON files.
+
+Rows are parsed as a stream and handled in batches. Each batch is
+validated a column at a time and its investments are resolved with one
+query by ``(portfolio, symbol)``. Valid rows are written with
+``bulk_create`` in their own atomic block. A bad row never aborts the
+import; it is reported with its line number instead.
+
+Expected columns (CSV header or NDJSON object keys):
+    portfolio         Portfolio ID, must belong to the importing user
+    symbol            Symbol of an existing investment in that portfolio
+    transaction_type  One of buy, sell, dividend, split, transfer
+    amount            Decimal amount, at most 2 decimal places
+    timestamp         Optional ISO 8601 date/time, defaults to now
+    notes             Optional free text
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Investment, Transaction, PortfolioStats
+from .signals import mark_analytics_dirty
+
+logger = logging.getLogger(__name__)
+
+# Rows validated and inserted per atomic block
+IMPORT_BATCH_SIZE = 2000
+
+# Row errors kept in the import result; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+REQUIRED_COLUMNS = ('portfolio', 'symbol', 'transaction_type', 'amount')
+
+TRANSACTION_TYPES = frozenset(choice for choice, _ in Transaction.TRANSACTION_TYPE_CHOICES)
+AMOUNT_FIELD = Transaction._meta.get_field('amount')
+AMOUNT_PLACES = Decimal(1).scaleb(-AMOUNT_FIELD.decimal_places)
+AMOUNT_MAX = Decimal(10) ** (AMOUNT_FIELD.max_digits - AMOUNT_FIELD.decimal_places)
+
+
+class TransactionImportError(Exception):
+    """Raised when an import file cannot be read at all."""
+    pass
+
+
+def detect_format(filename, default=None):
+    """Guess the import format from a file name."""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return default
+
+
+def _text_stream(stream):
+    """Wrap binary file objects so they can be read as UTF-8 text."""
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+def iter_csv_rows(stream):
+    """Yield ``(line_number, row, error)`` for each record of a CSV file."""
+    reader = csv.DictReader(_text_stream(stream))
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise TransactionImportError(f"Missing CSV columns: {', '.join(missing)}")
+    for row in reader:
+        yield reader.line_num, row, None
+
+
+def iter_ndjson_rows(stream):
+    """Yield ``(line_number, row, error)`` for each line of an NDJSON file."""
+    for line_number, line in enumerate(_text_stream(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'Invalid JSON: {str(e)}'
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, 'Expected a JSON object.'
+            continue
+        yield line_number, row, None
+
+
+def iter_rows(stream, file_format):
+    """
+    Yield ``(line_number, row, error)`` for each record of ``stream``.
+
+    Raises:
+        TransactionImportError: If the format is unknown, or the file is not
+            UTF-8 text or not readable as CSV
+    """
+    if file_format == 'csv':
+        return _guard_stream(iter_csv_rows(stream))
+    if file_format == 'ndjson':
+        return _guard_stream(iter_ndjson_rows(stream))
+    raise TransactionImportError(
+        f"Unsupported import format {file_format!r}; expected one of {', '.join(IMPORT_FORMATS)}"
+    )
+
+
+def _guard_stream(records):
+    """Re-raise errors reading the file itself as TransactionImportError."""
+    line_number = 0
+    try:
+        for line_number, row, error in records:
+            yield line_number, row, error
+    except UnicodeDecodeError:
+        raise TransactionImportError(f'The file is not UTF-8 text after line {line_number}.')
+    except csv.Error as e:
+        raise TransactionImportError(f'Invalid CSV after line {line_number}: {str(e)}')
+
+
+def _clean(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+class TransactionImporter:
+    """
+    Import transactions for one user in validated, atomic batches.
+
+    Args:
+        user: Owner of the portfolios rows may refer to
+        batch_size: Rows validated and inserted per atomic block
+        progress: Optional callable receiving the running result after each batch
+    """
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE, progress=None):
+        self.user = user
+        self.batch_size = batch_size
+        self.progress = progress
+        self.result = {
+            'rows': 0,
+            'imported': 0,
+            'failed': 0,
+            'errors': [],
+        }
+
+    def run(self, stream, file_format):
+        """
+        Import every row of ``stream``.
+
+        Returns:
+            dict: Row, imported and failed counts plus the first row errors
+
+        Raises:
+            TransactionImportError: If the file itself cannot be read; batches
+                before the unreadable part stay imported
+        """
+        batch = []
+        try:
+            for line_number, row, error in iter_rows(stream, file_format):
+                self.result['rows'] += 1
+                if error:
+                    self._add_error(line_number, error)
+                    continue
+                batch.append((line_number, row))
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch)
+                    batch = []
+        except TransactionImportError as e:
+            if not self.result['imported']:
+                raise
+            # Earlier batches are committed; say so rather than suggest nothing was imported
+            raise TransactionImportError(
+                f"{str(e)} {self.result['imported']} rows before it were imported."
+            ) from e
+        if batch:
+            self._import_batch(batch)
+
+        logger.info(
+            f"Imported {self.result['imported']} of {self.result['rows']} transaction rows "
+            f"for user {self.user.id} ({self.result['failed']} failed)"
+        )
+        return self.result
+
+    def _add_error(self, line_number, message):
+        self.result['failed'] += 1
+        if len(self.result['errors']) < MAX_REPORTED_ERRORS:
+            self.result['errors'].append({'line': line_number, 'error': message})
+
+    def _import_batch(self, batch):
+        lines = [line_number for line_number, _ in batch]
+        rows = [row for _, row in batch]
+        errors = {}
+
+        portfolio_ids = self._validate_column(rows, lines, errors, 'portfolio', self._parse_portfolio)
+        symbols = self._validate_column(rows, lines, errors, 'symbol', self._parse_symbol)
+        types = self._validate_column(rows, lines, errors, 'transaction_type', self._parse_type)
+        amounts = self._validate_column(rows, lines, errors, 'amount', self._parse_amount)
+        timestamps = self._validate_column(rows, lines, errors, 'timestamp', self._parse_timestamp)
+
+        investment_ids = self._resolve_investments(
+            [
+                (portfolio_ids[index], symbols[index])
+                for index, line_number in enumerate(lines)
+                if line_number not in errors
+            ]
+        )
+
+        transactions = []
+        touched = set()
+        for index, line_number in enumerate(lines):
+            if line_number in errors:
+                continue
+            key = (portfolio_ids[index], symbols[index])
+            investment_id = investment_ids.get(key)
+            if investment_id is None:
+                errors[line_number] = (
+                    f'No investment {key[1]} in portfolio {key[0]} owned by you.'
+                )
+                continue
+            touched.add(key[0])
+            notes = _clean(rows[index].get('notes'))
+            transactions.append(Transaction(
+                investment_id=investment_id,
+                transaction_type=types[index],
+                amount=amounts[index],
+                timestamp=timestamps[index],
+                notes=notes or None,
+            ))
+
+        for line_number in sorted(errors):
+            self._add_error(line_number, errors[line_number])
+
+        if transactions:
+            with transaction.atomic():
+                Transaction.objects.bulk_create(transactions, batch_size=self.batch_size)
+                # bulk_create sends no post_save, so keep the rollups in step here
+                PortfolioStats.objects.refresh(touched, lock=True)
+                user_id = self.user.id
+                transaction.on_commit(lambda: mark_analytics_dirty(user_id))
+            self.result['imported'] += len(transactions)
+
+        if self.progress:
+            self.progress(self.result)
+
+    def _validate_column(self, rows, lines, errors, column, parse):
+        """Parse one column of the batch, recording the first error of each row."""
+        values = []
+        for row, line_number in zip(rows, lines):
+            value = None
+            if line_number not in errors:
+                try:
+                    value = parse(_clean(row.get(column)))
+                except ValueError as e:
+                    errors[line_number] = f'{column}: {str(e)}'
+            values.append(value)
+        return values
+
+    def _resolve_investments(self, keys):
+        """Map ``(portfolio_id, symbol)`` keys to investment IDs with a single query."""
+        if not keys:
+            return {}
+        portfolio_ids = {portfolio_id for portfolio_id, _ in keys}
+        symbols = {symbol for _, symbol in keys}
+        rows = Investment.objects.filter(
+            portfolio__user=self.user,
+            portfolio_id__in=portfolio_ids,
+            symbol__in=symbols,
+        ).order_by().values_list('portfolio_id', 'symbol', 'id')
+        return {(portfolio_id, symbol): investment_id for portfolio_id, symbol, investment_id in rows}
+
+    @staticmethod
+    def _parse_portfolio(value):
+        if not value:
+            raise ValueError('This field is required.')
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f'{value!r} is not a valid portfolio ID.')
+
+    @staticmethod
+    def _parse_symbol(value):
+        if not value:
+            raise ValueError('This field is required.')
+        return value.upper()
+
+    @staticmethod
+    def _parse_type(value):
+        value = value.lower()
+        if value not in TRANSACTION_TYPES:
+            raise ValueError(f'{value!r} is not a valid transaction type.')
+        return value
+
+    @staticmethod
+    def _parse_amount(value):
+        try:
+            amount = Decimal(value)
+        except InvalidOperation:
+            raise ValueError(f'{value!r} is not a valid number.')
+        if not amount.is_finite():
+            raise ValueError(f'{value!r} is not a valid number.')
+        # Checked first: quantizing an amount like 1e30 exceeds the decimal
+        # context's precision and raises InvalidOperation
+        if abs(amount) >= AMOUNT_MAX:
+            raise ValueError(
+                f'Ensure that there are no more than {AMOUNT_FIELD.max_digits} digits in total.'
+            )
+        if amount != amount.quantize(AMOUNT_PLACES):
+            raise ValueError(
+                f'Ensure that there are no more than {AMOUNT_FIELD.decimal_places} decimal places.'
+            )
+        return amount
+
+    @staticmethod
+    def _parse_timestamp(value):
+        if not value:
+            return timezone.now()
+        timestamp = parse_datetime(value)
+        if timestamp is None:
+            date = parse_date(value)
+            if date is None:
+                raise ValueError(f'{value!r} is not a valid ISO 8601 date/time.')
+            timestamp = datetime.combine(date, time.min)
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+        return timestamp
@@ -0,0 +1,103 @@
+"""
+Logging handlers and formatters keeping file I/O off the request path.
+
+QueueFileHandler only puts records on an in-memory queue; a listener
+thread formats them and writes the file. Records are dropped, and counted
+in ``dropped``, rather than blocking a request if the writer falls behind.
+
+JSONFormatter writes one JSON object per line, including any ``extra``
+fields passed to the logging call, so events can be parsed without
+scraping the message text.
+"""
+
+import copy
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came from ``extra``
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record):
+        event = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        event.update(
+            (name, value) for name, value in vars(record).items() if name not in RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            event['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(event, default=str)
+
+
+class QueueFileHandler(QueueHandler):
+    """
+    File handler whose writes happen on a background listener thread.
+
+    Configured like ``logging.FileHandler``; the formatter set on this
+    handler is applied by the listener, not by the logging thread.
+
+    Args:
+        filename: File to append records to
+        mode: Mode to open the file in
+        encoding: Encoding of the file
+        capacity: Records that may wait before new ones are dropped
+    """
+
+    def __init__(self, filename, mode='a', encoding=None, capacity=10000):
+        self.capacity = capacity
+        self.dropped = 0
+        self.target = logging.FileHandler(filename, mode, encoding, delay=True)
+        super().__init__(queue.Queue(capacity))
+        self.listener = None
+        self._start()
+        # Forked workers (Celery prefork) inherit the queue but not the thread
+        os.register_at_fork(after_in_child=self._restart)
+
+    def _start(self):
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def _restart(self):
+        self.queue = queue.Queue(self.capacity)
+        self._start()
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Only merge the arguments here; formatting is left to the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Wait until every queued record has been written."""
+        if self.listener is not None:
+            self.listener.stop()
+            self._start()
+        self.target.flush()
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
@@ -0,0 +1,83 @@
+"""
+Management command to bulk import transactions from a CSV or NDJSON file.
+
+Usage:
+    python manage.py import_transactions history.csv --user alice
+    python manage.py import_transactions history.ndjson --user alice --batch-size 5000
+    python manage.py import_transactions export.txt --user alice --format csv
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finflow.core.importers import (
+    IMPORT_BATCH_SIZE, IMPORT_FORMATS, TransactionImporter, TransactionImportError,
+    detect_format,
+)
+from finflow.core.models import User
+
+
+class Command(BaseCommand):
+    help = 'Bulk import transactions for a user from a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import')
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Username owning the portfolios the rows refer to',
+        )
+        parser.add_argument(
+            '--format',
+            choices=IMPORT_FORMATS,
+            help='File format (default: guessed from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help=f'Rows validated and inserted per transaction (default: {IMPORT_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        if file_format is None:
+            raise CommandError('Could not tell the file format from its name; pass --format.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["user"]!r} does not exist.')
+
+        importer = TransactionImporter(
+            user, batch_size=options['batch_size'], progress=self._report_progress
+        )
+        try:
+            with open(path, 'rb') as stream:
+                result = importer.run(stream, file_format)
+        except OSError as e:
+            raise CommandError(f'Could not read {path}: {str(e)}')
+        except TransactionImportError as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(f'Line {error["line"]}: {error["error"]}')
+        if result['failed'] > len(result['errors']):
+            self.stderr.write(f'... {result["failed"] - len(result["errors"])} more errors not shown')
+
+        message = (
+            f'Imported {result["imported"]} of {result["rows"]} rows '
+            f'({result["failed"]} failed).'
+        )
+        style = self.style.WARNING if result['failed'] else self.style.SUCCESS
+        self.stdout.write(style(message))
+
+    def _report_progress(self, result):
+        if self.verbosity > 1:
+            self.stdout.write(
+                f'{result["rows"]} rows read, {result["imported"]} imported, '
+                f'{result["failed"]} failed'
+            )
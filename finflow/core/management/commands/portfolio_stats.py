@@ -0,0 +1,82 @@
+"""
+Management command to rebuild or verify the denormalized PortfolioStats table.
+
+Usage:
+    python manage.py portfolio_stats rebuild
+    python manage.py portfolio_stats verify --batch-size 5000
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finflow.core.models import Portfolio, PortfolioStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify PortfolioStats rows from investments and transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['rebuild', 'verify'],
+            help='"rebuild" recomputes and saves every row, "verify" only reports drift',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of portfolios recomputed per batch (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        action = options['action']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        processed = 0
+        mismatched = []
+        for portfolio_ids in self._batches(batch_size):
+            if action == 'rebuild':
+                PortfolioStats.objects.refresh(portfolio_ids)
+            else:
+                mismatched.extend(self._verify(portfolio_ids))
+            processed += len(portfolio_ids)
+
+        if action == 'rebuild':
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {processed} portfolios.'))
+            return
+
+        for portfolio_id, fields in mismatched:
+            self.stdout.write(f'Portfolio {portfolio_id}: {", ".join(fields)}')
+        if mismatched:
+            raise CommandError(
+                f'{len(mismatched)} of {processed} portfolios have stale stats. '
+                f'Run "manage.py portfolio_stats rebuild" to fix them.'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Stats for {processed} portfolios are consistent.'))
+
+    def _batches(self, batch_size):
+        batch = []
+        portfolio_ids = Portfolio.objects.order_by('pk').values_list('pk', flat=True)
+        for portfolio_id in portfolio_ids.iterator(chunk_size=batch_size):
+            batch.append(portfolio_id)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _verify(self, portfolio_ids):
+        """Yield ``(portfolio_id, mismatched_fields)`` for stale or missing rows."""
+        stored = PortfolioStats.objects.in_bulk(portfolio_ids)
+        for expected in PortfolioStats.objects.compute(portfolio_ids):
+            actual = stored.get(expected.portfolio_id)
+            if actual is None:
+                yield expected.portfolio_id, ['missing']
+                continue
+            fields = [
+                field for field in PortfolioStats.STAT_FIELDS
+                if getattr(actual, field) != getattr(expected, field)
+            ]
+            if fields:
+                yield expected.portfolio_id, fields
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:42
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_investment_transaction_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioStats',
+            fields=[
+                ('portfolio', models.OneToOneField(help_text='The portfolio these figures describe', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.portfolio')),
+                ('total_invested', models.DecimalField(decimal_places=8, default=Decimal('0'), help_text='Sum of quantity x purchase price across investments', max_digits=25)),
+                ('investment_count', models.PositiveIntegerField(default=0)),
+                ('unique_symbols', models.PositiveIntegerField(default=0)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('buy_count', models.PositiveIntegerField(default=0)),
+                ('sell_count', models.PositiveIntegerField(default=0)),
+                ('dividend_count', models.PositiveIntegerField(default=0)),
+                ('split_count', models.PositiveIntegerField(default=0)),
+                ('transfer_count', models.PositiveIntegerField(default=0)),
+                ('last_activity', models.DateTimeField(blank=True, help_text='Most recent investment update or transaction', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Portfolio Stats',
+                'verbose_name_plural': 'Portfolio Stats',
+                'db_table': 'core_portfolio_stats',
+            },
+        ),
+    ]
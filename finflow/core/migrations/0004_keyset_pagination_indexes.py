@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_portfoliostats'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='investment',
+            name='core_invest_purchas_22aa01_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='core_transa_timesta_a5c12f_idx',
+        ),
+        migrations.AddIndex(
+            model_name='investment',
+            index=models.Index(fields=['purchase_date', 'id'], name='core_invest_purchas_d1c845_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['timestamp', 'id'], name='core_transa_timesta_d3a32f_idx'),
+        ),
+    ]
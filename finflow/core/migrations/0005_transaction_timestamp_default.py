@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When the transaction occurred'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+"""
+Backfill PortfolioStats rows for portfolios created before 0003.
+
+0003 only created the table, so older portfolios had no stats row and the
+dashboard counted none of their investments. The rollup is repeated here
+on the historical models rather than calling PortfolioStats.objects, so
+later changes to the models or the manager cannot break this migration.
+"""
+
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Count, F, Max, Sum
+
+BATCH_SIZE = 1000
+TRANSACTION_TYPES = ('buy', 'sell', 'dividend', 'split', 'transfer')
+
+
+def compute_stats(PortfolioStats, Investment, Transaction, alias, portfolio_ids):
+    stats = {
+        portfolio_id: PortfolioStats(portfolio_id=portfolio_id)
+        for portfolio_id in portfolio_ids
+    }
+    investment_rows = (
+        Investment.objects.using(alias).filter(portfolio_id__in=stats)
+        .values('portfolio_id')
+        .annotate(
+            investment_count=Count('id'),
+            unique_symbols=Count('symbol', distinct=True),
+            total_invested=Sum(F('quantity') * F('purchase_price')),
+            last_activity=Max('updated_at'),
+        )
+        .order_by()
+    )
+    for row in investment_rows:
+        portfolio_stats = stats[row['portfolio_id']]
+        portfolio_stats.investment_count = row['investment_count']
+        portfolio_stats.unique_symbols = row['unique_symbols']
+        portfolio_stats.total_invested = Decimal(row['total_invested'] or 0).quantize(
+            Decimal('0.00000001')
+        )
+        portfolio_stats.last_activity = row['last_activity']
+
+    transaction_rows = (
+        Transaction.objects.using(alias).filter(investment__portfolio_id__in=stats)
+        .values('investment__portfolio_id', 'transaction_type')
+        .annotate(count=Count('id'), last_activity=Max('timestamp'))
+        .order_by()
+    )
+    for row in transaction_rows:
+        portfolio_stats = stats[row['investment__portfolio_id']]
+        if row['transaction_type'] in TRANSACTION_TYPES:
+            setattr(portfolio_stats, f"{row['transaction_type']}_count", row['count'])
+        portfolio_stats.transaction_count += row['count']
+        if portfolio_stats.last_activity is None or \
+                row['last_activity'] > portfolio_stats.last_activity:
+            portfolio_stats.last_activity = row['last_activity']
+    return list(stats.values())
+
+
+def backfill_portfolio_stats(apps, schema_editor):
+    Portfolio = apps.get_model('core', 'Portfolio')
+    PortfolioStats = apps.get_model('core', 'PortfolioStats')
+    Investment = apps.get_model('core', 'Investment')
+    Transaction = apps.get_model('core', 'Transaction')
+    alias = schema_editor.connection.alias
+    missing = list(
+        Portfolio.objects.using(alias).filter(stats__isnull=True)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    for start in range(0, len(missing), BATCH_SIZE):
+        stats = compute_stats(
+            PortfolioStats, Investment, Transaction, alias, missing[start:start + BATCH_SIZE]
+        )
+        # A row written meanwhile by the running app is already current
+        PortfolioStats.objects.using(alias).bulk_create(stats, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_lower_username_email_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_portfolio_stats, migrations.RunPython.noop),
+    ]
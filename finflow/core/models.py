@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
-from django.db.models import Sum, Avg, Q
+from django.db.models import Sum, Avg, Q, Count, Max
+from django.db.models.functions import Lower
 from decimal import Decimal
 
+from .routers import primary_reads
+
 
 class User(AbstractUser):
     """
@@ -51,6 +54,9 @@ class User(AbstractUser):
         indexes = [
             models.Index(fields=['risk_tolerance']),
             models.Index(fields=['investment_style']),
+            # Case-insensitive username/email lookups at login
+            models.Index(Lower('username'), name='auth_user_username_lower_idx'),
+            models.Index(Lower('email'), name='auth_user_email_lower_idx'),
         ]
     
     def __str__(self):
@@ -230,7 +236,7 @@ class Investment(models.Model):
         indexes = [
             models.Index(fields=['portfolio', 'symbol']),
             models.Index(fields=['symbol']),
-            models.Index(fields=['purchase_date']),
+            models.Index(fields=['purchase_date', 'id']),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -242,6 +248,11 @@ class Investment(models.Model):
     def __str__(self):
         return f"{self.symbol} - {self.quantity} shares @ ${self.purchase_price}"
     
+    def save(self, *args, **kwargs):
+        """Save in a transaction so the portfolio stats update commits with it."""
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+    
     @property
     def total_value(self):
         """Calculate total value of this investment."""
@@ -285,7 +296,7 @@ class Transaction(models.Model):
     )
     
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         help_text='When the transaction occurred'
     )
     
@@ -303,12 +314,17 @@ class Transaction(models.Model):
         indexes = [
             models.Index(fields=['investment', 'timestamp']),
             models.Index(fields=['transaction_type']),
-            models.Index(fields=['timestamp']),
+            models.Index(fields=['timestamp', 'id']),
         ]
     
     def __str__(self):
         return f"{self.get_transaction_type_display()} - {self.investment.symbol} - ${self.amount}"
     
+    def save(self, *args, **kwargs):
+        """Save in a transaction so the portfolio stats update commits with it."""
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+    
     @property
     def is_buy(self):
         """Check if this is a buy transaction."""
@@ -318,3 +334,172 @@ class Transaction(models.Model):
     def is_sell(self):
         """Check if this is a sell transaction."""
         return self.transaction_type == 'sell'
+
+
+STATS_DECIMAL_PLACES = Decimal('0.00000001')
+
+
+class PortfolioStatsManager(models.Manager):
+    """
+    Custom Manager for PortfolioStats that rebuilds rows from source data.
+    """
+    
+    def compute(self, portfolio_ids):
+        """
+        Compute fresh, unsaved stats for the given portfolios.
+        
+        Uses two grouped queries regardless of how many portfolios are passed.
+        """
+        stats = {
+            portfolio_id: self.model(portfolio_id=portfolio_id)
+            for portfolio_id in portfolio_ids
+        }
+        if not stats:
+            return []
+        
+        investment_rows = (
+            Investment.objects.filter(portfolio_id__in=stats)
+            .values('portfolio_id')
+            .annotate(
+                investment_count=Count('id'),
+                unique_symbols=Count('symbol', distinct=True),
+                total_invested=Sum(models.F('quantity') * models.F('purchase_price')),
+                last_activity=Max('updated_at'),
+            )
+            .order_by()
+        )
+        for row in investment_rows:
+            portfolio_stats = stats[row['portfolio_id']]
+            portfolio_stats.investment_count = row['investment_count']
+            portfolio_stats.unique_symbols = row['unique_symbols']
+            portfolio_stats.total_invested = Decimal(row['total_invested'] or 0).quantize(
+                STATS_DECIMAL_PLACES
+            )
+            portfolio_stats.last_activity = row['last_activity']
+        
+        transaction_rows = (
+            Transaction.objects.filter(investment__portfolio_id__in=stats)
+            .values('investment__portfolio_id', 'transaction_type')
+            .annotate(count=Count('id'), last_activity=Max('timestamp'))
+            .order_by()
+        )
+        for row in transaction_rows:
+            portfolio_stats = stats[row['investment__portfolio_id']]
+            field = PortfolioStats.TRANSACTION_COUNT_FIELDS.get(row['transaction_type'])
+            if field:
+                setattr(portfolio_stats, field, row['count'])
+            portfolio_stats.transaction_count += row['count']
+            if portfolio_stats.last_activity is None or \
+                    row['last_activity'] > portfolio_stats.last_activity:
+                portfolio_stats.last_activity = row['last_activity']
+        
+        return list(stats.values())
+    
+    def refresh(self, portfolio_ids, lock=False):
+        """
+        Recompute and upsert the stats of the given portfolios.
+        
+        With ``lock=True`` the portfolio rows are locked first, so concurrent
+        writers to the same portfolio refresh its stats one after another.
+        """
+        portfolio_ids = list(portfolio_ids)
+        using = self._db or router.db_for_write(self.model)
+        # Stats are rebuilt from the primary, even inside replica_reads()
+        with primary_reads(), transaction.atomic(using=using):
+            if lock:
+                list(
+                    Portfolio.objects.using(using).select_for_update()
+                    .filter(pk__in=portfolio_ids)
+                    .values_list('pk', flat=True)
+                )
+            stats = self.compute(portfolio_ids)
+            self.bulk_create(
+                stats,
+                update_conflicts=True,
+                unique_fields=['portfolio'],
+                update_fields=PortfolioStats.STAT_FIELDS + ['updated_at'],
+            )
+        return stats
+    
+    def for_portfolio(self, portfolio):
+        """
+        Return the stats of ``portfolio``.
+        
+        Uses the row loaded with ``select_related('stats')`` when there is one.
+        A missing row is computed but not saved, so reads never write;
+        ``manage.py portfolio_stats rebuild`` restores it.
+        """
+        try:
+            return portfolio.stats
+        except self.model.DoesNotExist:
+            return self.compute([portfolio.pk])[0]
+
+
+class PortfolioStats(models.Model):
+    """
+    Denormalized per-portfolio rollup of investment and transaction figures.
+    
+    Kept up to date on every investment and transaction write so list views
+    and summaries never aggregate the source rows on read.
+    """
+    TRANSACTION_COUNT_FIELDS = {
+        transaction_type: f'{transaction_type}_count'
+        for transaction_type, _ in Transaction.TRANSACTION_TYPE_CHOICES
+    }
+    
+    portfolio = models.OneToOneField(
+        Portfolio,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        help_text='The portfolio these figures describe'
+    )
+    
+    total_invested = models.DecimalField(
+        max_digits=25,
+        decimal_places=8,
+        default=Decimal('0'),
+        help_text='Sum of quantity x purchase price across investments'
+    )
+    
+    investment_count = models.PositiveIntegerField(default=0)
+    unique_symbols = models.PositiveIntegerField(default=0)
+    
+    transaction_count = models.PositiveIntegerField(default=0)
+    buy_count = models.PositiveIntegerField(default=0)
+    sell_count = models.PositiveIntegerField(default=0)
+    dividend_count = models.PositiveIntegerField(default=0)
+    split_count = models.PositiveIntegerField(default=0)
+    transfer_count = models.PositiveIntegerField(default=0)
+    
+    last_activity = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text='Most recent investment update or transaction'
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = PortfolioStatsManager()
+    
+    STAT_FIELDS = [
+        'total_invested', 'investment_count', 'unique_symbols', 'transaction_count',
+        'buy_count', 'sell_count', 'dividend_count', 'split_count', 'transfer_count',
+        'last_activity',
+    ]
+    
+    class Meta:
+        db_table = 'core_portfolio_stats'
+        verbose_name = 'Portfolio Stats'
+        verbose_name_plural = 'Portfolio Stats'
+    
+    def __str__(self):
+        return f"Stats for portfolio {self.portfolio_id}"
+    
+    @property
+    def transaction_counts(self):
+        """Return transaction counts keyed by transaction type."""
+        return {
+            transaction_type: getattr(self, field)
+            for transaction_type, field in self.TRANSACTION_COUNT_FIELDS.items()
+        }
@@ -0,0 +1,99 @@
+"""
+Bounded outbound message queue for WebSocket connections.
+
+Consumers hand frames to an OutboundQueue instead of sending them inline,
+and a writer task drains it at the pace the client reads. Frames queued
+under a key, such as the price tick of one symbol, replace the frame
+already waiting under that key, so a slow reader skips stale ticks rather
+than buffering them. Frames are rendered when they leave the queue, which
+lets a replaced tick be sent with the latest valuation.
+
+Queue depth and drop counters of every connection in the process are
+summed in ``websocket_metrics``.
+"""
+
+import asyncio
+import itertools
+from collections import OrderedDict
+
+
+class WebSocketMetrics:
+    """Process-wide counters for the WebSocket outbound queues."""
+
+    def __init__(self):
+        self.connections = 0
+        self.queued_frames = 0
+        self.peak_queue_depth = 0
+        self.dropped_frames = 0
+        self.slow_disconnects = 0
+
+    def snapshot(self):
+        return dict(vars(self))
+
+
+websocket_metrics = WebSocketMetrics()
+
+
+class OutboundQueueFull(Exception):
+    """Raised when a frame is queued for a client that has stopped reading."""
+    pass
+
+
+class OutboundQueue:
+    """
+    FIFO of frame renderers with latest-value-wins replacement by key.
+
+    Args:
+        max_size: Frames that may wait before the client counts as too slow
+        metrics: WebSocketMetrics to keep up to date
+    """
+
+    def __init__(self, max_size, metrics=websocket_metrics):
+        self.max_size = max_size
+        self.metrics = metrics
+        self.dropped = 0
+        self._frames = OrderedDict()
+        self._unkeyed = itertools.count()
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, render, key=None):
+        """
+        Queue ``render``, a callable returning the send() arguments or None.
+
+        A frame already waiting under ``key`` is dropped in favour of this
+        one and keeps its place in the queue.
+
+        Raises:
+            OutboundQueueFull: If ``max_size`` frames are already waiting
+        """
+        if key is None:
+            key = ('frame', next(self._unkeyed))
+        elif key in self._frames:
+            self._frames[key] = render
+            self.dropped += 1
+            self.metrics.dropped_frames += 1
+            return
+
+        if len(self._frames) >= self.max_size:
+            raise OutboundQueueFull(f'{len(self._frames)} frames waiting to be sent')
+        self._frames[key] = render
+        self.metrics.queued_frames += 1
+        self.metrics.peak_queue_depth = max(self.metrics.peak_queue_depth, len(self._frames))
+        self._ready.set()
+
+    async def get(self):
+        """Wait for and remove the oldest frame renderer."""
+        while not self._frames:
+            self._ready.clear()
+            await self._ready.wait()
+        _, render = self._frames.popitem(last=False)
+        self.metrics.queued_frames -= 1
+        return render
+
+    def clear(self):
+        """Drop every waiting frame, e.g. when the connection closes."""
+        self.metrics.queued_frames -= len(self._frames)
+        self._frames.clear()
@@ -0,0 +1,64 @@
+"""
+Pagination classes for the finflow.core API.
+
+Transactions and investments grow without bound for active users, so their
+list endpoints also offer keyset (cursor) pagination. Clients opt in with
+``?pagination=cursor``: each page is then fetched with a range condition on
+an indexed column rather than an OFFSET, and no COUNT(*) is run. Without it
+lists are paged by number and include ``count``, as everywhere else in the
+API.
+"""
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CountedPagination(PageNumberPagination):
+    """Project-wide page number pagination, with the page size adjustable up to 200."""
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a ``(column, id)`` ordering, opted into per request.
+    
+    The trailing ``id`` keeps the order stable between rows that share the
+    same value in the leading column. Requests without
+    ``?pagination=cursor`` are paged by number in the same order, with a
+    count.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    mode_query_param = 'pagination'
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_number_pagination = None
+        if request.query_params.get(self.mode_query_param) != 'cursor':
+            self.page_number_pagination = CountedPagination()
+            page = self.page_number_pagination.paginate_queryset(
+                queryset.order_by(*self.ordering), request, view
+            )
+            self.display_page_controls = self.page_number_pagination.display_page_controls
+            return page
+        # Next and previous links keep the mode parameter
+        return super().paginate_queryset(queryset, request, view)
+    
+    def get_paginated_response(self, data):
+        if self.page_number_pagination is not None:
+            return self.page_number_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+    
+    def to_html(self):
+        if self.page_number_pagination is not None:
+            return self.page_number_pagination.to_html()
+        return super().to_html()
+
+
+class TransactionCursorPagination(KeysetPagination):
+    """Newest transactions first, backed by the ``(timestamp, id)`` index."""
+    ordering = ('-timestamp', '-id')
+
+
+class InvestmentCursorPagination(KeysetPagination):
+    """Most recent purchases first, backed by the ``(purchase_date, id)`` index."""
+    ordering = ('-purchase_date', '-id')
@@ -0,0 +1,246 @@
+"""
+Shared market price feed for the live portfolio WebSocket.
+
+A single producer fetches prices for every held symbol from a pluggable
+PriceSource and publishes one tick per symbol to that symbol's
+``prices.<SYMBOL>`` channel-layer group. Each tick travels both as data,
+for consumers to value positions with, and JSON-encoded once by the
+producer, for consumers to forward without encoding it again.
+
+The producer runs in one of two places:
+- As an asyncio task inside each ASGI process (PRICE_FEED_IN_PROCESS),
+  which is required with the in-memory channel layer
+- As the ``publish_price_ticks`` Celery beat task, once a channel layer
+  shared between processes is configured
+"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+import zlib
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cache_keys import HELD_SYMBOLS_KEY, latest_price_key
+from .models import Investment
+
+logger = logging.getLogger(__name__)
+
+PRICE_GROUP_PREFIX = 'prices.'
+LATEST_PRICE_TIMEOUT = 60 * 60
+HELD_SYMBOLS_TIMEOUT = 60
+
+
+def price_group_name(symbol):
+    """Return the channel-layer group publishing ticks for ``symbol``."""
+    # Group names only allow ASCII letters, digits, hyphens, underscores and periods
+    return PRICE_GROUP_PREFIX + re.sub(r'[^A-Z0-9._-]', '_', symbol.upper())[:80]
+
+
+class PriceSource:
+    """
+    Base class for market price providers.
+
+    Subclasses implement ``get_prices`` against a real market data API;
+    select one with the PRICE_SOURCE setting.
+    """
+
+    def get_prices(self, symbols):
+        """
+        Return the latest prices of ``symbols``.
+
+        Args:
+            symbols: Iterable of upper-case symbols
+
+        Returns:
+            dict: ``{symbol: price}`` for every symbol the source knows
+        """
+        raise NotImplementedError
+
+
+class SimulatedPriceSource(PriceSource):
+    """
+    Offline price source producing a random walk per symbol.
+
+    Passing a ``seed`` makes the sequence of prices reproducible.
+    """
+
+    BASE_PRICES = {
+        'AAPL': 175.00,
+        'MSFT': 350.00,
+        'GOOGL': 135.00,
+        'AMZN': 145.00,
+        'TSLA': 240.00,
+        'NVDA': 480.00,
+        'META': 320.00,
+        'NFLX': 440.00,
+    }
+
+    def __init__(self, seed=None, volatility=0.002):
+        self.volatility = volatility
+        self._random = random.Random(seed)
+        self._prices = {}
+
+    def get_prices(self, symbols):
+        prices = {}
+        for symbol in symbols:
+            price = self._prices.get(symbol) or self._initial_price(symbol)
+            price = max(price * (1 + self._random.gauss(0, self.volatility)), 0.01)
+            self._prices[symbol] = price
+            prices[symbol] = round(price, 2)
+        return prices
+
+    def _initial_price(self, symbol):
+        if symbol in self.BASE_PRICES:
+            return self.BASE_PRICES[symbol]
+        # Stable made-up price for symbols without a base price
+        return 20 + zlib.crc32(symbol.encode()) % 480
+
+
+_price_source = None
+
+
+def get_price_source():
+    """Return the process-wide price source configured by PRICE_SOURCE."""
+    global _price_source
+    if _price_source is None:
+        _price_source = import_string(settings.PRICE_SOURCE)()
+    return _price_source
+
+
+def get_held_symbols():
+    """Return every symbol held in any portfolio, cached for a minute."""
+    symbols = cache.get(HELD_SYMBOLS_KEY)
+    if symbols is None:
+        symbols = sorted(
+            Investment.objects.order_by().values_list('symbol', flat=True).distinct()
+        )
+        cache.set(HELD_SYMBOLS_KEY, symbols, HELD_SYMBOLS_TIMEOUT)
+    return symbols
+
+
+def get_latest_ticks(symbols):
+    """Return ``{symbol: tick}`` for the symbols the feed has published."""
+    keys = {latest_price_key(symbol): symbol for symbol in symbols}
+    return {keys[key]: tick for key, tick in cache.get_many(keys).items()}
+
+
+class PriceFeedPublisher:
+    """
+    Fetch prices and publish one pre-encoded tick per symbol.
+
+    Changes are measured against the first price the publisher saw for a
+    symbol, which stands in for the session open.
+    """
+
+    def __init__(self, source=None, channel_layer=None):
+        self.source = source or get_price_source()
+        self.channel_layer = channel_layer or get_channel_layer()
+        self.opening_prices = {}
+        self.pending = {}
+
+    def build_ticks(self, symbols):
+        """Return a tick dict for every symbol the source priced."""
+        timestamp = timezone.now().isoformat()
+        ticks = []
+        for symbol, price in self.source.get_prices(symbols).items():
+            opening = self.opening_prices.setdefault(symbol, price)
+            change = round(price - opening, 2)
+            ticks.append({
+                'symbol': symbol,
+                'price': price,
+                'change': change,
+                'change_percent': round(change / opening * 100, 2) if opening else 0.0,
+                'timestamp': timestamp,
+            })
+        return ticks
+
+    def queue(self, ticks):
+        """Queue ticks for the next flush, keeping only the latest per symbol."""
+        for tick in ticks:
+            self.pending[tick['symbol']] = tick
+
+    async def flush(self):
+        """
+        Send every queued tick to its symbol's group.
+
+        Group sends run concurrently in batches of PRICE_FEED_SEND_CONCURRENCY,
+        so a burst costs a few round trips to the channel layer rather than
+        one per symbol.
+
+        Returns:
+            int: Number of ticks sent
+        """
+        ticks, self.pending = list(self.pending.values()), {}
+        if not ticks:
+            return 0
+
+        await cache.aset_many(
+            {latest_price_key(tick['symbol']): tick for tick in ticks},
+            LATEST_PRICE_TIMEOUT
+        )
+        batch_size = settings.PRICE_FEED_SEND_CONCURRENCY
+        for start in range(0, len(ticks), batch_size):
+            await asyncio.gather(*(
+                self.channel_layer.group_send(price_group_name(tick['symbol']), {
+                    'type': 'price.tick',
+                    'tick': tick,
+                    'text': json.dumps({'type': 'price_tick', **tick}),
+                })
+                for tick in ticks[start:start + batch_size]
+            ))
+        return len(ticks)
+
+    async def publish(self, symbols=None):
+        """
+        Publish one tick for each of ``symbols`` (default: all held symbols).
+
+        Returns:
+            int: Number of ticks published
+        """
+        if symbols is None:
+            symbols = await database_sync_to_async(get_held_symbols)()
+        self.queue(self.build_ticks(symbols))
+        return await self.flush()
+
+    async def run(self, interval):
+        """Publish ticks every ``interval`` seconds until cancelled."""
+        while True:
+            try:
+                await self.publish()
+            except Exception as e:
+                logger.error(f"Price feed publish failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+
+_price_feed = None
+_price_feed_task = None
+
+
+def get_price_feed():
+    """Return the process-wide price feed publisher."""
+    global _price_feed
+    if _price_feed is None:
+        _price_feed = PriceFeedPublisher()
+    return _price_feed
+
+
+def ensure_in_process_feed():
+    """
+    Start this process's price feed task if it is not already running.
+
+    Does nothing unless PRICE_FEED_IN_PROCESS is enabled. Must be called
+    from a running event loop.
+    """
+    global _price_feed_task
+    if not settings.PRICE_FEED_IN_PROCESS:
+        return
+    loop = asyncio.get_running_loop()
+    if _price_feed_task is None or _price_feed_task.done() or _price_feed_task.get_loop() is not loop:
+        _price_feed_task = loop.create_task(get_price_feed().run(settings.PRICE_TICK_INTERVAL))
@@ -0,0 +1,109 @@
+"""
+Database router sending heavy reads to read replicas.
+
+Reads only go to a replica inside a ``replica_reads()`` block. These blocks
+are opened by the read-only API actions, the analytics page and the Celery
+analytics and report tasks. Everything else, and every write, uses the
+primary. Replicas are the aliases listed in DATABASE_REPLICAS; with none
+configured the router changes nothing.
+
+Replicas lag behind the primary. A user whose data version shows a write
+within the last REPLICA_STICKY_WINDOW seconds keeps reading from the
+primary, so they always see their own writes. A saved or deleted row
+inside a replica block sends the rest of the block's reads to the primary
+as well, and ``primary_reads()`` does so for code that writes in bulk.
+The router itself only answers where queries go and changes nothing.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+from .data_versions import get_user_data_versions
+
+_replica_reads = ContextVar('finflow_replica_reads', default=False)
+
+
+def recent_writers(user_ids):
+    """
+    Return the users that wrote within the sticky window.
+
+    Args:
+        user_ids: IDs of the users to check
+
+    Returns:
+        Set of the IDs whose reads must stay on the primary
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+    cutoff = (time.time() - settings.REPLICA_STICKY_WINDOW) * 1000
+    return {
+        user_id for user_id, version in get_user_data_versions(user_ids).items()
+        if version > cutoff
+    }
+
+
+@contextmanager
+def replica_reads(user_ids=()):
+    """
+    Send the reads in this block to a replica.
+
+    Args:
+        user_ids: Users whose data is read; the block stays on the primary
+            if any of them wrote within the sticky window
+
+    Yields:
+        True if reads go to a replica, False if they stay on the primary
+    """
+    use_replica = bool(settings.DATABASE_REPLICAS) and not recent_writers(user_ids)
+    token = _replica_reads.set(use_replica)
+    try:
+        yield use_replica
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Send the reads in this block to the primary, even inside replica_reads()."""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def end_replica_reads():
+    """
+    Send the rest of the current replica_reads() block's reads to the primary.
+
+    Called after writes, so a block reads its own writes back. Outside a
+    block this does nothing, and the block restores the previous routing
+    when it ends.
+    """
+    if _replica_reads.get():
+        _replica_reads.set(False)
+
+
+class ReplicaRouter:
+    """Route reads inside replica_reads() blocks to DATABASE_REPLICAS."""
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -1,6 +1,10 @@
+from collections import defaultdict
+from decimal import Decimal
+from operator import itemgetter
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Portfolio, Investment, Transaction
+from django.utils import timezone
+from .models import Portfolio, Investment, Transaction, PortfolioStats
 
 User = get_user_model()
 
@@ -146,16 +150,12 @@ class PortfolioSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
     
     def get_investment_count(self, obj):
-        """Get count of investments in this portfolio."""
-        return obj.investments.count()
+        """Get count of investments in this portfolio from its joined stats row."""
+        return PortfolioStats.objects.for_portfolio(obj).investment_count
     
     def get_total_invested(self, obj):
-        """Get total amount invested in this portfolio."""
-        from django.db.models import Sum, F
-        total = obj.investments.aggregate(
-            total=Sum(F('quantity') * F('purchase_price'))
-        )['total']
-        return total or 0
+        """Get total amount invested in this portfolio from its joined stats row."""
+        return PortfolioStats.objects.for_portfolio(obj).total_invested
 
 
 class PortfolioCreateSerializer(serializers.ModelSerializer):
@@ -199,17 +199,153 @@ class PortfolioDetailSerializer(PortfolioSerializer):
     Detailed serializer for portfolio with full investment and transaction data.
     """
     investments = InvestmentSerializer(many=True, read_only=True)
+    user_details = serializers.SerializerMethodField()
     
     class Meta(PortfolioSerializer.Meta):
         fields = PortfolioSerializer.Meta.fields + ['user_details']
     
-    def to_representation(self, instance):
-        """Add user details to the representation."""
-        data = super().to_representation(instance)
-        data['user_details'] = {
-            'username': instance.user.username,
-            'full_name': instance.user.full_name,
-            'risk_tolerance': instance.user.get_risk_tolerance_display(),
-            'investment_style': instance.user.get_investment_style_display()
+    def get_user_details(self, obj):
+        """Get details of the portfolio owner."""
+        return {
+            'username': obj.user.username,
+            'full_name': obj.user.full_name,
+            'risk_tolerance': obj.user.get_risk_tolerance_display(),
+            'investment_style': obj.user.get_investment_style_display()
+        }
+
+
+# Fast read serializers
+#
+# List endpoints can return hundreds of rows per page, and the per-field
+# machinery of ModelSerializer dominates the time spent rendering them. The
+# serializers below read rows fetched with ``QuerySet.values()`` and build
+# the same dicts as their ModelSerializer counterparts directly.
+
+TRANSACTION_TYPE_LABELS = dict(Transaction.TRANSACTION_TYPE_CHOICES)
+
+
+def _decimal_places(model, field_name):
+    """Return the quantize exponent matching a model DecimalField."""
+    return Decimal(1).scaleb(-model._meta.get_field(field_name).decimal_places)
+
+
+def _format_decimal(value, exponent):
+    """Format a decimal the way DRF's DecimalField does."""
+    if value is None:
+        return None
+    return '{:f}'.format(value.quantize(exponent))
+
+
+def _format_datetime(value, tz):
+    """Format a datetime the way DRF's DateTimeField does."""
+    if value is None:
+        return None
+    value = value.astimezone(tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class ValuesRowListSerializer(serializers.ListSerializer):
+    """
+    List serializer that lets its child prepare a whole page of rows at once.
+    """
+    
+    def to_representation(self, data):
+        rows = list(data)
+        self.child.prepare(rows)
+        return [self.child.to_representation(row) for row in rows]
+
+
+class ValuesRowSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer for rows fetched with ``QuerySet.values()``.
+    
+    Subclasses list the columns they read in ``values_fields``. Use with
+    ``many=True`` so ``prepare`` runs before the rows are rendered.
+    """
+    values_fields = ()
+    
+    class Meta:
+        list_serializer_class = ValuesRowListSerializer
+    
+    @classmethod
+    def values_queryset(cls, queryset):
+        """Turn a model queryset into the ``.values()`` rows this serializer reads."""
+        return queryset.prefetch_related(None).values(*cls.values_fields)
+    
+    def prepare(self, rows):
+        """Precompute anything shared by the rows about to be rendered."""
+        self.tz = timezone.get_current_timezone()
+        self.now = timezone.now()
+
+
+class TransactionReadSerializer(ValuesRowSerializer):
+    """
+    Fast read-only counterpart of TransactionSerializer.
+    """
+    values_fields = ('id', 'investment_id', 'transaction_type', 'amount', 'timestamp', 'notes')
+    amount_exponent = _decimal_places(Transaction, 'amount')
+    
+    def to_representation(self, row):
+        transaction_type = row['transaction_type']
+        return {
+            'id': row['id'],
+            'investment': row['investment_id'],
+            'transaction_type': transaction_type,
+            'amount': _format_decimal(row['amount'], self.amount_exponent),
+            'timestamp': _format_datetime(row['timestamp'], self.tz),
+            'notes': row['notes'],
+            'is_buy': transaction_type == 'buy',
+            'is_sell': transaction_type == 'sell',
+            'transaction_type_display': TRANSACTION_TYPE_LABELS.get(
+                transaction_type, transaction_type
+            ),
+        }
+
+
+class InvestmentReadSerializer(ValuesRowSerializer):
+    """
+    Fast read-only counterpart of InvestmentSerializer.
+    
+    Transactions of the whole page are fetched in a single query. It is not
+    ordered: sorting the page's few transactions in Python is cheaper than
+    having the database sort them.
+    """
+    values_fields = (
+        'id', 'portfolio_id', 'symbol', 'quantity', 'purchase_price', 'purchase_date',
+        'created_at', 'updated_at'
+    )
+    quantity_exponent = _decimal_places(Investment, 'quantity')
+    price_exponent = _decimal_places(Investment, 'purchase_price')
+    
+    def prepare(self, rows):
+        super().prepare(rows)
+        transaction_serializer = TransactionReadSerializer()
+        transaction_serializer.prepare(rows)
+        transaction_rows = Transaction.objects.filter(
+            investment_id__in=[row['id'] for row in rows]
+        ).order_by().values(*TransactionReadSerializer.values_fields)
+        self.transactions = defaultdict(list)
+        # Newest first, like Transaction's default ordering
+        for transaction_row in sorted(transaction_rows, key=itemgetter('timestamp'), reverse=True):
+            self.transactions[transaction_row['investment_id']].append(
+                transaction_serializer.to_representation(transaction_row)
+            )
+    
+    def to_representation(self, row):
+        quantity = row['quantity']
+        purchase_price = row['purchase_price']
+        return {
+            'id': row['id'],
+            'portfolio': row['portfolio_id'],
+            'symbol': row['symbol'],
+            'quantity': _format_decimal(quantity, self.quantity_exponent),
+            'purchase_price': _format_decimal(purchase_price, self.price_exponent),
+            'purchase_date': _format_datetime(row['purchase_date'], self.tz),
+            'total_value': quantity * purchase_price,
+            'days_held': (self.now - row['purchase_date']).days,
+            'transactions': self.transactions.get(row['id'], []),
+            'created_at': _format_datetime(row['created_at'], self.tz),
+            'updated_at': _format_datetime(row['updated_at'], self.tz),
         }
-        return data
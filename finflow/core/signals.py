@@ -0,0 +1,196 @@
+"""
+Signal handlers for the finflow core application.
+
+Changes to portfolios, investments and transactions:
+- Refresh the denormalized PortfolioStats row in the same transaction
+- Mark the owning user as dirty, so the hourly analytics refresh only
+  recomputes users whose data actually changed
+- Move the owner's data version on, invalidating everything cached from
+  their data
+- Tell the owner's open WebSockets to reload the positions they value
+
+Changes to users drop their cached copy in the authentication backend, and
+deleted API tokens or deactivated users drop their cached token lookups.
+
+Saving or deleting any row ends the current replica_reads() block's
+replica reads, so the block reads its own writes back.
+"""
+
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .analytics_state import get_state_store
+from .authentication import invalidate_cached_token, invalidate_user_tokens
+from .backends import invalidate_cached_user
+from .consumers import positions_group_name
+from .data_versions import bump_user_data_version
+from .models import User, Portfolio, Investment, Transaction, PortfolioStats
+from .routers import end_replica_reads
+
+logger = logging.getLogger(__name__)
+
+
+def _owner_id(instance):
+    """
+    Return the ID of the user owning ``instance``.
+
+    Uses already-loaded related objects when possible and otherwise falls
+    back to a single values query.
+    """
+    if isinstance(instance, Portfolio):
+        return instance.user_id
+
+    if isinstance(instance, Investment):
+        if Investment.portfolio.is_cached(instance):
+            return instance.portfolio.user_id
+        return Portfolio.objects.filter(
+            pk=instance.portfolio_id
+        ).values_list('user_id', flat=True).first()
+
+    if Transaction.investment.is_cached(instance) and \
+            Investment.portfolio.is_cached(instance.investment):
+        return instance.investment.portfolio.user_id
+    return Investment.objects.filter(
+        pk=instance.investment_id
+    ).values_list('portfolio__user_id', flat=True).first()
+
+
+def mark_user_data_changed(user_id):
+    """Move ``user_id``'s data version on, so entries cached from their data are replaced."""
+    try:
+        bump_user_data_version(user_id)
+    except Exception as e:
+        # Cached entries expire on their own; never fail the write
+        logger.warning(f"Could not bump the data version of user {user_id}: {str(e)}")
+
+
+def mark_analytics_dirty(user_id):
+    """Queue ``user_id`` for the incremental analytics refresh and bump their data version."""
+    mark_user_data_changed(user_id)
+    try:
+        get_state_store().mark_dirty([user_id])
+    except Exception as e:
+        # Analytics catch up at the next full rebuild; never fail the write
+        logger.warning(f"Could not mark user {user_id} for analytics refresh: {str(e)}")
+
+
+def notify_positions_changed(user_id):
+    """Ask ``user_id``'s open portfolio WebSockets to reload their positions."""
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            positions_group_name(user_id), {'type': 'positions.changed'}
+        )
+    except Exception as e:
+        # Sockets keep their old positions until they reconnect; never fail the write
+        logger.warning(f"Could not notify user {user_id} of changed positions: {str(e)}")
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def end_replica_reads_after_write(sender, **kwargs):
+    """Read the rest of the current replica_reads() block from the primary."""
+    end_replica_reads()
+
+
+@receiver(post_save, sender=Portfolio)
+@receiver(post_delete, sender=Portfolio)
+@receiver(post_save, sender=Investment)
+@receiver(post_delete, sender=Investment)
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def mark_owner_analytics_dirty(sender, instance, origin=None, **kwargs):
+    """
+    Queue the owner of a changed row for the incremental analytics refresh.
+
+    Portfolio and investment changes also alter the positions the owner's
+    live WebSockets hold in memory, so those are told to reload.
+
+    Investments and transactions removed by a cascade are skipped: the
+    portfolio or investment deleted with them marks the owner once, instead
+    of one owner lookup and cache write per removed row.
+    """
+    if sender is not Portfolio and _deleted_by_cascade(sender, origin):
+        return
+    user_id = _owner_id(instance)
+    if user_id is None:
+        return
+    # Bumped again on commit, so nothing cached from the old rows meanwhile survives
+    mark_user_data_changed(user_id)
+    transaction.on_commit(lambda: mark_analytics_dirty(user_id))
+    if sender is not Transaction:
+        transaction.on_commit(lambda: notify_positions_changed(user_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user_on_change(sender, instance, **kwargs):
+    """Drop the cached user now and again once the change is visible to other connections."""
+    user_id = instance.pk
+    invalidate_cached_user(user_id)
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
+    if kwargs.get('signal') is post_delete or not instance.is_active:
+        invalidate_user_tokens(user_id)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token_on_delete(sender, instance, **kwargs):
+    """Stop accepting a deleted API token from the cache."""
+    key = instance.key
+    invalidate_cached_token(key)
+    transaction.on_commit(lambda: invalidate_cached_token(key))
+
+
+@receiver(post_save, sender=Portfolio)
+def create_portfolio_stats(sender, instance, created, raw=False, **kwargs):
+    """Give every new portfolio an empty stats row."""
+    if created and not raw:
+        PortfolioStats.objects.get_or_create(portfolio=instance)
+
+
+@receiver(post_save, sender=Investment)
+@receiver(post_save, sender=Transaction)
+def refresh_portfolio_stats_on_save(sender, instance, raw=False, **kwargs):
+    """Recompute the stats of the portfolio an investment or transaction belongs to."""
+    if raw:
+        return
+    PortfolioStats.objects.refresh([_portfolio_id(instance)], lock=True)
+
+
+@receiver(post_delete, sender=Investment)
+@receiver(post_delete, sender=Transaction)
+def refresh_portfolio_stats_on_delete(sender, instance, origin=None, **kwargs):
+    """
+    Recompute portfolio stats after a delete.
+
+    Only deletes started on the sender itself are handled: rows removed by
+    a cascade from their portfolio (or user) leave nothing to update, and
+    transactions removed with their investment are covered by the
+    investment's own handler.
+    """
+    if _deleted_by_cascade(sender, origin):
+        return
+    PortfolioStats.objects.refresh([_portfolio_id(instance)], lock=True)
+
+
+def _deleted_by_cascade(sender, origin):
+    """Return whether a post_delete for ``sender`` comes from deleting another model."""
+    if origin is None:
+        return False
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin_model is not sender
+
+
+def _portfolio_id(instance):
+    if isinstance(instance, Investment):
+        return instance.portfolio_id
+    if Transaction.investment.is_cached(instance):
+        return instance.investment.portfolio_id
+    return Investment.objects.filter(
+        pk=instance.investment_id
+    ).values_list('portfolio_id', flat=True).get()
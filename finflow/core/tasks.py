@@ -7,84 +7,107 @@ portfolio analytics, maintenance, and monitoring.
 
 import os
 import logging
-from datetime import datetime, timedelta
-from celery import shared_task
+from datetime import datetime, timedelta, timezone as dt_timezone
+from asgiref.sync import async_to_sync
+from celery import chord, group, shared_task
 from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.db.models import Sum, F, Count, Avg
 from django.utils import timezone
 
 # Import models
 from .models import Portfolio, Investment, Transaction, User
+from .analytics import (
+    CACHE_TIMEOUT, USER_CHUNK_SIZE,
+    PortfolioAnalyticsEngine, global_analytics_from_state, merge_partial_results,
+    partition_user_ids, refresh_users,
+)
+from .analytics_state import get_state_store
+from .cache_keys import global_analytics_key, portfolio_report_key
+from .importers import IMPORT_BATCH_SIZE, TransactionImporter, TransactionImportError
+from .prices import get_price_feed
+from .routers import recent_writers, replica_reads
 
 logger = logging.getLogger(__name__)
 
+# Dirty users recomputed per batch by the incremental analytics refresh
+DIRTY_USER_BATCH_SIZE = 1000
+
 
 @shared_task(bind=True, name='finflow.core.tasks.refresh_portfolio_analytics')
-def refresh_portfolio_analytics(self):
+def refresh_portfolio_analytics(self, batch_size=DIRTY_USER_BATCH_SIZE):
     """
     Periodic task to refresh portfolio analytics every hour.
     
-    This task:
-    - Calculates portfolio performance metrics
-    - Updates cached analytics data
-    - Generates portfolio summaries
-    - Logs analytics refresh completion
+    This task is incremental:
+    - Pops the users whose investments, transactions or portfolios changed
+      since the last run from the dirty set
+    - Recomputes only those users, in batches of grouped queries
+    - Applies the difference to the global analytics as additive deltas
+    
+    When there is no global state yet (first run, or a rebuild that never
+    finished) a full rebuild is dispatched instead.
     """
+    state_store = get_state_store()
+    
+    try:
+        if not state_store.acquire_lock():
+            logger.info("Portfolio analytics rebuild in progress, skipping refresh.")
+            return {
+                'status': 'skipped',
+                'message': 'Portfolio analytics rebuild in progress',
+                'task_id': self.request.id,
+                'timestamp': timezone.now().isoformat()
+            }
+    except Exception as e:
+        logger.error(f"Error refreshing portfolio analytics: {str(e)}")
+        print(f"Analytics refresh failed: {str(e)}")
+        raise self.retry(exc=e, countdown=300, max_retries=3)
+    
     try:
         logger.info("Starting portfolio analytics refresh...")
         
-        # Get all active portfolios
-        portfolios = Portfolio.objects.filter(is_active=True)
-        total_portfolios = portfolios.count()
-        
-        # Calculate overall portfolio metrics
-        all_investments = Investment.objects.filter(portfolio__in=portfolios)
-        total_investments = all_investments.count()
-        unique_symbols = all_investments.values('symbol').distinct().count()
-        
-        # Calculate total invested amount
-        total_invested = all_investments.aggregate(
-            total=Sum(F('quantity') * F('purchase_price'))
-        )['total'] or 0
-        
-        # Get transaction metrics
-        all_transactions = Transaction.objects.filter(
-            investment__portfolio__in=portfolios
-        )
-        total_transactions = all_transactions.count()
-        buy_transactions = all_transactions.filter(transaction_type='buy').count()
-        sell_transactions = all_transactions.filter(transaction_type='sell').count()
-        
-        # Calculate analytics data
-        analytics_data = {
-            'timestamp': timezone.now().isoformat(),
-            'total_portfolios': total_portfolios,
-            'total_investments': total_investments,
-            'unique_symbols': unique_symbols,
-            'total_invested': float(total_invested),
-            'total_transactions': total_transactions,
-            'buy_transactions': buy_transactions,
-            'sell_transactions': sell_transactions,
-            'task_id': self.request.id,
-        }
-        
-        # Cache the analytics data for 1 hour
-        cache_key = 'portfolio_analytics_global'
-        cache.set(cache_key, analytics_data, 3600)  # 1 hour cache
+        state = state_store.get_state()
+        if state is None:
+            rebuild_portfolio_analytics.delay()
+            state_store.release_lock()
+            logger.info("No portfolio analytics state found, dispatched a full rebuild.")
+            return {
+                'status': 'rebuild_dispatched',
+                'message': 'No analytics state found, full rebuild dispatched',
+                'task_id': self.request.id,
+                'timestamp': timezone.now().isoformat()
+            }
         
-        # Generate per-user analytics
-        for user in User.objects.filter(is_active=True):
-            user_portfolios = portfolios.filter(user=user)
-            if user_portfolios.exists():
-                user_analytics = _generate_user_analytics(user, user_portfolios)
-                user_cache_key = f'portfolio_analytics_user_{user.id}'
-                cache.set(user_cache_key, user_analytics, 3600)
+        users_processed = 0
+        while True:
+            user_ids = state_store.pop_dirty(batch_size)
+            if not user_ids:
+                break
+            try:
+                # Users who just wrote are read from the primary, the rest from a replica
+                recent = recent_writers(user_ids)
+                settled = [user_id for user_id in user_ids if user_id not in recent]
+                if settled:
+                    with replica_reads():
+                        users_processed += refresh_users(settled, state, state_store)
+                if recent:
+                    users_processed += refresh_users(sorted(recent), state, state_store)
+            except Exception:
+                # Put the batch back so the next run picks it up again
+                state_store.mark_dirty(user_ids)
+                raise
+        
+        analytics_data = global_analytics_from_state(state)
+        analytics_data['task_id'] = self.request.id
+        
+        # Cache the global analytics data
+        cache.set(global_analytics_key(), analytics_data, CACHE_TIMEOUT)
+        state_store.release_lock()
         
         # Log completion
         logger.info(f"Portfolio analytics refreshed successfully. "
-                   f"Processed {total_portfolios} portfolios, "
-                   f"{total_investments} investments, "
-                   f"{total_transactions} transactions.")
+                   f"Recomputed {users_processed} changed users.")
         
         # Print the required message
         print("Analytics refreshed")
@@ -93,16 +116,153 @@ def refresh_portfolio_analytics(self):
             'status': 'success',
             'message': 'Portfolio analytics refreshed successfully',
             'data': analytics_data,
+            'users_processed': users_processed,
             'task_id': self.request.id,
             'timestamp': timezone.now().isoformat()
         }
         
     except Exception as e:
+        state_store.release_lock()
         logger.error(f"Error refreshing portfolio analytics: {str(e)}")
         print(f"Analytics refresh failed: {str(e)}")
         raise self.retry(exc=e, countdown=300, max_retries=3)
 
 
+@shared_task(bind=True, name='finflow.core.tasks.rebuild_portfolio_analytics')
+def rebuild_portfolio_analytics(self, chunk_size=USER_CHUNK_SIZE):
+    """
+    Periodic task to rebuild portfolio analytics from scratch every day.
+    
+    This task is the coordinator of the full rebuild:
+    - Partitions the owners of active portfolios into user ID ranges
+    - Dispatches one analytics chunk per range on the analytics queue
+    - Chains a reducer that builds the global analytics once every chunk
+      has finished
+    
+    Chunks are retried individually, so a single failure does not re-run
+    the whole rebuild. The analytics lock is held until the reducer runs.
+    """
+    state_store = get_state_store()
+    
+    try:
+        if not state_store.acquire_lock():
+            raise RuntimeError("Portfolio analytics refresh in progress")
+    except Exception as e:
+        logger.warning(f"Portfolio analytics rebuild postponed: {str(e)}")
+        raise self.retry(exc=e, countdown=60, max_retries=10)
+    
+    try:
+        logger.info("Starting portfolio analytics rebuild...")
+        
+        state_store.reset()
+        with replica_reads():
+            user_ranges = partition_user_ids(chunk_size=chunk_size)
+        
+        if user_ranges:
+            header = group(
+                refresh_user_analytics_chunk.s(first_user_id, last_user_id).set(queue='analytics')
+                for first_user_id, last_user_id in user_ranges
+            )
+            chord(header)(reduce_portfolio_analytics.s().set(queue='analytics'))
+        else:
+            # Nothing to fan out; publish empty global analytics right away
+            reduce_portfolio_analytics([])
+        
+        logger.info(f"Dispatched portfolio analytics rebuild in {len(user_ranges)} chunks.")
+        
+        return {
+            'status': 'dispatched',
+            'message': 'Portfolio analytics rebuild dispatched',
+            'chunks': len(user_ranges),
+            'task_id': self.request.id,
+            'timestamp': timezone.now().isoformat()
+        }
+        
+    except Exception as e:
+        state_store.release_lock()
+        logger.error(f"Error rebuilding portfolio analytics: {str(e)}")
+        print(f"Analytics rebuild failed: {str(e)}")
+        raise self.retry(exc=e, countdown=300, max_retries=3)
+
+
+@shared_task(bind=True, name='finflow.core.tasks.refresh_user_analytics_chunk')
+def refresh_user_analytics_chunk(self, first_user_id, last_user_id):
+    """
+    Refresh the cached analytics for users in an inclusive ID range.
+    
+    Streams the per-user payloads for the range into the cache using a fixed
+    number of grouped queries, stores each user's contribution and returns
+    the partial global state for the reducer.
+    """
+    try:
+        portfolios = Portfolio.objects.filter(
+            is_active=True,
+            user_id__gte=first_user_id,
+            user_id__lte=last_user_id,
+        )
+        # The chunk is read from a replica unless one of its users just wrote
+        with replica_reads():
+            user_ids = list(portfolios.values_list('user_id', flat=True).distinct())
+        with replica_reads(user_ids=user_ids):
+            engine = PortfolioAnalyticsEngine(portfolios)
+            users_processed = engine.write_user_cache(
+                timeout=CACHE_TIMEOUT, state_store=get_state_store()
+            )
+        
+        partial = engine.state()
+        partial['users_processed'] = users_processed
+        
+        logger.info(f"Refreshed analytics for {users_processed} users "
+                   f"(IDs {first_user_id}-{last_user_id}).")
+        
+        return partial
+        
+    except Exception as e:
+        logger.error(f"Error refreshing analytics for users "
+                    f"{first_user_id}-{last_user_id}: {str(e)}")
+        raise self.retry(exc=e, countdown=60, max_retries=3)
+
+
+@shared_task(bind=True, name='finflow.core.tasks.reduce_portfolio_analytics')
+def reduce_portfolio_analytics(self, partials):
+    """
+    Build the global portfolio analytics from the partial chunk results.
+    
+    Runs as the chord callback of rebuild_portfolio_analytics and releases
+    the analytics lock once the new global state is stored.
+    """
+    state_store = get_state_store()
+    state = merge_partial_results(partials)
+    state_store.save(state=state)
+    state_store.release_lock()
+    
+    analytics_data = global_analytics_from_state(state)
+    analytics_data['task_id'] = self.request.id
+    users_processed = sum(partial['users_processed'] for partial in partials)
+    
+    # Cache the global analytics data
+    cache.set(global_analytics_key(), analytics_data, CACHE_TIMEOUT)
+    
+    # Log completion
+    logger.info(f"Portfolio analytics rebuilt successfully. "
+               f"Processed {analytics_data['total_portfolios']} portfolios, "
+               f"{analytics_data['total_investments']} investments, "
+               f"{analytics_data['total_transactions']} transactions "
+               f"for {users_processed} users in {len(partials)} chunks.")
+    
+    # Print the required message
+    print("Analytics refreshed")
+    
+    return {
+        'status': 'success',
+        'message': 'Portfolio analytics rebuilt successfully',
+        'data': analytics_data,
+        'users_processed': users_processed,
+        'task_id': self.request.id,
+        'timestamp': timezone.now().isoformat()
+    }
+
+
 @shared_task(bind=True, name='finflow.core.tasks.cleanup_old_logs')
 def cleanup_old_logs(self):
     """
@@ -122,15 +282,15 @@ def cleanup_old_logs(self):
                 if filename.endswith('.log'):
                     file_path = os.path.join(log_dir, filename)
                     if os.path.isfile(file_path):
-                        file_mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
-                        if file_mtime.replace(tzinfo=timezone.utc) < cutoff_date:
+                        file_mtime = datetime.fromtimestamp(os.path.getmtime(file_path), tz=dt_timezone.utc)
+                        if file_mtime < cutoff_date:
                             os.remove(file_path)
                             cleaned_files += 1
                             logger.info(f"Removed old log file: {filename}")
         
         # Clean up old cache entries
         cache.delete_many([
-            'portfolio_analytics_global',
+            global_analytics_key(),
             'old_cache_key_1',
             'old_cache_key_2',
         ])
@@ -213,27 +373,30 @@ def generate_portfolio_report(self, user_id, portfolio_id=None):
     Can be triggered manually or scheduled.
     """
     try:
-        user = User.objects.get(id=user_id)
-        
-        if portfolio_id:
-            portfolios = Portfolio.objects.filter(user=user, id=portfolio_id, is_active=True)
-        else:
-            portfolios = Portfolio.objects.filter(user=user, is_active=True)
-        
-        if not portfolios.exists():
-            return {
-                'status': 'error',
-                'message': 'No portfolios found for user',
-                'user_id': user_id
-            }
-        
-        report_data = []
-        for portfolio in portfolios:
-            portfolio_data = _generate_user_analytics(user, [portfolio])
-            report_data.append(portfolio_data)
+        with replica_reads(user_ids=[user_id]):
+            user = User.objects.get(id=user_id)
+            
+            if portfolio_id:
+                portfolios = Portfolio.objects.filter(user=user, id=portfolio_id, is_active=True)
+            else:
+                portfolios = Portfolio.objects.filter(user=user, is_active=True)
+            
+            if not portfolios.exists():
+                return {
+                    'status': 'error',
+                    'message': 'No portfolios found for user',
+                    'user_id': user_id
+                }
+            
+            report_data = []
+            for portfolio in portfolios:
+                portfolio_data = _generate_user_analytics(
+                    user, Portfolio.objects.filter(pk=portfolio.pk)
+                )
+                report_data.append(portfolio_data)
         
         # Cache the report
-        cache_key = f'portfolio_report_user_{user_id}_{timezone.now().strftime("%Y%m%d")}'
+        cache_key = portfolio_report_key(user_id, timezone.now())
         cache.set(cache_key, report_data, 86400)  # 24 hours
         
         logger.info(f"Generated portfolio report for user {user_id}")
@@ -259,6 +422,83 @@ def generate_portfolio_report(self, user_id, portfolio_id=None):
         raise self.retry(exc=e, countdown=300, max_retries=2)
 
 
+@shared_task(bind=True, name='finflow.core.tasks.import_transactions_file')
+def import_transactions_file(self, user_id, path, file_format, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import an uploaded transaction file in the background.
+    
+    Reports progress through the task state after every batch and deletes
+    the uploaded file from storage when done.
+    
+    Args:
+        user_id: Owner of the portfolios the rows refer to
+        path: Storage path of the uploaded CSV or NDJSON file
+        file_format: 'csv' or 'ndjson'
+        batch_size: Rows validated and inserted per atomic block
+    """
+    def report_progress(result):
+        self.update_state(
+            state='PROGRESS',
+            meta={
+                'user_id': user_id,
+                'rows': result['rows'],
+                'imported': result['imported'],
+                'failed': result['failed'],
+            }
+        )
+    
+    try:
+        user = User.objects.get(id=user_id)
+        importer = TransactionImporter(user, batch_size=batch_size, progress=report_progress)
+        with default_storage.open(path, 'rb') as stream:
+            result = importer.run(stream, file_format)
+        
+        return {
+            'status': 'success',
+            'message': f"Imported {result['imported']} of {result['rows']} rows",
+            'user_id': user_id,
+            **result,
+            'task_id': self.request.id,
+            'timestamp': timezone.now().isoformat()
+        }
+        
+    except User.DoesNotExist:
+        logger.error(f"User {user_id} not found")
+        return {
+            'status': 'error',
+            'message': f'User {user_id} not found',
+            'task_id': self.request.id
+        }
+    except TransactionImportError as e:
+        logger.error(f"Could not import {path}: {str(e)}")
+        return {
+            'status': 'error',
+            'message': str(e),
+            'task_id': self.request.id
+        }
+    finally:
+        # Batches already imported are committed, so a retry would duplicate them
+        default_storage.delete(path)
+
+
+@shared_task(bind=True, name='finflow.core.tasks.publish_price_ticks', ignore_result=True)
+def publish_price_ticks(self):
+    """
+    Publish one market price tick per held symbol to the channel layer.
+    
+    Scheduled by beat every PRICE_TICK_INTERVAL seconds when the ASGI
+    processes do not run the price feed themselves.
+    """
+    published = async_to_sync(get_price_feed().publish)()
+    
+    return {
+        'status': 'success',
+        'ticks_published': published,
+        'task_id': self.request.id,
+        'timestamp': timezone.now().isoformat()
+    }
+
+
 @shared_task(bind=True, name='finflow.core.tasks.send_portfolio_notifications')
 def send_portfolio_notifications(self):
     """
@@ -0,0 +1,43 @@
+"""
+Test helpers for the finflow.core WebSocket consumers.
+
+Shared by the test suite and the WebSocket benchmark.
+"""
+
+import json
+from asgiref.testing import ApplicationCommunicator
+
+
+class WebsocketCommunicator(ApplicationCommunicator):
+    """
+    Minimal WebSocket test client for a consumer application.
+
+    Mirrors the parts of channels.testing.WebsocketCommunicator these tests
+    use, which cannot be imported without daphne installed.
+    """
+
+    def __init__(self, application, path, user=None):
+        self.scope = {'type': 'websocket', 'path': path, 'query_string': b'', 'headers': []}
+        if user is not None:
+            self.scope['user'] = user
+        super().__init__(application, self.scope)
+
+    async def connect(self, timeout=1):
+        await self.send_input({'type': 'websocket.connect'})
+        response = await self.receive_output(timeout)
+        return response['type'] == 'websocket.accept', response
+
+    async def send_json_to(self, data):
+        await self.send_input({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def receive_from(self, timeout=1):
+        response = await self.receive_output(timeout)
+        assert response['type'] == 'websocket.send', response
+        return response.get('text', response.get('bytes'))
+
+    async def receive_json_from(self, timeout=1):
+        return json.loads(await self.receive_from(timeout))
+
+    async def disconnect(self, code=1000, timeout=1):
+        await self.send_input({'type': 'websocket.disconnect', 'code': code})
+        await self.wait(timeout)
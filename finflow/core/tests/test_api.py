@@ -8,19 +8,28 @@ This module contains comprehensive tests for:
 - Transaction CRUD operations
 - API permissions and access control
 - API response formats and status codes
+- Query counts of the list and detail endpoints
+- Counted and cursor pagination of the transaction and investment lists
+- Caching pages and summaries under per-user data versions
+- Conditional GETs of the portfolio, investment and transaction endpoints
 """
 
 import json
+from datetime import timedelta
 from decimal import Decimal
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from django.utils import timezone
 
+from ..cache_keys import user_data_version_key
+from ..data_versions import get_user_data_version, get_user_data_versions
 from ..models import Portfolio, Investment, Transaction
+from ..throttling import get_login_failures
 
 User = get_user_model()
 
@@ -30,6 +39,8 @@ class AuthenticationAPITest(APITestCase):
     
     def setUp(self):
         """Set up test data."""
+        cache.clear()
+        get_login_failures().clear()
         self.client = APIClient()
         self.user_data = {
             'username': 'testuser',
@@ -955,3 +966,421 @@ class APIResponseFormatTest(APITestCase):
         # Try to use PATCH on a list endpoint (not allowed)
         response = self.client.patch('/api/portfolios/', {}, format='json')
         self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class APIQueryCountTest(APITestCase):
+    """
+    Regression tests guarding the API endpoints against N+1 queries.
+    
+    Requests are force-authenticated, so the budgets count the endpoints'
+    own queries whichever authentication classes are configured.
+    """
+    
+    # Page count, portfolios joined with user and stats, investments,
+    # transactions
+    PORTFOLIO_LIST_QUERIES = 4
+    # Portfolio joined with user and stats, investments, transactions
+    PORTFOLIO_DETAIL_QUERIES = 3
+    # Page count, page of investments, transactions
+    INVESTMENT_LIST_QUERIES = 3
+    
+    def setUp(self):
+        """Set up test data."""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='queryuser',
+            email='query@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+    
+    def create_holdings(self, portfolios, investments, transactions):
+        """Create portfolios with the given number of investments and transactions each."""
+        for portfolio_index in range(portfolios):
+            portfolio = Portfolio.objects.create(
+                user=self.user, name=f'Portfolio {Portfolio.objects.count()}'
+            )
+            for investment_index in range(investments):
+                investment = Investment.objects.create(
+                    portfolio=portfolio,
+                    symbol=f'SYM{investment_index}',
+                    quantity=Decimal('10.000000'),
+                    purchase_price=Decimal('100.00')
+                )
+                for _ in range(transactions):
+                    Transaction.objects.create(
+                        investment=investment,
+                        transaction_type='buy',
+                        amount=Decimal('1000.00')
+                    )
+        return portfolio
+    
+    def test_portfolio_list_query_count(self):
+        """Test that the portfolio list uses a fixed number of queries."""
+        self.create_holdings(portfolios=1, investments=1, transactions=1)
+        with self.assertNumQueries(self.PORTFOLIO_LIST_QUERIES):
+            response = self.client.get('/api/portfolios/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        self.create_holdings(portfolios=5, investments=4, transactions=3)
+        with self.assertNumQueries(self.PORTFOLIO_LIST_QUERIES):
+            response = self.client.get('/api/portfolios/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 6)
+    
+    def test_portfolio_list_values(self):
+        """Test that prefetched data matches the stored holdings."""
+        portfolio = self.create_holdings(portfolios=1, investments=3, transactions=2)
+        
+        response = self.client.get('/api/portfolios/')
+        
+        result = response.data['results'][0]
+        self.assertEqual(result['id'], portfolio.id)
+        self.assertEqual(result['investment_count'], 3)
+        self.assertEqual(Decimal(str(result['total_invested'])), Decimal('3000.00'))
+        self.assertEqual(len(result['investments']), 3)
+        for investment in result['investments']:
+            self.assertEqual(len(investment['transactions']), 2)
+    
+    def test_portfolio_detail_query_count(self):
+        """Test that the portfolio detail uses a fixed number of queries."""
+        portfolio = self.create_holdings(portfolios=1, investments=1, transactions=1)
+        with self.assertNumQueries(self.PORTFOLIO_DETAIL_QUERIES):
+            self.client.get(f'/api/portfolios/{portfolio.id}/')
+        
+        for index in range(5):
+            investment = Investment.objects.create(
+                portfolio=portfolio,
+                symbol=f'EXTRA{index}',
+                quantity=Decimal('1.000000'),
+                purchase_price=Decimal('10.00')
+            )
+            Transaction.objects.create(
+                investment=investment, transaction_type='buy', amount=Decimal('10.00')
+            )
+        with self.assertNumQueries(self.PORTFOLIO_DETAIL_QUERIES):
+            response = self.client.get(f'/api/portfolios/{portfolio.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['investments']), 6)
+    
+    def test_my_portfolios_query_count(self):
+        """Test that my_portfolios does not query per portfolio."""
+        self.create_holdings(portfolios=4, investments=2, transactions=2)
+        # Same as the list without the page count
+        with self.assertNumQueries(self.PORTFOLIO_LIST_QUERIES - 1):
+            response = self.client.get('/api/portfolios/my_portfolios/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 4)
+    
+    def test_investment_list_query_count(self):
+        """Test that the investment list does not query per investment."""
+        self.create_holdings(portfolios=2, investments=5, transactions=3)
+        with self.assertNumQueries(self.INVESTMENT_LIST_QUERIES):
+            response = self.client.get('/api/investments/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 10)
+
+
+class CursorPaginationTest(APITestCase):
+    """Test cases for cursor pagination of transactions and investments."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='cursoruser',
+            email='cursor@example.com',
+            password='testpass123'
+        )
+        self.token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Cursor Portfolio')
+        self.investment = Investment.objects.create(
+            portfolio=self.portfolio,
+            symbol='AAPL',
+            quantity=Decimal('10.000000'),
+            purchase_price=Decimal('150.00')
+        )
+        for index in range(24):
+            Transaction.objects.create(
+                investment=self.investment,
+                transaction_type='buy',
+                amount=Decimal(index)
+            )
+    
+    def walk(self, url):
+        """Follow ``next`` links from ``url`` and return every result."""
+        results = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            results.extend(response.data['results'])
+            url = response.data['next']
+        return results
+    
+    def test_transactions_walk_all_pages_in_order(self):
+        """Test that following cursors returns each transaction once, newest first."""
+        results = self.walk('/api/transactions/?pagination=cursor&page_size=10')
+        
+        expected = list(
+            Transaction.objects.order_by('-timestamp', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual([result['id'] for result in results], expected)
+    
+    def test_transactions_with_identical_timestamps(self):
+        """Test that rows sharing a timestamp are neither skipped nor repeated."""
+        Transaction.objects.update(timestamp=timezone.now())
+        
+        results = self.walk('/api/transactions/?pagination=cursor&page_size=7')
+        
+        ids = [result['id'] for result in results]
+        self.assertEqual(len(ids), 24)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+    
+    def test_investments_walk_all_pages(self):
+        """Test that investments are paginated by purchase date."""
+        for index in range(11):
+            Investment.objects.create(
+                portfolio=self.portfolio,
+                symbol=f'SYM{index}',
+                quantity=Decimal('1.000000'),
+                purchase_price=Decimal('10.00')
+            )
+        
+        results = self.walk('/api/investments/?pagination=cursor&page_size=5')
+        
+        expected = list(
+            Investment.objects.order_by('-purchase_date', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual([result['id'] for result in results], expected)
+    
+    def test_transaction_page_skips_count(self):
+        """Test that a cursor page of transactions takes no COUNT(*) query."""
+        # Token lookup and the page of transactions
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/transactions/?pagination=cursor')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIn('pagination=cursor', response.data['next'])
+    
+    def test_lists_keep_count_by_default(self):
+        """Test that without cursor mode lists are paged by number with a count."""
+        response = self.client.get('/api/transactions/?page_size=10&page=3')
+        
+        self.assertEqual(response.data['count'], 24)
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertIsNone(response.data['next'])
+        expected = list(
+            Transaction.objects.order_by('-timestamp', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual([result['id'] for result in response.data['results']], expected[20:])
+        
+        response = self.client.get('/api/investments/')
+        self.assertEqual(response.data['count'], 1)
+
+
+class DataVersionCachingTest(APITestCase):
+    """Test cases for caching pages and payloads under per-user data versions."""
+    
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='versioned',
+            email='versioned@example.com',
+            password='testpass123'
+        )
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Versioned')
+        Investment.objects.create(
+            portfolio=self.portfolio,
+            symbol='AAPL',
+            quantity=Decimal('10.000000'),
+            purchase_price=Decimal('100.00')
+        )
+    
+    def add_investment(self, symbol):
+        return Investment.objects.create(
+            portfolio=self.portfolio,
+            symbol=symbol,
+            quantity=Decimal('1.000000'),
+            purchase_price=Decimal('50.00')
+        )
+    
+    def test_missing_version_is_seeded(self):
+        """Test that a version lost from the cache is replaced by a new one instead of 0."""
+        before = get_user_data_version(self.user.id)
+        cache.delete(user_data_version_key(self.user.id))
+        
+        seeded = get_user_data_version(self.user.id)
+        self.assertGreaterEqual(seeded, before)
+        self.assertEqual(cache.get(user_data_version_key(self.user.id)), seeded)
+        self.assertEqual(get_user_data_versions([self.user.id, 0])[self.user.id], seeded)
+        self.assertTrue(get_user_data_versions([0])[0])
+    
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_versions_are_not_kept_without_a_shared_cache(self):
+        """Test that nothing is served from a per-process cache under a data version."""
+        self.client.force_authenticate(self.user)
+        url = f'/api/portfolios/{self.portfolio.id}/summary/'
+        self.client.get(url)
+        
+        # Even a write another process never told this one about shows up
+        self.add_investment('MSFT')
+        self.assertEqual(self.client.get(url).data['total_investments'], 2)
+    
+    def test_analytics_page_revalidates_with_etag(self):
+        """Test that an unchanged analytics page is answered with a 304."""
+        self.client.force_login(self.user)
+        response = self.client.get('/analytics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+        
+        response = self.client.get('/analytics/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        self.add_investment('MSFT')
+        response = self.client.get('/analytics/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_analytics_page_is_invalidated_by_writes(self):
+        """Test that a write shows on the analytics page straight away."""
+        self.client.force_login(self.user)
+        response = self.client.get('/analytics/')
+        self.assertEqual(response.context['analytics']['overview']['active_investments'], 1)
+        
+        self.add_investment('MSFT')
+        response = self.client.get('/analytics/')
+        self.assertEqual(response.context['analytics']['overview']['active_investments'], 2)
+    
+    def test_summary_is_cached_until_a_write(self):
+        """Test that portfolio summaries are served from the cache until the data changes."""
+        self.client.force_authenticate(self.user)
+        url = f'/api/portfolios/{self.portfolio.id}/summary/'
+        self.assertEqual(self.client.get(url).data['total_investments'], 1)
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data['total_investments'], 1)
+        self.assertEqual(response.data['age_days'], 0)
+        
+        self.add_investment('MSFT')
+        self.assertEqual(self.client.get(url).data['total_investments'], 2)
+    
+    def test_cached_summary_is_not_shared_between_users(self):
+        """Test that another user cannot read a cached summary."""
+        self.client.force_authenticate(self.user)
+        self.client.get(f'/api/portfolios/{self.portfolio.id}/summary/')
+        
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_authenticate(other)
+        response = self.client.get(f'/api/portfolios/{self.portfolio.id}/summary/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalGetTest(APITestCase):
+    """Test cases for ETags and 304 responses of the REST API."""
+    
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='polling',
+            email='polling@example.com',
+            password='testpass123'
+        )
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Polled')
+        self.investment = Investment.objects.create(
+            portfolio=self.portfolio,
+            symbol='AAPL',
+            quantity=Decimal('10.000000'),
+            purchase_price=Decimal('100.00')
+        )
+        self.client.force_authenticate(self.user)
+    
+    def test_unchanged_list_is_not_modified_without_queries(self):
+        """Test that polling an unchanged list gets a 304 without touching the database."""
+        response = self.client.get('/api/portfolios/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/portfolios/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+    
+    def test_writes_change_the_etag(self):
+        """Test that a write makes the next poll return the new data."""
+        url = f'/api/investments/{self.investment.id}/transactions/'
+        etag = self.client.get(url)['ETag']
+        
+        Transaction.objects.create(
+            investment=self.investment, transaction_type='buy', amount=Decimal('1000.00')
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_etags_differ_by_url_and_user(self):
+        """Test that ETags are not reused across pages, endpoints or users."""
+        etag = self.client.get('/api/transactions/')['ETag']
+        
+        self.assertNotEqual(self.client.get('/api/transactions/?page_size=5')['ETag'], etag)
+        self.assertNotEqual(self.client.get('/api/investments/')['ETag'], etag)
+        
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_authenticate(other)
+        response = self.client.get('/api/transactions/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_evicted_data_version_changes_the_etag(self):
+        """Test that a data version lost from the cache is seeded anew rather than reused."""
+        url = f'/api/portfolios/{self.portfolio.id}/'
+        etag = self.client.get(url)['ETag']
+        
+        # Portfolio rows are updated without signals, as by a bulk update
+        Portfolio.objects.filter(pk=self.portfolio.pk).update(name='Renamed')
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Renamed')
+        self.assertNotEqual(response['ETag'], etag)
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_without_shared_cache_etag_follows_updated_at(self):
+        """Test that ETags come from the database with one aggregate query when the cache is local."""
+        url = f'/api/portfolios/{self.portfolio.id}/'
+        etag = self.client.get(url)['ETag']
+        
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        # Written by another process, so this one's cache was never told
+        Portfolio.objects.filter(pk=self.portfolio.pk).update(
+            name='Renamed', updated_at=timezone.now() + timedelta(seconds=1)
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Renamed')
+    
+    def test_writes_and_browsable_api_have_no_etag(self):
+        """Test that only GETs of JSON get ETags."""
+        response = self.client.post('/api/portfolios/', {'name': 'New'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('ETag', response)
+        
+        response = self.client.get('/api/portfolios/', HTTP_ACCEPT='text/html')
+        self.assertNotIn('ETag', response)
@@ -0,0 +1,148 @@
+"""
+Test cases for the finflow.core authentication backend.
+
+This module contains tests for:
+- Case-insensitive login by username or email
+- The lower() indexes used by the login lookup
+- Caching users between requests and invalidating them on change
+- Caching API token lookups and invalidating them on logout and deactivation
+"""
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ..authentication import get_local_token_cache
+from ..backends import UsernameOrEmailBackend
+from ..models import User
+
+
+class UsernameOrEmailBackendTest(TestCase):
+    """Test cases for UsernameOrEmailBackend."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.backend = UsernameOrEmailBackend()
+        self.user = User.objects.create_user(
+            username='AuthUser',
+            email='Auth.User@Example.com',
+            password='testpass123'
+        )
+
+    def test_authenticate_by_username_or_email(self):
+        """Test that usernames and emails match regardless of case."""
+        for login in ('authuser', 'AUTHUSER', 'auth.user@example.com'):
+            with self.subTest(login=login):
+                self.assertEqual(
+                    self.backend.authenticate(None, username=login, password='testpass123'),
+                    self.user
+                )
+
+        self.assertIsNone(self.backend.authenticate(None, username='authuser', password='wrong'))
+        self.assertIsNone(self.backend.authenticate(None, username='nobody', password='testpass123'))
+
+    def test_login_lookup_uses_lower_indexes(self):
+        """Test that the login query can seek the lower() indexes."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'EXPLAIN QUERY PLAN SELECT id FROM auth_user '
+                'WHERE LOWER(username) = %s OR LOWER(email) = %s',
+                ['authuser', 'authuser']
+            )
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+        self.assertIn('auth_user_username_lower_idx', plan)
+        self.assertIn('auth_user_email_lower_idx', plan)
+
+    def test_get_user_is_cached(self):
+        """Test that repeated lookups of a user skip the database."""
+        self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_saving_user_invalidates_cache(self):
+        """Test that a saved user is reloaded on the next lookup."""
+        self.backend.get_user(self.user.pk)
+
+        self.user.first_name = 'Renamed'
+        self.user.save()
+
+        self.assertEqual(self.backend.get_user(self.user.pk).first_name, 'Renamed')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_deleting_user_invalidates_cache(self):
+        """Test that a deleted user is no longer returned."""
+        user_id = self.user.pk
+        self.backend.get_user(user_id)
+
+        self.user.delete()
+
+        self.assertIsNone(self.backend.get_user(user_id))
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    """Test cases for CachedTokenAuthentication."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        get_local_token_cache().clear()
+        self.user = User.objects.create_user(
+            username='tokenuser',
+            email='token@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_token_lookup(self):
+        """Test that a known token is resolved without querying."""
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_shared_cache_serves_other_processes(self):
+        """Test that an empty local cache falls back to the shared cache."""
+        self.client.get('/api/auth/profile/')
+        get_local_token_cache().clear()
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cache_keys_do_not_contain_token(self):
+        """Test that tokens are cached under a digest, not in the clear."""
+        self.client.get('/api/auth/profile/')
+
+        self.assertFalse(any(self.token.key in str(key) for key in cache._cache))
+
+    def test_logout_invalidates_token(self):
+        """Test that a token deleted by logout is rejected straight away."""
+        self.client.get('/api/auth/profile/')
+
+        response = self.client.post('/api/auth/logout/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test that deactivating a user rejects their cached token."""
+        self.client.get('/api/auth/profile/')
+
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
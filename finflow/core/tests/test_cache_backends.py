@@ -0,0 +1,103 @@
+"""
+Test cases for the finflow.core tiered cache backend.
+
+This module contains tests for:
+- Reading through the in-process L1 to the shared L2
+- Keeping L2-only keys out of L1
+- Writes, deletes and version bumps reaching both tiers
+"""
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'finflow.core.cache_backends.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_TIMEOUT': 60,
+            'L1_KEY_PREFIXES': ['hot_'],
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-cache-tests',
+    },
+}
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTest(TestCase):
+    """Test cases for TieredCache."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.cache = caches['default']
+        # Writes made directly here stand in for another process
+        self.shared = caches['shared']
+        self.cache.clear()
+
+    def test_reads_fill_l1_from_l2(self):
+        """Test that an L2 value is served from L1 afterwards."""
+        self.shared.set('hot_key', 'computed by celery')
+
+        self.assertEqual(self.cache.get('hot_key'), 'computed by celery')
+
+        self.shared.set('hot_key', 'changed elsewhere')
+        self.assertEqual(self.cache.get('hot_key'), 'computed by celery')
+
+        self.cache.l1.clear()
+        self.assertEqual(self.cache.get('hot_key'), 'changed elsewhere')
+
+    def test_l2_only_keys_skip_l1(self):
+        """Test that keys without an L1 prefix are always read from L2."""
+        self.cache.set('bucket', 1)
+        self.shared.set('bucket', 2)
+
+        self.assertEqual(self.cache.get('bucket'), 2)
+        self.assertFalse(self.cache.l1.has_key('bucket'))
+
+    def test_writes_and_deletes_reach_both_tiers(self):
+        """Test that set, delete and clear go through to L2."""
+        self.cache.set('hot_key', 'value')
+        self.assertEqual(self.shared.get('hot_key'), 'value')
+        self.assertTrue(self.cache.l1.has_key('hot_key'))
+
+        self.cache.delete('hot_key')
+        self.assertIsNone(self.cache.get('hot_key'))
+        self.assertIsNone(self.shared.get('hot_key'))
+
+        self.cache.set_many({'hot_a': 1, 'cold_b': 2})
+        self.assertEqual(self.shared.get_many(['hot_a', 'cold_b']), {'hot_a': 1, 'cold_b': 2})
+        self.cache.clear()
+        self.assertEqual(self.cache.get_many(['hot_a', 'cold_b']), {})
+
+    def test_get_many_mixes_tiers(self):
+        """Test that get_many combines L1 hits with one L2 lookup."""
+        self.cache.set('hot_a', 'l1')
+        self.shared.set_many({'hot_b': 'l2', 'cold_c': 'l2'})
+
+        self.assertEqual(
+            self.cache.get_many(['hot_a', 'hot_b', 'cold_c', 'missing']),
+            {'hot_a': 'l1', 'hot_b': 'l2', 'cold_c': 'l2'}
+        )
+        self.assertTrue(self.cache.l1.has_key('hot_b'))
+        self.assertFalse(self.cache.l1.has_key('cold_c'))
+
+    def test_version_bump_skips_stale_l1(self):
+        """Test that a new key version is never answered from an old L1 copy."""
+        self.cache.set('hot_key', 'v1')
+        self.shared.set('hot_key', 'v2', version=2)
+
+        self.assertEqual(self.cache.get('hot_key', version=2), 'v2')
+
+        self.cache.incr_version('hot_key', version=2)
+        self.assertIsNone(self.cache.get('hot_key', version=2))
+        self.assertEqual(self.cache.get('hot_key', version=3), 'v2')
+
+    def test_incr_drops_l1_copy(self):
+        """Test that counters are incremented in L2."""
+        self.cache.set('hot_counter', 1)
+
+        self.assertEqual(self.cache.incr('hot_counter'), 2)
+        self.assertEqual(self.cache.get('hot_counter'), 2)
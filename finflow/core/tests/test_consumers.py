@@ -0,0 +1,509 @@
+"""
+Test cases for the finflow.core WebSocket consumer and price feed.
+
+This module contains tests for:
+- The simulated price source
+- Publishing pre-encoded ticks to per-symbol groups
+- Coalescing queued ticks per symbol
+- Consumer subscriptions to the symbols a user holds
+- Incremental in-memory portfolio valuation
+- Delta frames and msgpack encoding negotiated by the client
+- The bounded outbound queue and slow client handling
+"""
+
+import asyncio
+import json
+from decimal import Decimal
+import msgpack
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from ..consumers import (
+    PortfolioConsumer, PortfolioValuation, SLOW_CLIENT_CLOSE_CODE, positions_group_name
+)
+from ..models import User, Portfolio, Investment
+from ..outbound import OutboundQueue, OutboundQueueFull, WebSocketMetrics, websocket_metrics
+from ..prices import PriceFeedPublisher, SimulatedPriceSource, price_group_name
+from ..testing import WebsocketCommunicator
+
+
+class SimulatedPriceSourceTest(TestCase):
+    """Test cases for SimulatedPriceSource."""
+
+    def test_seeded_prices_are_reproducible(self):
+        """Test that two sources with the same seed produce the same prices."""
+        first = SimulatedPriceSource(seed=7)
+        second = SimulatedPriceSource(seed=7)
+
+        for _ in range(3):
+            self.assertEqual(
+                first.get_prices(['AAPL', 'XYZ']),
+                second.get_prices(['AAPL', 'XYZ'])
+            )
+
+    def test_prices_are_positive(self):
+        """Test that every symbol gets a positive price."""
+        prices = SimulatedPriceSource(seed=1).get_prices(['AAPL', 'UNKNOWN'])
+
+        self.assertEqual(set(prices), {'AAPL', 'UNKNOWN'})
+        self.assertTrue(all(price > 0 for price in prices.values()))
+
+    def test_price_group_name(self):
+        """Test that group names only use characters channels accepts."""
+        self.assertEqual(price_group_name('aapl'), 'prices.AAPL')
+        self.assertEqual(price_group_name('BRK.B'), 'prices.BRK.B')
+        self.assertEqual(price_group_name('BTC/USD'), 'prices.BTC_USD')
+
+
+class PriceFeedPublisherTest(TestCase):
+    """Test cases for PriceFeedPublisher batching."""
+
+    def setUp(self):
+        """Set up a publisher and a channel subscribed to two symbols."""
+        cache.clear()
+        self.channel_layer = get_channel_layer()
+        self.publisher = PriceFeedPublisher(
+            source=SimulatedPriceSource(seed=5), channel_layer=self.channel_layer
+        )
+
+    async def subscribe(self, *symbols):
+        channel = await self.channel_layer.new_channel()
+        for symbol in symbols:
+            await self.channel_layer.group_add(price_group_name(symbol), channel)
+        return channel
+
+    async def test_flush_coalesces_ticks_per_symbol(self):
+        """Test that only the latest queued tick of each symbol is sent."""
+        channel = await self.subscribe('AAPL', 'MSFT')
+        self.publisher.queue(self.publisher.build_ticks(['AAPL', 'MSFT']))
+        latest = self.publisher.build_ticks(['AAPL'])
+        self.publisher.queue(latest)
+
+        sent = await self.publisher.flush()
+
+        self.assertEqual(sent, 2)
+        messages = [await self.channel_layer.receive(channel) for _ in range(2)]
+        ticks = {message['tick']['symbol']: message['tick'] for message in messages}
+        self.assertEqual(ticks['AAPL'], latest[0])
+        self.assertEqual(self.publisher.pending, {})
+        self.assertEqual(await self.publisher.flush(), 0)
+
+    @override_settings(PRICE_FEED_SEND_CONCURRENCY=2)
+    async def test_flush_sends_in_batches(self):
+        """Test that every tick is sent when there are more symbols than one batch."""
+        symbols = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA']
+        channel = await self.subscribe(*symbols)
+
+        self.assertEqual(await self.publisher.publish(symbols), 5)
+
+        received = {(await self.channel_layer.receive(channel))['tick']['symbol'] for _ in symbols}
+        self.assertEqual(received, set(symbols))
+
+
+class PortfolioValuationTest(TestCase):
+    """Test cases for PortfolioValuation."""
+
+    def setUp(self):
+        """Set up a valuation with one priced and one unpriced position."""
+        self.valuation = PortfolioValuation(
+            [
+                {'symbol': 'AAPL', 'total_quantity': Decimal('10'), 'cost': Decimal('1500')},
+                {'symbol': 'MSFT', 'total_quantity': Decimal('2'), 'cost': Decimal('600')},
+            ],
+            {'AAPL': {'symbol': 'AAPL', 'price': 160.0, 'change': 10.0, 'change_percent': 6.67}}
+        )
+
+    def test_initial_totals(self):
+        """Test that unpriced positions are valued at cost."""
+        self.assertEqual(self.valuation.total_value, 2200.0)
+        self.assertEqual(self.valuation.total_change, 100.0)
+        self.assertEqual(self.valuation.total_change_percent, 4.76)
+
+    def test_apply_tick_updates_totals(self):
+        """Test that a tick moves the totals by its change to the position."""
+        diff = self.valuation.apply_tick(
+            {'symbol': 'MSFT', 'price': 310.0, 'change': 10.0, 'change_percent': 3.33}
+        )
+
+        self.assertEqual(diff, {
+            'value': 620.0,
+            'total_value': 2220.0,
+            'total_change': 120.0,
+            'total_change_percent': 5.71,
+        })
+        self.assertEqual(self.valuation.snapshot()['investments'][1]['current_price'], 310.0)
+
+    def test_apply_tick_for_unheld_symbol(self):
+        """Test that ticks for other symbols leave the valuation alone."""
+        self.assertIsNone(self.valuation.apply_tick(
+            {'symbol': 'TSLA', 'price': 1.0, 'change': 0.0, 'change_percent': 0.0}
+        ))
+        self.assertEqual(self.valuation.total_value, 2200.0)
+
+
+class ConsumerTestMixin:
+    """Shared fixtures for the consumer tests."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='liveuser',
+            email='live@example.com',
+            password='testpass123'
+        )
+        portfolio = Portfolio.objects.create(user=self.user, name='Live Portfolio')
+        Investment.objects.create(
+            portfolio=portfolio,
+            symbol='AAPL',
+            quantity=Decimal('10.000000'),
+            purchase_price=Decimal('150.00')
+        )
+        other_user = User.objects.create_user(
+            username='otherlive',
+            email='otherlive@example.com',
+            password='testpass123'
+        )
+        Investment.objects.create(
+            portfolio=Portfolio.objects.create(user=other_user, name='Other'),
+            symbol='TSLA',
+            quantity=Decimal('1.000000'),
+            purchase_price=Decimal('200.00')
+        )
+        self.publisher = PriceFeedPublisher(
+            source=SimulatedPriceSource(seed=3), channel_layer=get_channel_layer()
+        )
+
+    async def connect(self, consumer=PortfolioConsumer):
+        communicator = WebsocketCommunicator(consumer.as_asgi(), '/ws/portfolio/', user=self.user)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['type'], 'connection_established')
+        return communicator
+
+
+@override_settings(PRICE_FEED_IN_PROCESS=False)
+class PortfolioConsumerTest(ConsumerTestMixin, TestCase):
+    """Test cases for PortfolioConsumer price subscriptions."""
+
+    async def test_receives_ticks_for_held_symbols_only(self):
+        """Test that a consumer only receives ticks for symbols its user holds."""
+        communicator = await self.connect()
+
+        published = await self.publisher.publish()
+
+        self.assertEqual(published, 2)
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['type'], 'price_tick')
+        self.assertEqual(message['symbol'], 'AAPL')
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_tick_is_extended_with_valuation(self):
+        """Test that the publisher's tick text is sent with the user's new valuation appended."""
+        communicator = await self.connect()
+        tick = {'symbol': 'AAPL', 'price': 160.0, 'change': 2.5, 'change_percent': 1.59}
+        text = json.dumps({'type': 'price_tick', **tick})
+
+        await get_channel_layer().group_send(
+            price_group_name('AAPL'), {'type': 'price.tick', 'tick': tick, 'text': text}
+        )
+
+        sent = await communicator.receive_from()
+        self.assertTrue(sent.startswith(text[:-1]))
+        message = json.loads(sent)
+        self.assertEqual(message['value'], 1600.0)
+        self.assertEqual(message['total_value'], 1600.0)
+        self.assertEqual(message['total_change'], 25.0)
+        await communicator.disconnect()
+
+    async def test_ticks_are_valued_without_queries(self):
+        """Test that ticks are valued from the positions loaded on connect."""
+        communicator = await self.connect()
+        # Deleted inside the test transaction, so no reload is ever signalled
+        await Investment.objects.filter(portfolio__user=self.user).adelete()
+
+        await self.publisher.publish(['AAPL'])
+        message = await communicator.receive_json_from()
+
+        self.assertEqual(message['value'], round(message['price'] * 10, 2))
+        await communicator.disconnect()
+
+    async def test_positions_changed_reloads(self):
+        """Test that a positions change reloads and resubscribes the consumer."""
+        communicator = await self.connect()
+        portfolio = await Portfolio.objects.aget(user=self.user)
+        await Investment.objects.acreate(
+            portfolio=portfolio,
+            symbol='MSFT',
+            quantity=Decimal('2.000000'),
+            purchase_price=Decimal('300.00')
+        )
+
+        await get_channel_layer().group_send(
+            positions_group_name(self.user.id), {'type': 'positions.changed'}
+        )
+        message = await communicator.receive_json_from()
+
+        self.assertEqual(message['type'], 'portfolio_data')
+        self.assertEqual(
+            [investment['symbol'] for investment in message['data']['investments']],
+            ['AAPL', 'MSFT']
+        )
+        self.assertEqual(message['data']['total_value'], 2100.0)
+        await self.publisher.publish(['MSFT'])
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['symbol'], 'MSFT')
+        await communicator.disconnect()
+
+    async def test_stop_updates_unsubscribes(self):
+        """Test that stop_updates stops ticks and start_updates resumes them."""
+        communicator = await self.connect()
+
+        await communicator.send_json_to({'type': 'stop_updates'})
+        self.assertTrue(await communicator.receive_nothing())
+        await self.publisher.publish(['AAPL'])
+        self.assertTrue(await communicator.receive_nothing())
+
+        await communicator.send_json_to({'type': 'start_updates'})
+        self.assertTrue(await communicator.receive_nothing())
+        await self.publisher.publish(['AAPL'])
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['symbol'], 'AAPL')
+        await communicator.disconnect()
+
+    async def test_portfolio_data_uses_latest_prices(self):
+        """Test that portfolio data values holdings at the last published price."""
+        communicator = await self.connect()
+        await self.publisher.publish(['AAPL'])
+        tick = await communicator.receive_json_from()
+
+        await communicator.send_json_to({'type': 'get_portfolio_data'})
+        message = await communicator.receive_json_from()
+
+        self.assertEqual(message['type'], 'portfolio_data')
+        investments = message['data']['investments']
+        self.assertEqual([investment['symbol'] for investment in investments], ['AAPL'])
+        self.assertEqual(investments[0]['current_price'], tick['price'])
+        self.assertEqual(message['data']['total_value'], round(tick['price'] * 10, 2))
+        await communicator.disconnect()
+
+
+@override_settings(PRICE_FEED_IN_PROCESS=False)
+class PortfolioProtocolTest(ConsumerTestMixin, TestCase):
+    """Test cases for the delta and msgpack protocol options."""
+
+    async def send_tick(self, price, change):
+        tick = {'symbol': 'AAPL', 'price': price, 'change': change, 'change_percent': 0.5}
+        await get_channel_layer().group_send(price_group_name('AAPL'), {
+            'type': 'price.tick',
+            'tick': tick,
+            'text': json.dumps({'type': 'price_tick', **tick}),
+        })
+
+    async def negotiate(self, communicator, **options):
+        await communicator.send_json_to({'type': 'set_protocol', **options})
+        protocol = await self.receive(communicator, options.get('encoding'))
+        self.assertEqual(protocol['type'], 'protocol')
+        snapshot = await self.receive(communicator, options.get('encoding'))
+        self.assertEqual(snapshot['type'], 'portfolio_data')
+        return snapshot
+
+    async def receive(self, communicator, encoding='json'):
+        frame = await communicator.receive_from()
+        if encoding == 'msgpack':
+            self.assertIsInstance(frame, bytes)
+            return msgpack.unpackb(frame)
+        return json.loads(frame)
+
+    async def test_msgpack_frames(self):
+        """Test that msgpack clients receive whole ticks as binary frames."""
+        communicator = await self.connect()
+        await self.negotiate(communicator, encoding='msgpack')
+
+        await self.send_tick(160.0, 10.0)
+        frame = await self.receive(communicator, 'msgpack')
+
+        self.assertEqual(frame['type'], 'price_tick')
+        self.assertEqual(frame['price'], 160.0)
+        self.assertEqual(frame['total_value'], 1600.0)
+        await communicator.disconnect()
+
+    async def test_delta_frames_carry_changed_fields_only(self):
+        """Test that delta frames leave out fields unchanged since the last frame."""
+        communicator = await self.connect()
+        snapshot = await self.negotiate(communicator, encoding='msgpack', delta=True)
+
+        await self.send_tick(160.0, 10.0)
+        first = await self.receive(communicator, 'msgpack')
+        await self.send_tick(161.0, 10.0)
+        second = await self.receive(communicator, 'msgpack')
+        await self.send_tick(161.0, 10.0)
+
+        self.assertEqual(first['t'], 'd')
+        self.assertEqual(first['n'], snapshot['seq'] + 1)
+        self.assertEqual(first['s'], 'AAPL')
+        self.assertEqual(first['p'], 160.0)
+        self.assertEqual(first['cp'], 0.5)
+        self.assertEqual(first['tv'], 1600.0)
+        # The change fields are left out; the total change percent moves with the value
+        self.assertEqual(set(second), {'t', 'n', 's', 'p', 'v', 'tv', 'tp'})
+        self.assertEqual(second['n'], first['n'] + 1)
+        self.assertEqual(second['v'], 1610.0)
+        # Nothing changed, so nothing is sent
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    @override_settings(PORTFOLIO_SNAPSHOT_INTERVAL=0)
+    async def test_periodic_snapshots(self):
+        """Test that delta clients get a full snapshot once the interval has passed."""
+        communicator = await self.connect()
+        snapshot = await self.negotiate(communicator, delta=True)
+
+        await self.send_tick(160.0, 10.0)
+        frame = await self.receive(communicator)
+
+        self.assertEqual(frame['type'], 'portfolio_data')
+        self.assertEqual(frame['seq'], snapshot['seq'] + 1)
+        self.assertEqual(frame['data']['total_value'], 1600.0)
+        await communicator.disconnect()
+
+    async def test_msgpack_requests(self):
+        """Test that clients may send their requests as msgpack."""
+        communicator = await self.connect()
+        await self.negotiate(communicator, encoding='msgpack', delta=True)
+
+        await communicator.send_input({
+            'type': 'websocket.receive', 'bytes': msgpack.packb({'type': 'get_portfolio_data'})
+        })
+        frame = await self.receive(communicator, 'msgpack')
+
+        self.assertEqual(frame['type'], 'portfolio_data')
+        self.assertEqual(frame['data']['investments'][0]['symbol'], 'AAPL')
+        await communicator.disconnect()
+
+    async def test_unsupported_encoding(self):
+        """Test that unknown encodings are rejected and JSON stays in use."""
+        communicator = await self.connect()
+
+        await communicator.send_json_to({'type': 'set_protocol', 'encoding': 'xml'})
+        frame = await communicator.receive_json_from()
+
+        self.assertEqual(frame['type'], 'error')
+        self.assertIn('xml', frame['message'])
+        await communicator.disconnect()
+
+
+class OutboundQueueTest(TestCase):
+    """Test cases for OutboundQueue."""
+
+    def setUp(self):
+        """Set up a small queue with its own metrics."""
+        self.metrics = WebSocketMetrics()
+        self.queue = OutboundQueue(3, metrics=self.metrics)
+
+    async def drain(self):
+        return [(await self.queue.get())() for _ in range(len(self.queue))]
+
+    async def test_latest_value_wins_per_key(self):
+        """Test that a keyed frame replaces the waiting one in its place."""
+        self.queue.put(lambda: 'first AAPL', key='AAPL')
+        self.queue.put(lambda: 'control')
+        self.queue.put(lambda: 'second AAPL', key='AAPL')
+
+        self.assertEqual(await self.drain(), ['second AAPL', 'control'])
+        self.assertEqual(self.queue.dropped, 1)
+        self.assertEqual(self.metrics.dropped_frames, 1)
+        self.assertEqual(self.metrics.queued_frames, 0)
+        self.assertEqual(self.metrics.peak_queue_depth, 2)
+
+    def test_full_queue_raises(self):
+        """Test that new frames are refused once the queue is full."""
+        for symbol in ('AAPL', 'MSFT', 'TSLA'):
+            self.queue.put(lambda symbol=symbol: symbol, key=symbol)
+
+        # Replacing a waiting frame is still allowed
+        self.queue.put(lambda: 'AAPL', key='AAPL')
+        with self.assertRaises(OutboundQueueFull):
+            self.queue.put(lambda: 'control')
+
+        self.queue.clear()
+        self.assertEqual(self.metrics.queued_frames, 0)
+
+
+class StalledConsumer(PortfolioConsumer):
+    """Consumer whose sends wait for ``gate``, like a client that stops reading."""
+
+    gate = None
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        await self.gate.wait()
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+
+@override_settings(PRICE_FEED_IN_PROCESS=False)
+class SlowClientTest(ConsumerTestMixin, TestCase):
+    """Test cases for backpressure on slow WebSocket clients."""
+
+    async def connect_stalled(self):
+        StalledConsumer.gate = asyncio.Event()
+        StalledConsumer.gate.set()
+        communicator = await self.connect(StalledConsumer)
+        StalledConsumer.gate.clear()
+        return communicator
+
+    async def send_tick(self, price):
+        tick = {'symbol': 'AAPL', 'price': price, 'change': 0.0, 'change_percent': 0.0}
+        await get_channel_layer().group_send(price_group_name('AAPL'), {
+            'type': 'price.tick',
+            'tick': tick,
+            'text': json.dumps({'type': 'price_tick', **tick}),
+        })
+
+    async def test_stale_ticks_are_dropped(self):
+        """Test that ticks waiting behind a blocked send are replaced by newer ones."""
+        communicator = await self.connect_stalled()
+        dropped = websocket_metrics.dropped_frames
+
+        for price in (151.0, 152.0, 153.0):
+            await self.send_tick(price)
+        # The first tick is blocked in send, the second is replaced by the third
+        self.assertTrue(await communicator.receive_nothing())
+        StalledConsumer.gate.set()
+
+        self.assertEqual((await communicator.receive_json_from())['price'], 151.0)
+        latest = await communicator.receive_json_from()
+        self.assertEqual(latest['price'], 153.0)
+        self.assertEqual(latest['total_value'], 1530.0)
+        self.assertTrue(await communicator.receive_nothing())
+        self.assertEqual(websocket_metrics.dropped_frames, dropped + 1)
+        await communicator.disconnect()
+
+    @override_settings(WEBSOCKET_SLOW_CLIENT_TIMEOUT=0.1)
+    async def test_blocked_send_disconnects(self):
+        """Test that a client not reading within the timeout is disconnected."""
+        communicator = await self.connect_stalled()
+        disconnects = websocket_metrics.slow_disconnects
+
+        await self.send_tick(151.0)
+        message = await communicator.receive_output()
+
+        self.assertEqual(message, {'type': 'websocket.close', 'code': SLOW_CLIENT_CLOSE_CODE})
+        self.assertEqual(websocket_metrics.slow_disconnects, disconnects + 1)
+        await communicator.disconnect()
+
+    @override_settings(WEBSOCKET_OUTBOUND_QUEUE_SIZE=2)
+    async def test_full_queue_disconnects(self):
+        """Test that a client is disconnected once its queue overflows."""
+        communicator = await self.connect_stalled()
+
+        for _ in range(4):
+            await get_channel_layer().group_send('portfolio_updates', {
+                'type': 'portfolio.update', 'data': {}, 'timestamp': 'now'
+            })
+        message = await communicator.receive_output()
+
+        self.assertEqual(message, {'type': 'websocket.close', 'code': SLOW_CLIENT_CLOSE_CODE})
+        await communicator.disconnect()
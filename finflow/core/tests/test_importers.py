@@ -0,0 +1,312 @@
+"""
+Test cases for the finflow.core transaction importer.
+
+This module contains tests for:
+- CSV and NDJSON parsing
+- Per-row validation errors
+- Batched investment lookups and inserts
+- The bulk import API endpoint
+- The import_transactions management command
+"""
+
+import io
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ..importers import TransactionImporter, TransactionImportError
+from ..models import User, Portfolio, Investment, Transaction, PortfolioStats
+
+
+class ImporterTestMixin:
+    """Shared fixtures for the importer tests."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='importer',
+            email='importer@example.com',
+            password='testpass123'
+        )
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Import Portfolio')
+        for symbol in ('AAPL', 'MSFT'):
+            Investment.objects.create(
+                portfolio=self.portfolio,
+                symbol=symbol,
+                quantity=Decimal('10.000000'),
+                purchase_price=Decimal('100.00')
+            )
+
+        other_user = User.objects.create_user(
+            username='otherimporter',
+            email='otherimporter@example.com',
+            password='testpass123'
+        )
+        self.other_portfolio = Portfolio.objects.create(user=other_user, name='Other')
+        Investment.objects.create(
+            portfolio=self.other_portfolio,
+            symbol='AAPL',
+            quantity=Decimal('1.000000'),
+            purchase_price=Decimal('100.00')
+        )
+
+    def csv_file(self, *rows):
+        lines = ['portfolio,symbol,transaction_type,amount,timestamp,notes']
+        lines.extend(','.join(str(value) for value in row) for row in rows)
+        return io.BytesIO(('\n'.join(lines) + '\n').encode())
+
+
+class TransactionImporterTest(ImporterTestMixin, TestCase):
+    """Test cases for TransactionImporter."""
+
+    def test_import_csv(self):
+        """Test importing valid CSV rows with their own timestamps."""
+        stream = self.csv_file(
+            (self.portfolio.id, 'AAPL', 'buy', '1500.00', '2020-01-02T10:30:00Z', 'first'),
+            (self.portfolio.id, 'msft', 'SELL', '-200.5', '2020-03-04', ''),
+        )
+
+        result = TransactionImporter(self.user).run(stream, 'csv')
+
+        self.assertEqual(result, {'rows': 2, 'imported': 2, 'failed': 0, 'errors': []})
+        buy = Transaction.objects.get(investment__symbol='AAPL')
+        self.assertEqual(buy.amount, Decimal('1500.00'))
+        self.assertEqual(buy.notes, 'first')
+        self.assertEqual(buy.timestamp, datetime(2020, 1, 2, 10, 30, tzinfo=dt_timezone.utc))
+        sell = Transaction.objects.get(investment__symbol='MSFT')
+        self.assertEqual(sell.transaction_type, 'sell')
+        self.assertIsNone(sell.notes)
+
+    def test_import_ndjson(self):
+        """Test importing NDJSON rows, reporting malformed lines."""
+        stream = io.BytesIO(
+            (
+                f'{{"portfolio": {self.portfolio.id}, "symbol": "AAPL", '
+                f'"transaction_type": "dividend", "amount": 12.5}}\n'
+                '\n'
+                'not json\n'
+                '[1, 2]\n'
+            ).encode()
+        )
+
+        result = TransactionImporter(self.user).run(stream, 'ndjson')
+
+        self.assertEqual(result['rows'], 3)
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual([error['line'] for error in result['errors']], [3, 4])
+        self.assertEqual(Transaction.objects.get().amount, Decimal('12.50'))
+
+    def test_row_errors_are_reported(self):
+        """Test that invalid rows are skipped and reported by line."""
+        stream = self.csv_file(
+            (self.portfolio.id, 'AAPL', 'buy', '100.00', '', ''),
+            ('abc', 'AAPL', 'buy', '100.00', '', ''),
+            (self.portfolio.id, 'AAPL', 'gift', '100.00', '', ''),
+            (self.portfolio.id, 'AAPL', 'buy', '1.005', '', ''),
+            (self.portfolio.id, 'AAPL', 'buy', '100.00', 'yesterday', ''),
+            (self.portfolio.id, 'TSLA', 'buy', '100.00', '', ''),
+            (self.other_portfolio.id, 'AAPL', 'buy', '100.00', '', ''),
+        )
+
+        result = TransactionImporter(self.user).run(stream, 'csv')
+
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual(result['failed'], 6)
+        errors = {error['line']: error['error'] for error in result['errors']}
+        self.assertEqual(sorted(errors), [3, 4, 5, 6, 7, 8])
+        self.assertTrue(errors[3].startswith('portfolio:'))
+        self.assertTrue(errors[4].startswith('transaction_type:'))
+        self.assertTrue(errors[5].startswith('amount:'))
+        self.assertTrue(errors[6].startswith('timestamp:'))
+        self.assertIn('TSLA', errors[7])
+        self.assertEqual(Transaction.objects.filter(investment__portfolio=self.other_portfolio).count(), 0)
+
+    def test_out_of_range_amounts_are_row_errors(self):
+        """Test that amounts too large to store fail their row, not the import."""
+        stream = self.csv_file(
+            (self.portfolio.id, 'AAPL', 'buy', '1e30', '', ''),
+            (self.portfolio.id, 'AAPL', 'buy', '1E+50', '', ''),
+            (self.portfolio.id, 'AAPL', 'buy', '100.00', '', ''),
+        )
+
+        result = TransactionImporter(self.user).run(stream, 'csv')
+
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual([error['line'] for error in result['errors']], [2, 3])
+        self.assertTrue(all(error['error'].startswith('amount:') for error in result['errors']))
+
+    def test_unreadable_files(self):
+        """Test that files that are not UTF-8 or not valid CSV raise TransactionImportError."""
+        latin1 = 'portfolio,symbol,transaction_type,amount,notes\n1,AAPL,buy,1.00,caf\xe9\n'
+        with self.assertRaises(TransactionImportError):
+            TransactionImporter(self.user).run(io.BytesIO(latin1.encode('latin-1')), 'csv')
+        with self.assertRaises(TransactionImportError):
+            TransactionImporter(self.user).run(io.BytesIO(b'{"portfolio": "\xff"}\n'), 'ndjson')
+
+        oversized = self.csv_file(
+            (self.portfolio.id, 'AAPL', 'buy', '1.00', '', ''),
+            (self.portfolio.id, 'AAPL', 'buy', '1.00', '', 'x' * 200000),
+        )
+        with self.assertRaisesMessage(TransactionImportError, '1 rows before it were imported'):
+            TransactionImporter(self.user, batch_size=1).run(oversized, 'csv')
+
+    def test_missing_columns(self):
+        """Test that a CSV without the required columns is rejected."""
+        with self.assertRaises(TransactionImportError):
+            TransactionImporter(self.user).run(io.BytesIO(b'symbol,amount\nAAPL,1\n'), 'csv')
+
+    def test_queries_per_batch_are_constant(self):
+        """Test that each batch takes a fixed number of queries however many rows it has."""
+        rows = [
+            (self.portfolio.id, symbol, 'buy', '10.00', '', '')
+            for symbol in ('AAPL', 'MSFT') * 50
+        ]
+        # Investment lookup, then inside savepoints: the insert and the stats
+        # refresh (portfolio lock, two aggregates, upsert)
+        with self.assertNumQueries(10):
+            result = TransactionImporter(self.user).run(self.csv_file(*rows), 'csv')
+        self.assertEqual(result['imported'], 100)
+
+    def test_batches_and_progress(self):
+        """Test that progress is reported after each batch."""
+        rows = [(self.portfolio.id, 'AAPL', 'buy', '10.00', '', '')] * 5
+        progress = []
+
+        TransactionImporter(
+            self.user, batch_size=2, progress=lambda result: progress.append(result['imported'])
+        ).run(self.csv_file(*rows), 'csv')
+
+        self.assertEqual(progress, [2, 4, 5])
+
+    def test_portfolio_stats_refreshed(self):
+        """Test that imported rows are reflected in the portfolio stats."""
+        stream = self.csv_file(
+            (self.portfolio.id, 'AAPL', 'buy', '100.00', '', ''),
+            (self.portfolio.id, 'MSFT', 'sell', '-50.00', '', ''),
+        )
+
+        TransactionImporter(self.user).run(stream, 'csv')
+
+        stats = PortfolioStats.objects.get(portfolio=self.portfolio)
+        self.assertEqual(stats.transaction_count, 2)
+        self.assertEqual(stats.buy_count, 1)
+        self.assertEqual(stats.sell_count, 1)
+
+
+class TransactionImportAPITest(ImporterTestMixin, TestCase):
+    """Test cases for the bulk import endpoint."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_import_upload(self):
+        """Test importing an uploaded CSV file."""
+        upload = SimpleUploadedFile(
+            'history.csv',
+            self.csv_file(
+                (self.portfolio.id, 'AAPL', 'buy', '100.00', '', ''),
+                (self.portfolio.id, 'NOPE', 'buy', '100.00', '', ''),
+            ).getvalue()
+        )
+
+        response = self.client.post('/api/transactions/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['imported'], 1)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual(response.data['errors'][0]['line'], 3)
+
+    def test_import_requires_known_format(self):
+        """Test that uploads of unknown format are rejected."""
+        upload = SimpleUploadedFile('history.xlsx', b'data')
+
+        response = self.client.post('/api/transactions/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_rejects_unreadable_file(self):
+        """Test that a file that is not UTF-8 text gets a 400, not a 500."""
+        upload = SimpleUploadedFile('history.csv', b'portfolio,symbol,transaction_type,amount\n\xff\xfe\n')
+
+        response = self.client.post('/api/transactions/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_status_is_only_shown_to_the_owner(self):
+        """Test that only the user who queued an import can read its progress."""
+        upload = SimpleUploadedFile(
+            'history.csv', self.csv_file((self.portfolio.id, 'AAPL', 'buy', '100.00', '', '')).getvalue()
+        )
+        with mock.patch('finflow.core.views.default_storage.save', return_value='imports/history.csv'), \
+                mock.patch('finflow.core.views.import_transactions_file.apply_async') as apply_async:
+            response = self.client.post(
+                '/api/transactions/import/', {'file': upload, 'background': 'true'}, format='multipart'
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        task_id = response.data['task_id']
+        self.assertEqual(apply_async.call_args.kwargs['task_id'], task_id)
+
+        result = mock.Mock(state='PROGRESS', info={'processed': 1})
+        with mock.patch('finflow.core.views.AsyncResult', return_value=result):
+            response = self.client.get(f'/api/transactions/import/{task_id}/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['processed'], 1)
+
+            other = User.objects.create_user(username='other', password='testpass123')
+            self.client.force_authenticate(other)
+            response = self.client.get(f'/api/transactions/import/{task_id}/')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+            # Tasks never queued through the endpoint, such as other tasks
+            response = self.client.get(f'/api/transactions/import/{uuid.uuid4()}/')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_import_requires_file(self):
+        """Test that a request without a file is rejected."""
+        response = self.client.post('/api/transactions/import/', {}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ImportTransactionsCommandTest(ImporterTestMixin, TestCase):
+    """Test cases for the import_transactions management command."""
+
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'wb') as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_file(self):
+        """Test importing a file from disk."""
+        path = self.write_file('.csv', self.csv_file(
+            (self.portfolio.id, 'AAPL', 'buy', '100.00', '', ''),
+            (self.portfolio.id, 'AAPL', 'bogus', '100.00', '', ''),
+        ).getvalue())
+        stdout, stderr = io.StringIO(), io.StringIO()
+
+        call_command('import_transactions', path, user='importer', stdout=stdout, stderr=stderr)
+
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertIn('Imported 1 of 2 rows', stdout.getvalue())
+        self.assertIn('Line 3', stderr.getvalue())
+
+    def test_unknown_user(self):
+        """Test that an unknown user is rejected."""
+        path = self.write_file('.ndjson', b'')
+
+        with self.assertRaises(CommandError):
+            call_command('import_transactions', path, user='nobody', stdout=io.StringIO())
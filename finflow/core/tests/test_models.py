@@ -7,16 +7,23 @@ This module contains comprehensive tests for:
 - Investment unique constraints
 - Model relationships and properties
 - Custom managers and querysets
+- Denormalized portfolio stats
 """
 
 from django.test import TestCase
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
+from django.db.migrations.loader import MigrationLoader
 from django.utils import timezone
 from decimal import Decimal
 from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-from ..models import User, Portfolio, Investment, Transaction
+from ..models import User, Portfolio, Investment, Transaction, PortfolioStats
 
 
 class UserModelTest(TestCase):
@@ -623,4 +630,132 @@ class ModelRelationshipsTest(TestCase):
         investment_symbols = [inv.symbol for inv in portfolio_investments]
         self.assertIn('AAPL', investment_symbols)
         self.assertIn('MSFT', investment_symbols)
-        self.assertIn('GOOGL', investment_symbols)
\ No newline at end of file
+        self.assertIn('GOOGL', investment_symbols)
+
+
+class PortfolioStatsTest(TestCase):
+    """Test cases for the denormalized PortfolioStats rollup."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='statsuser',
+            email='stats@example.com',
+            password='testpass123'
+        )
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Stats Portfolio')
+        self.investment = Investment.objects.create(
+            portfolio=self.portfolio,
+            symbol='AAPL',
+            quantity=Decimal('10.000000'),
+            purchase_price=Decimal('150.00')
+        )
+    
+    def get_stats(self):
+        return PortfolioStats.objects.get(portfolio=self.portfolio)
+    
+    def test_stats_created_with_portfolio(self):
+        """Test that a new portfolio starts with an empty stats row."""
+        portfolio = Portfolio.objects.create(user=self.user, name='Empty Portfolio')
+        stats = PortfolioStats.objects.get(portfolio=portfolio)
+        
+        self.assertEqual(stats.investment_count, 0)
+        self.assertEqual(stats.total_invested, Decimal('0'))
+        self.assertIsNone(stats.last_activity)
+    
+    def test_stats_follow_investment_writes(self):
+        """Test that stats track investment creation, updates and deletion."""
+        stats = self.get_stats()
+        self.assertEqual(stats.investment_count, 1)
+        self.assertEqual(stats.unique_symbols, 1)
+        self.assertEqual(stats.total_invested, Decimal('1500.00'))
+        
+        msft = Investment.objects.create(
+            portfolio=self.portfolio,
+            symbol='MSFT',
+            quantity=Decimal('5.000000'),
+            purchase_price=Decimal('300.00')
+        )
+        self.assertEqual(self.get_stats().investment_count, 2)
+        self.assertEqual(self.get_stats().total_invested, Decimal('3000.00'))
+        
+        msft.quantity = Decimal('10.000000')
+        msft.save()
+        self.assertEqual(self.get_stats().total_invested, Decimal('4500.00'))
+        
+        msft.delete()
+        stats = self.get_stats()
+        self.assertEqual(stats.investment_count, 1)
+        self.assertEqual(stats.total_invested, Decimal('1500.00'))
+    
+    def test_stats_follow_transaction_writes(self):
+        """Test that transaction counts track creation and deletion."""
+        buy = Transaction.objects.create(
+            investment=self.investment, transaction_type='buy', amount=Decimal('1500.00')
+        )
+        Transaction.objects.create(
+            investment=self.investment, transaction_type='dividend', amount=Decimal('12.00')
+        )
+        
+        stats = self.get_stats()
+        self.assertEqual(stats.transaction_count, 2)
+        self.assertEqual(stats.transaction_counts['buy'], 1)
+        self.assertEqual(stats.transaction_counts['dividend'], 1)
+        self.assertEqual(stats.transaction_counts['sell'], 0)
+        
+        buy.delete()
+        stats = self.get_stats()
+        self.assertEqual(stats.transaction_count, 1)
+        self.assertEqual(stats.buy_count, 0)
+    
+    def test_stats_deleted_with_portfolio(self):
+        """Test that deleting a portfolio cascades to its stats."""
+        Transaction.objects.create(
+            investment=self.investment, transaction_type='buy', amount=Decimal('1500.00')
+        )
+        portfolio_id = self.portfolio.pk
+        self.portfolio.delete()
+        
+        self.assertFalse(PortfolioStats.objects.filter(portfolio_id=portfolio_id).exists())
+    
+    def test_for_portfolio_computes_missing_row_without_saving(self):
+        """Test that reading stats of a portfolio without a row never writes one."""
+        PortfolioStats.objects.filter(portfolio=self.portfolio).delete()
+        portfolio = Portfolio.objects.get(pk=self.portfolio.pk)
+        
+        stats = PortfolioStats.objects.for_portfolio(portfolio)
+        
+        self.assertEqual(stats.investment_count, 1)
+        self.assertFalse(PortfolioStats.objects.filter(portfolio=self.portfolio).exists())
+    
+    def test_migration_backfills_missing_rows(self):
+        """Test that the backfill migration creates the rows the manager would compute."""
+        migration = import_module('finflow.core.migrations.0007_backfill_portfoliostats')
+        Transaction.objects.create(
+            investment=self.investment, transaction_type='buy', amount=Decimal('1500.00')
+        )
+        PortfolioStats.objects.filter(portfolio=self.portfolio).delete()
+        historical_apps = MigrationLoader(connection).project_state(
+            ('core', '0007_backfill_portfoliostats')
+        ).apps
+        
+        migration.backfill_portfolio_stats(historical_apps, mock.Mock(connection=connection))
+        
+        expected = PortfolioStats.objects.compute([self.portfolio.pk])[0]
+        stats = self.get_stats()
+        for field in PortfolioStats.STAT_FIELDS:
+            self.assertEqual(getattr(stats, field), getattr(expected, field), field)
+        self.assertEqual(stats.buy_count, 1)
+        self.assertEqual(stats.total_invested, Decimal('1500.00'))
+    
+    def test_verify_and_rebuild_command(self):
+        """Test that the management command detects and repairs drift."""
+        call_command('portfolio_stats', 'verify', stdout=StringIO())
+        
+        PortfolioStats.objects.filter(portfolio=self.portfolio).update(investment_count=7)
+        with self.assertRaises(CommandError):
+            call_command('portfolio_stats', 'verify', stdout=StringIO())
+        
+        call_command('portfolio_stats', 'rebuild', stdout=StringIO())
+        self.assertEqual(self.get_stats().investment_count, 1)
+        call_command('portfolio_stats', 'verify', stdout=StringIO())
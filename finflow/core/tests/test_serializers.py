@@ -0,0 +1,114 @@
+"""
+Test cases for finflow.core serializers.
+
+This module contains tests for:
+- Fast read serializers matching their ModelSerializer counterparts
+- Fast read serializers on the list endpoints
+"""
+
+from decimal import Decimal
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+
+from ..models import User, Portfolio, Investment, Transaction
+from ..serializers import (
+    InvestmentSerializer, TransactionSerializer,
+    InvestmentReadSerializer, TransactionReadSerializer
+)
+
+
+class ReadSerializerTest(TestCase):
+    """Test cases for the fast read serializers."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='serializeruser',
+            email='serializer@example.com',
+            password='testpass123'
+        )
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Serializer Portfolio')
+        self.aapl = Investment.objects.create(
+            portfolio=self.portfolio,
+            symbol='AAPL',
+            quantity=Decimal('10.5'),
+            purchase_price=Decimal('150.25'),
+            purchase_date=timezone.now() - timedelta(days=40)
+        )
+        self.msft = Investment.objects.create(
+            portfolio=self.portfolio,
+            symbol='MSFT',
+            quantity=Decimal('3.000000'),
+            purchase_price=Decimal('300.00')
+        )
+        Transaction.objects.create(
+            investment=self.aapl, transaction_type='buy', amount=Decimal('1577.63')
+        )
+        Transaction.objects.create(
+            investment=self.aapl, transaction_type='split', amount=Decimal('0'),
+            notes='2-for-1'
+        )
+        Transaction.objects.create(
+            investment=self.aapl, transaction_type='sell', amount=Decimal('-200.5')
+        )
+    
+    def test_transaction_output_matches_model_serializer(self):
+        """Test that TransactionReadSerializer renders like TransactionSerializer."""
+        queryset = Transaction.objects.all()
+        
+        expected = TransactionSerializer(queryset, many=True).data
+        actual = TransactionReadSerializer(
+            TransactionReadSerializer.values_queryset(queryset), many=True
+        ).data
+        
+        self.assertEqual(len(actual), 3)
+        self.assertEqual(actual, expected)
+    
+    def test_investment_output_matches_model_serializer(self):
+        """Test that InvestmentReadSerializer renders like InvestmentSerializer."""
+        queryset = Investment.objects.all()
+        
+        expected = InvestmentSerializer(queryset, many=True).data
+        actual = InvestmentReadSerializer(
+            InvestmentReadSerializer.values_queryset(queryset), many=True
+        ).data
+        
+        self.assertEqual(len(actual), 2)
+        self.assertEqual(actual, expected)
+    
+    def test_investment_transactions_fetched_once(self):
+        """Test that nested transactions take one query for the whole page."""
+        rows = list(InvestmentReadSerializer.values_queryset(Investment.objects.all()))
+        
+        with self.assertNumQueries(1):
+            data = InvestmentReadSerializer(rows, many=True).data
+        
+        transaction_counts = {row['symbol']: len(row['transactions']) for row in data}
+        self.assertEqual(transaction_counts, {'AAPL': 3, 'MSFT': 0})
+    
+    def test_list_endpoints_use_read_serializers(self):
+        """Test that list endpoints return the fast serializer output."""
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=self.user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        
+        response = client.get('/api/transactions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['results'],
+            TransactionSerializer(Transaction.objects.all(), many=True).data
+        )
+        
+        response = client.get('/api/investments/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['results'],
+            InvestmentSerializer(Investment.objects.all(), many=True).data
+        )
+        
+        response = client.get(f'/api/investments/{self.aapl.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['symbol'], 'AAPL')
@@ -0,0 +1,549 @@
+"""
+Test cases for finflow.core Celery tasks and analytics.
+
+This module contains tests for:
+- The grouped portfolio analytics engine
+- The full analytics rebuild fan-out (coordinator, chunks, reducer)
+- Dirty tracking and the incremental hourly analytics refresh
+- Serving precomputed analytics to the analytics page
+"""
+
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import analytics_state
+from ..analytics import (
+    TOTAL_FIELDS, PortfolioAnalyticsEngine, apply_contribution_deltas,
+    get_user_analytics, global_analytics_from_state, merge_partial_results, partition_user_ids,
+    refresh_users,
+)
+from ..analytics_state import DIRTY_USERS_KEY, AnalyticsStateStore
+from ..cache_keys import (
+    global_analytics_key, portfolio_report_key, user_analytics_key, user_data_version_key,
+)
+from ..models import User, Portfolio, Investment, Transaction
+from ..routers import ReplicaRouter
+from ..tasks import (
+    cleanup_old_logs, generate_portfolio_report, rebuild_portfolio_analytics,
+    refresh_portfolio_analytics, refresh_user_analytics_chunk, _generate_user_analytics,
+)
+
+
+class AnalyticsTestMixin:
+    """Helpers for building users with portfolios, investments and transactions."""
+
+    def create_user_with_holdings(self, username, symbols=('AAPL', 'MSFT'), **user_kwargs):
+        user = User.objects.create_user(
+            username=username,
+            email=f'{username}@example.com',
+            password='testpass123',
+            **user_kwargs
+        )
+        portfolio = Portfolio.objects.create(user=user, name=f'{username} portfolio')
+        for index, symbol in enumerate(symbols, start=1):
+            investment = Investment.objects.create(
+                portfolio=portfolio,
+                symbol=symbol,
+                quantity=Decimal('10.000000') * index,
+                purchase_price=Decimal('100.00') + index,
+            )
+            Transaction.objects.create(
+                investment=investment, transaction_type='buy', amount=Decimal('1000.00')
+            )
+            Transaction.objects.create(
+                investment=investment, transaction_type='sell', amount=Decimal('-250.00')
+            )
+            Transaction.objects.create(
+                investment=investment, transaction_type='dividend', amount=Decimal('12.50')
+            )
+        return user
+
+
+class PortfolioAnalyticsEngineTest(AnalyticsTestMixin, TestCase):
+    """Test cases for the grouped analytics engine."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_user_payload_matches_per_user_computation(self):
+        """Engine output matches the per-user helper for the same data."""
+        user = self.create_user_with_holdings('alice', symbols=('AAPL', 'MSFT', 'GOOGL'))
+        expected = _generate_user_analytics(user, Portfolio.objects.filter(user=user))
+
+        payloads = list(PortfolioAnalyticsEngine().iter_user_analytics())
+
+        self.assertEqual(len(payloads), 1)
+        payload = payloads[0]
+        for field in ('user_id', 'username', 'portfolios_count', 'investments_count',
+                      'transactions_count', 'risk_tolerance', 'investment_style'):
+            self.assertEqual(payload[field], expected[field], field)
+        self.assertAlmostEqual(payload['total_invested'], expected['total_invested'])
+        self.assertEqual(payload['symbol_performance'].keys(),
+                         expected['symbol_performance'].keys())
+        for symbol, data in expected['symbol_performance'].items():
+            for key, value in data.items():
+                self.assertAlmostEqual(payload['symbol_performance'][symbol][key], value)
+        self.assertEqual(payload['buy_transactions'], 3)
+        self.assertEqual(payload['sell_transactions'], 3)
+
+    def test_global_totals(self):
+        """Global totals are accumulated across all streamed users."""
+        self.create_user_with_holdings('alice', symbols=('AAPL', 'MSFT'))
+        self.create_user_with_holdings('bob', symbols=('MSFT', 'TSLA'))
+
+        engine = PortfolioAnalyticsEngine()
+        list(engine.iter_user_analytics())
+        totals = engine.global_analytics()
+
+        self.assertEqual(totals['total_portfolios'], 2)
+        self.assertEqual(totals['total_investments'], 4)
+        self.assertEqual(totals['unique_symbols'], 3)
+        self.assertEqual(totals['total_transactions'], 12)
+        self.assertEqual(totals['buy_transactions'], 4)
+        self.assertEqual(totals['sell_transactions'], 4)
+        expected_invested = float(Investment.objects.total_invested())
+        self.assertAlmostEqual(totals['total_invested'], expected_invested)
+
+    def test_inactive_users_and_portfolios(self):
+        """Inactive users count globally but get no payload; inactive portfolios are skipped."""
+        self.create_user_with_holdings('alice')
+        inactive = self.create_user_with_holdings('bob', is_active=False)
+        archived = self.create_user_with_holdings('carol')
+        archived.portfolios.update(is_active=False)
+
+        engine = PortfolioAnalyticsEngine()
+        user_ids = [payload['user_id'] for payload in engine.iter_user_analytics()]
+
+        self.assertEqual(len(user_ids), 1)
+        self.assertNotIn(inactive.id, user_ids)
+        self.assertNotIn(archived.id, user_ids)
+        self.assertEqual(engine.global_analytics()['total_portfolios'], 2)
+
+    def test_query_count_is_independent_of_user_count(self):
+        """The engine issues the same number of queries for 1 or 10 users."""
+        self.create_user_with_holdings('user0')
+        with self.assertNumQueries(3):
+            self.assertEqual(PortfolioAnalyticsEngine().write_user_cache(), 1)
+
+        for index in range(1, 10):
+            self.create_user_with_holdings(f'user{index}')
+        with self.assertNumQueries(3):
+            self.assertEqual(PortfolioAnalyticsEngine().write_user_cache(batch_size=4), 10)
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis commands used by AnalyticsStateStore."""
+
+    def __init__(self):
+        self.data = {}
+
+    def sadd(self, key, *values):
+        self.data.setdefault(key, set()).update(str(value) for value in values)
+
+    def spop(self, key, count):
+        members = self.data.get(key, set())
+        return [members.pop() for _ in range(min(count, len(members)))]
+
+    def scard(self, key):
+        return len(self.data.get(key, ()))
+
+    def hmget(self, key, fields):
+        values = self.data.get(key, {})
+        return [values.get(str(field)) for field in fields]
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(
+            {str(field): value for field, value in mapping.items()}
+        )
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.data.get(key, {}).pop(str(field), None)
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+
+class AnalyticsStateTestMixin:
+    """Point the analytics state store at an in-memory Redis stand-in."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.state_store = AnalyticsStateStore(client=FakeRedis())
+        patcher = mock.patch.object(analytics_state, '_state_store', self.state_store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class RebuildPortfolioAnalyticsTaskTest(AnalyticsStateTestMixin, AnalyticsTestMixin, TestCase):
+    """Test cases for the full analytics rebuild fan-out."""
+
+    def setUp(self):
+        super().setUp()
+        # Run the chord locally: apply the header eagerly, then feed its
+        # results to the callback, without touching the result backend
+        patcher = mock.patch('finflow.core.tasks.chord', side_effect=run_chord_locally)
+        self.chord = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_partition_user_ids(self):
+        """Owners of active portfolios are split into balanced ID ranges."""
+        users = [self.create_user_with_holdings(f'user{index}') for index in range(5)]
+        users[2].portfolios.update(is_active=False)
+        ids = [user.id for user in users if user is not users[2]]
+
+        self.assertEqual(
+            partition_user_ids(chunk_size=2),
+            [(ids[0], ids[1]), (ids[2], ids[3])],
+        )
+        self.assertEqual(partition_user_ids(chunk_size=3), [(ids[0], ids[2]), (ids[3], ids[3])])
+
+    def test_rebuild_fans_out_chunks_and_reduces(self):
+        """Each chunk caches its users and the reducer builds the global payload."""
+        alice = self.create_user_with_holdings('alice')
+        bob = self.create_user_with_holdings('bob', symbols=('TSLA',))
+        carol = self.create_user_with_holdings('carol', symbols=('AAPL', 'NVDA'))
+
+        result = rebuild_portfolio_analytics(chunk_size=2)
+
+        self.assertEqual(result['status'], 'dispatched')
+        self.assertEqual(result['chunks'], 2)
+        header = self.chord.call_args.args[0]
+        self.assertEqual(
+            [task.args for task in header.tasks],
+            [(alice.id, bob.id), (carol.id, carol.id)],
+        )
+        self.assertTrue(all(task.options['queue'] == 'analytics' for task in header.tasks))
+        global_data = cache.get(global_analytics_key())
+        self.assertEqual(global_data['total_portfolios'], 3)
+        self.assertEqual(global_data['total_investments'], 5)
+        self.assertEqual(global_data['unique_symbols'], 4)
+        self.assertEqual(global_data['total_transactions'], 15)
+        self.assertEqual(cache.get(user_analytics_key(alice.id))['investments_count'], 2)
+        self.assertEqual(cache.get(user_analytics_key(bob.id))['investments_count'], 1)
+        self.assertEqual(cache.get(user_analytics_key(carol.id))['investments_count'], 2)
+        self.assertEqual(set(self.state_store.get_contributions([alice.id, bob.id, carol.id])),
+                         {alice.id, bob.id, carol.id})
+        self.assertEqual(self.state_store.get_state()['symbol_holders'],
+                         {'AAPL': 2, 'MSFT': 1, 'TSLA': 1, 'NVDA': 1})
+        self.assertTrue(self.state_store.acquire_lock())
+
+    def test_rebuild_without_users_publishes_empty_global(self):
+        """With nothing to fan out the global payload is still written."""
+        result = rebuild_portfolio_analytics()
+
+        self.assertEqual(result['chunks'], 0)
+        self.chord.assert_not_called()
+        self.assertEqual(cache.get(global_analytics_key())['total_portfolios'], 0)
+
+    def test_chunk_returns_partial_state(self):
+        """A chunk only covers users inside its ID range."""
+        alice = self.create_user_with_holdings('alice')
+        self.create_user_with_holdings('bob', symbols=('TSLA',))
+
+        partial = refresh_user_analytics_chunk(alice.id, alice.id)
+
+        self.assertEqual(partial['users_processed'], 1)
+        self.assertEqual(partial['totals']['total_investments'], 2)
+        self.assertEqual(partial['symbol_holders'], {'AAPL': 1, 'MSFT': 1})
+
+    def test_merge_partial_results(self):
+        """Partial totals and symbol holder counts are summed."""
+        partials = [
+            {'totals': dict.fromkeys(TOTAL_FIELDS, 1), 'symbol_holders': {'AAPL': 1, 'MSFT': 2}},
+            {'totals': dict.fromkeys(TOTAL_FIELDS, 2), 'symbol_holders': {'MSFT': 1, 'TSLA': 1}},
+        ]
+
+        state = merge_partial_results(partials)
+
+        self.assertEqual(state['totals'], dict.fromkeys(TOTAL_FIELDS, 3))
+        self.assertEqual(state['symbol_holders'], {'AAPL': 1, 'MSFT': 3, 'TSLA': 1})
+        self.assertEqual(global_analytics_from_state(state)['unique_symbols'], 3)
+
+
+class IncrementalPortfolioAnalyticsTest(AnalyticsStateTestMixin, AnalyticsTestMixin, TestCase):
+    """Test cases for dirty tracking and the incremental analytics refresh."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('finflow.core.tasks.chord', side_effect=run_chord_locally)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def rebuild(self):
+        rebuild_portfolio_analytics()
+        self.state_store.client.delete(DIRTY_USERS_KEY)
+
+    def assertGlobalMatchesFullRecompute(self):
+        engine = PortfolioAnalyticsEngine()
+        list(engine.iter_user_analytics())
+        expected = engine.global_analytics()
+        actual = cache.get(global_analytics_key())
+        for field in TOTAL_FIELDS + ('unique_symbols',):
+            self.assertAlmostEqual(actual[field], expected[field], msg=field)
+
+    def test_writes_mark_owner_dirty(self):
+        """Saving or deleting portfolios, investments and transactions marks the owner."""
+        with self.captureOnCommitCallbacks(execute=True):
+            alice = self.create_user_with_holdings('alice', symbols=('AAPL',))
+        self.assertEqual(self.state_store.pop_dirty(10), [alice.id])
+
+        investment = Investment.objects.get(portfolio__user=alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                investment=investment, transaction_type='buy', amount=Decimal('10.00')
+            )
+        self.assertEqual(self.state_store.pop_dirty(10), [alice.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alice.portfolios.get().delete()
+        self.assertEqual(self.state_store.pop_dirty(10), [alice.id])
+
+    def test_cascaded_deletes_mark_owner_once(self):
+        """Deleting a portfolio marks its owner once, not once per cascaded row."""
+        alice = self.create_user_with_holdings('alice')
+        portfolio = alice.portfolios.get()
+
+        with mock.patch('finflow.core.signals.bump_user_data_version') as bump:
+            with self.captureOnCommitCallbacks() as callbacks:
+                portfolio.delete()
+
+        # The portfolio's own delete: one bump, then the dirty mark and the socket reload
+        bump.assert_called_once_with(alice.id)
+        self.assertEqual(len(callbacks), 2)
+
+    def test_refresh_recomputes_only_dirty_users(self):
+        """Only changed users are recomputed and the global payload follows."""
+        alice = self.create_user_with_holdings('alice')
+        bob = self.create_user_with_holdings('bob', symbols=('TSLA',))
+        self.rebuild()
+        bob_payload = cache.get(user_analytics_key(bob.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Investment.objects.create(
+                portfolio=alice.portfolios.get(), symbol='NVDA',
+                quantity=Decimal('5'), purchase_price=Decimal('400.00'),
+            )
+        result = refresh_portfolio_analytics()
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['users_processed'], 1)
+        self.assertEqual(cache.get(user_analytics_key(alice.id))['investments_count'], 3)
+        self.assertEqual(cache.get(user_analytics_key(bob.id)), bob_payload)
+        self.assertEqual(cache.get(global_analytics_key())['unique_symbols'], 4)
+        self.assertGlobalMatchesFullRecompute()
+
+    @override_settings(DATABASE_REPLICAS=['default'], REPLICA_STICKY_WINDOW=10)
+    def test_refresh_reads_recent_writers_from_primary(self):
+        """Users who just wrote are recomputed from the primary, the others from a replica."""
+        alice = self.create_user_with_holdings('alice')
+        bob = self.create_user_with_holdings('bob', symbols=('TSLA',))
+        self.rebuild()
+        self.state_store.mark_dirty([alice.id, bob.id])
+        cache.set(user_data_version_key(bob.id), 1)
+
+        calls = []
+
+        def record_refresh(user_ids, *args, **kwargs):
+            calls.append((list(user_ids), ReplicaRouter().db_for_read(Portfolio)))
+            return refresh_users(user_ids, *args, **kwargs)
+
+        with mock.patch('finflow.core.tasks.refresh_users', side_effect=record_refresh):
+            result = refresh_portfolio_analytics()
+
+        self.assertEqual(result['users_processed'], 2)
+        self.assertEqual(calls, [([bob.id], 'default'), ([alice.id], None)])
+        self.assertGlobalMatchesFullRecompute()
+
+    def test_refresh_handles_users_losing_their_portfolios(self):
+        """Deactivated portfolios are subtracted from the global payload."""
+        alice = self.create_user_with_holdings('alice', symbols=('AAPL', 'NVDA'))
+        self.create_user_with_holdings('bob', symbols=('AAPL',))
+        self.rebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            portfolio = alice.portfolios.get()
+            portfolio.is_active = False
+            portfolio.save()
+        refresh_portfolio_analytics()
+
+        self.assertIsNone(cache.get(user_analytics_key(alice.id)))
+        self.assertEqual(self.state_store.get_contributions([alice.id]), {})
+        self.assertEqual(self.state_store.get_state()['symbol_holders'], {'AAPL': 1})
+        self.assertGlobalMatchesFullRecompute()
+
+    def test_refresh_without_state_dispatches_rebuild(self):
+        """A cold start triggers a full rebuild instead of applying deltas."""
+        with mock.patch('finflow.core.tasks.rebuild_portfolio_analytics.delay') as delay:
+            result = refresh_portfolio_analytics()
+
+        self.assertEqual(result['status'], 'rebuild_dispatched')
+        delay.assert_called_once_with()
+        self.assertTrue(self.state_store.acquire_lock())
+
+    def test_refresh_skips_while_rebuild_holds_lock(self):
+        """The incremental refresh never runs concurrently with a rebuild."""
+        self.state_store.acquire_lock()
+
+        self.assertEqual(refresh_portfolio_analytics()['status'], 'skipped')
+
+    def test_apply_contribution_deltas(self):
+        """Old contributions are subtracted and new ones added."""
+        state = {
+            'totals': dict.fromkeys(TOTAL_FIELDS, 10),
+            'symbol_holders': {'AAPL': 2, 'MSFT': 1},
+        }
+        old = {1: {'totals': dict.fromkeys(TOTAL_FIELDS, 4), 'symbols': ['AAPL', 'MSFT']}}
+        new = {
+            1: {'totals': dict.fromkeys(TOTAL_FIELDS, 1), 'symbols': ['AAPL']},
+            2: {'totals': dict.fromkeys(TOTAL_FIELDS, 2), 'symbols': ['TSLA']},
+        }
+
+        apply_contribution_deltas(state, old, new)
+
+        self.assertEqual(state['totals'], dict.fromkeys(TOTAL_FIELDS, 9))
+        self.assertEqual(state['symbol_holders'], {'AAPL': 2, 'TSLA': 1})
+
+
+def run_chord_locally(header):
+    """Stand-in for celery.chord that runs the header and callback eagerly."""
+    def apply_callback(callback):
+        results = [task.apply(ignore_result=True).get() for task in header.tasks]
+        return callback.clone(args=(results,)).apply(ignore_result=True)
+    return apply_callback
+
+
+class AnalyticsReadThroughTest(AnalyticsTestMixin, TestCase):
+    """Test cases for reading precomputed analytics."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user_with_holdings('alice', symbols=('AAPL', 'MSFT'))
+
+    def test_precomputed_payload_is_served(self):
+        """A payload written by the tasks is returned without querying."""
+        PortfolioAnalyticsEngine().write_user_cache()
+
+        with self.assertNumQueries(0):
+            payload = get_user_analytics(self.user)
+        self.assertEqual(payload['investments_count'], 2)
+
+    def test_missing_payload_is_computed_once(self):
+        """A missing payload is computed and cached under the tasks' key."""
+        with self.assertNumQueries(3):
+            payload = get_user_analytics(self.user)
+
+        self.assertEqual(payload['investments_count'], 2)
+        self.assertEqual(cache.get(user_analytics_key(self.user.id)), payload)
+        with self.assertNumQueries(0):
+            get_user_analytics(self.user)
+
+    def test_payload_of_other_schema_is_recomputed(self):
+        """A payload written under another schema version counts as stale."""
+        cache.set(user_analytics_key(self.user.id), {'investments_count': 99, 'schema_version': 0})
+
+        self.assertEqual(get_user_analytics(self.user)['investments_count'], 2)
+
+    def test_payload_predating_a_write_is_recomputed(self):
+        """A precomputed payload is not served once the user wrote after it was generated."""
+        PortfolioAnalyticsEngine().write_user_cache()
+        Investment.objects.create(
+            portfolio=self.user.portfolios.get(), symbol='TSLA',
+            quantity=Decimal('1.000000'), purchase_price=Decimal('10.00')
+        )
+
+        self.assertEqual(get_user_analytics(self.user)['investments_count'], 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_analytics(self.user)['investments_count'], 3)
+
+    def test_user_without_portfolios(self):
+        """Users without active portfolios get an empty payload."""
+        self.user.portfolios.update(is_active=False)
+
+        payload = get_user_analytics(self.user)
+
+        self.assertEqual(payload['portfolios_count'], 0)
+        self.assertEqual(payload['total_invested'], 0.0)
+
+    def test_analytics_page_serves_precomputed_payload(self):
+        """The analytics page shows the payload the tasks precomputed."""
+        PortfolioAnalyticsEngine().write_user_cache()
+        key = user_analytics_key(self.user.id)
+        cache.set(key, {**cache.get(key), 'investments_count': 42})
+        self.client.force_login(self.user)
+
+        response = self.client.get('/analytics/')
+
+        self.assertEqual(response.status_code, 200)
+        overview = response.context['analytics']['overview']
+        self.assertEqual(overview['active_investments'], 42)
+        self.assertEqual(overview['active_portfolios'], 1)
+        self.assertEqual(overview['active_buy_transactions'], 2)
+
+    def test_analytics_page_labels_active_figures(self):
+        """Archived portfolios count towards the portfolio total only, and the page says so."""
+        archived = Portfolio.objects.create(user=self.user, name='Archived', is_active=False)
+        Investment.objects.create(
+            portfolio=archived, symbol='IBM', quantity=Decimal('1.000000'), purchase_price=Decimal('10.00')
+        )
+        self.client.force_login(self.user)
+
+        response = self.client.get('/analytics/')
+
+        overview = response.context['analytics']['overview']
+        self.assertEqual(overview['total_portfolios'], 2)
+        self.assertEqual(overview['active_portfolios'], 1)
+        self.assertEqual(overview['active_investments'], 2)
+        self.assertContains(response, 'Investments in Active Portfolios')
+
+
+class CleanupOldLogsTest(TestCase):
+    """Test cases for the daily cleanup task."""
+
+    def test_cleanup_removes_registered_global_analytics_key(self):
+        """The cleanup deletes the global analytics entry under its registry key."""
+        cache.set(global_analytics_key(), {'total_users': 1})
+
+        with mock.patch('builtins.print'):
+            result = cleanup_old_logs()
+
+        self.assertEqual(result['status'], 'success')
+        self.assertIsNone(cache.get(global_analytics_key()))
+
+
+class GeneratePortfolioReportTest(AnalyticsTestMixin, TestCase):
+    """Test cases for the per-user portfolio report task."""
+
+    def test_report_covers_each_active_portfolio(self):
+        """Test that the report holds one entry per active portfolio of the user."""
+        user = self.create_user_with_holdings('reported')
+        Portfolio.objects.create(user=user, name='Empty portfolio')
+        Portfolio.objects.create(user=user, name='Archived portfolio', is_active=False)
+
+        result = generate_portfolio_report(user.id)
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['portfolios_count'], 2)
+        report = cache.get(portfolio_report_key(user.id, timezone.now()))
+        self.assertEqual([entry['portfolios_count'] for entry in report], [1, 1])
+        self.assertEqual(sorted(entry['investments_count'] for entry in report), [0, 2])
@@ -0,0 +1,283 @@
+"""
+Test cases for finflow.core login throttling and the logging pipeline.
+
+This module contains tests for:
+- Sliding-window counting of failed logins
+- Refusing logins after repeated failures, before authenticating
+- Token-bucket rate limits on login attempts and their counters
+- JSON log events and the queued file handler
+"""
+
+import json
+import logging
+import os
+import tempfile
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..logs import JSONFormatter, QueueFileHandler
+from ..models import User
+from ..throttling import (
+    SlidingWindowCounter, TokenBucket, get_client_ip, get_login_failures, login_failure_keys,
+    login_throttle_metrics
+)
+
+# Buckets are shared through the cache; keep them in this process for tests
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class SlidingWindowCounterTest(TestCase):
+    """Test cases for SlidingWindowCounter."""
+
+    def test_events_expire_after_window(self):
+        """Test that only events within the window are counted."""
+        counter = SlidingWindowCounter(window=60)
+        counter.add('key', now=0)
+        counter.add('key', now=30)
+
+        self.assertEqual(counter.count('key', now=59), 2)
+        self.assertEqual(counter.count('key', now=61), 1)
+        self.assertEqual(counter.count('key', now=91), 0)
+        self.assertEqual(counter.count('other', now=0), 0)
+
+    def test_least_recent_keys_are_forgotten(self):
+        """Test that the counter tracks at most max_keys keys."""
+        counter = SlidingWindowCounter(window=60, max_keys=2)
+        for key in ('a', 'b', 'c'):
+            counter.add(key, now=0)
+
+        self.assertEqual(counter.count('a', now=1), 0)
+        self.assertEqual(counter.count('c', now=1), 1)
+
+
+@override_settings(LOGIN_FAILURE_LIMIT_PER_USERNAME=3, LOGIN_FAILURE_LIMIT_PER_IP=5)
+class LoginThrottleTest(TestCase):
+    """Test cases for refusing logins after repeated failures."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        get_login_failures().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='throttled',
+            email='throttled@example.com',
+            password='testpass123'
+        )
+
+    def api_login(self, username, password, ip='10.0.0.1'):
+        return self.client.post(
+            '/api/auth/login/', {'username': username, 'password': password},
+            format='json', REMOTE_ADDR=ip
+        )
+
+    def test_username_blocked_after_failures(self):
+        """Test that a username is refused, without queries, once it hits its limit."""
+        for _ in range(3):
+            response = self.api_login('throttled', 'wrong')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with self.assertNumQueries(0):
+            response = self.api_login('THROTTLED', 'testpass123', ip='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # Other usernames from the same IP are unaffected
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.assertEqual(self.api_login(other.username, 'testpass123').status_code, status.HTTP_200_OK)
+
+    def test_ip_blocked_after_failures(self):
+        """Test that an IP failing across usernames is refused."""
+        for index in range(5):
+            self.api_login(f'nobody{index}', 'wrong')
+
+        self.assertEqual(
+            self.api_login('throttled', 'testpass123').status_code,
+            status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertEqual(
+            self.api_login('throttled', 'testpass123', ip='10.0.0.2').status_code,
+            status.HTTP_200_OK
+        )
+
+    def test_forwarded_for_cannot_dodge_ip_limit(self):
+        """Test that rotating X-Forwarded-For does not reset the per-IP failures."""
+        for index in range(5):
+            self.client.post(
+                '/api/auth/login/', {'username': f'nobody{index}', 'password': 'wrong'},
+                format='json', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=f'192.0.2.{index}'
+            )
+
+        response = self.client.post(
+            '/api/auth/login/', {'username': 'throttled', 'password': 'testpass123'},
+            format='json', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='192.0.2.99'
+        )
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_client_ip_behind_trusted_proxy(self):
+        """Test that only the entry added by the trusted proxy is used."""
+        request = RequestFactory().post(
+            '/', REMOTE_ADDR='10.0.0.254', HTTP_X_FORWARDED_FOR='192.0.2.1, 203.0.113.7'
+        )
+        self.assertEqual(get_client_ip(request), '203.0.113.7')
+
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.254')
+        self.assertEqual(get_client_ip(request), '10.0.0.254')
+
+    def test_non_string_username_is_rejected(self):
+        """Test that a JSON login with a non-string username gets a 400."""
+        for username in (['throttled'], {'name': 'throttled'}, 12345):
+            response = self.client.post(
+                '/api/auth/login/', {'username': username, 'password': 'testpass123'}, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(login_failure_keys('Unknown', 12345), [('username', '12345')])
+
+    def test_login_view_is_throttled(self):
+        """Test that the form login shares the API's failure counts."""
+        for _ in range(3):
+            self.api_login('throttled', 'wrong')
+
+        response = self.client.post(
+            '/login/', {'username': 'throttled', 'password': 'testpass123'}, REMOTE_ADDR='10.0.0.1'
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(response.json()['success'])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TokenBucketTest(TestCase):
+    """Test cases for TokenBucket."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+
+    def test_burst_then_refill(self):
+        """Test that a bucket allows its burst, then refills at its rate."""
+        bucket = TokenBucket('test', rate=0.5, burst=3)
+
+        self.assertEqual([bucket.consume('key', now=100) for _ in range(4)], [True, True, True, False])
+        self.assertFalse(bucket.consume('key', now=101))
+        self.assertTrue(bucket.consume('key', now=102))
+        self.assertFalse(bucket.consume('key', now=102))
+        # Other keys have their own buckets
+        self.assertTrue(bucket.consume('other', now=102))
+
+    def test_refill_is_capped_at_burst(self):
+        """Test that an idle bucket holds no more than its burst."""
+        bucket = TokenBucket('test', rate=1, burst=2)
+        bucket.consume('key', now=0)
+
+        allowed = [bucket.consume('key', now=1000) for _ in range(3)]
+        self.assertEqual(allowed, [True, True, False])
+
+
+@override_settings(
+    CACHES=LOCAL_CACHES,
+    LOGIN_ATTEMPT_BURST_PER_USERNAME=4, LOGIN_ATTEMPT_RATE_PER_USERNAME=0.01,
+    LOGIN_ATTEMPT_BURST_PER_IP=6, LOGIN_ATTEMPT_RATE_PER_IP=0.01,
+)
+class LoginRateLimitTest(TestCase):
+    """Test cases for rate limiting bursts of login attempts."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        get_login_failures().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='burst',
+            email='burst@example.com',
+            password='testpass123'
+        )
+
+    def api_login(self, username, ip='10.0.0.1'):
+        return self.client.post(
+            '/api/auth/login/', {'username': username, 'password': 'testpass123'},
+            format='json', REMOTE_ADDR=ip
+        )
+
+    def test_username_burst_is_limited(self):
+        """Test that even successful logins are limited per username."""
+        statuses = [self.api_login('burst', ip=f'10.0.1.{index}').status_code for index in range(5)]
+
+        self.assertEqual(statuses, [status.HTTP_200_OK] * 4 + [status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_ip_burst_is_limited_without_queries(self):
+        """Test that an IP spraying usernames is refused before any query."""
+        for index in range(6):
+            self.api_login(f'nobody{index}')
+
+        with self.assertNumQueries(0):
+            response = self.api_login('burst')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_counters(self):
+        """Test that allowed and refused attempts are counted and reported."""
+        before = login_throttle_metrics.snapshot()
+        for _ in range(5):
+            self.api_login('burst')
+
+        after = self.client.get('/api/health/').data['login_throttle']
+        self.assertEqual(after['allowed'] - before['allowed'], 4)
+        self.assertEqual(after['rejected_rate'] - before['rejected_rate'], 1)
+
+
+class LoggingPipelineTest(TestCase):
+    """Test cases for JSONFormatter and QueueFileHandler."""
+
+    def test_json_formatter_includes_extra_fields(self):
+        """Test that events are written as JSON with their extra fields."""
+        record = logging.makeLogRecord({
+            'name': 'finflow.core.backends',
+            'levelname': 'WARNING',
+            'msg': 'Failed for %s',
+            'args': ('alice',),
+            'event': 'login_failed',
+            'ip': '10.0.0.1',
+        })
+
+        event = json.loads(JSONFormatter().format(record))
+
+        self.assertEqual(event['message'], 'Failed for alice')
+        self.assertEqual(event['level'], 'WARNING')
+        self.assertEqual(event['event'], 'login_failed')
+        self.assertEqual(event['ip'], '10.0.0.1')
+        self.assertNotIn('args', event)
+
+    def test_queue_file_handler_writes_in_background(self):
+        """Test that queued records reach the file once flushed."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'auth.log')
+            handler = QueueFileHandler(path)
+            handler.setFormatter(JSONFormatter())
+            logger = logging.getLogger('finflow.tests.queue_file_handler')
+            logger.addHandler(handler)
+            logger.propagate = False
+            try:
+                logger.warning('Blocked %s', 'bob', extra={'event': 'login_blocked'})
+                handler.flush()
+                with open(path) as log_file:
+                    event = json.loads(log_file.readline())
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+
+        self.assertEqual(event['message'], 'Blocked bob')
+        self.assertEqual(event['event'], 'login_blocked')
+
+    def test_queue_file_handler_drops_when_full(self):
+        """Test that a full queue drops records instead of blocking."""
+        with tempfile.TemporaryDirectory() as directory:
+            handler = QueueFileHandler(os.path.join(directory, 'auth.log'), capacity=1)
+            handler.listener.stop()
+            try:
+                for _ in range(3):
+                    handler.handle(logging.makeLogRecord({'msg': 'event'}))
+                self.assertEqual(handler.dropped, 2)
+            finally:
+                handler.listener = None
+                handler.close()
@@ -0,0 +1,264 @@
+"""
+Login throttling ahead of authentication.
+
+Two checks run before ``api_login`` and ``login_view`` authenticate, so a
+refused attempt costs neither a database query nor a password hash:
+- Failed logins counted per client IP and per username in this process.
+  A client that keeps failing is refused until its failures age out.
+- Token buckets per client IP and per username in the shared cache,
+  limiting the rate of all attempts across processes, successful or not.
+
+The failure counts live in each process, so with several workers an
+attacker gets up to the limit per worker; the shared buckets cap the
+overall rate regardless. Allowed and refused attempts are counted in
+``login_throttle_metrics``.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+LOGIN_BUCKET_KEY = 'login_bucket_{scope}_{digest}'
+
+
+def get_client_ip(request):
+    """
+    Get the client IP address from the request.
+
+    Clients can put anything in X-Forwarded-For, so it is only read behind
+    TRUSTED_PROXY_COUNT proxies. Each of them appends the address it was
+    reached from, so the client is that many entries from the right. Any
+    entries further left were sent by the client itself.
+
+    Args:
+        request: HTTP request object
+
+    Returns:
+        Client IP address as string
+    """
+    if not request:
+        return "Unknown"
+
+    trusted_proxies = settings.TRUSTED_PROXY_COUNT
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if trusted_proxies and x_forwarded_for:
+        hops = [hop.strip() for hop in x_forwarded_for.split(',') if hop.strip()]
+        if hops:
+            return hops[max(len(hops) - trusted_proxies, 0)]
+
+    return request.META.get('REMOTE_ADDR') or 'Unknown'
+
+
+class SlidingWindowCounter:
+    """
+    Thread-safe counts of events per key over the last ``window`` seconds.
+
+    Args:
+        window: Seconds an event is counted for
+        max_keys: Keys tracked before the least recently seen is forgotten
+    """
+
+    def __init__(self, window, max_keys=100000):
+        self.window = window
+        self.max_keys = max_keys
+        self._events = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, events, now):
+        while events and events[0] <= now - self.window:
+            events.popleft()
+
+    def add(self, key, now=None):
+        """Count an event for ``key`` and return the count in the window."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                events = self._events[key] = deque()
+            self._events.move_to_end(key)
+            self._expire(events, now)
+            events.append(now)
+            while len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+            return len(events)
+
+    def count(self, key, now=None):
+        """Return the number of events for ``key`` in the window."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                return 0
+            self._expire(events, now)
+            if not events:
+                del self._events[key]
+                return 0
+            return len(events)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+
+_login_failures = None
+
+
+def get_login_failures():
+    """Return this process's failed-login counter, sized by the LOGIN_FAILURE_* settings."""
+    global _login_failures
+    if _login_failures is None:
+        _login_failures = SlidingWindowCounter(settings.LOGIN_FAILURE_WINDOW)
+    return _login_failures
+
+
+def login_failure_keys(client_ip, username):
+    keys = [('username', str(username).lower())]
+    if client_ip != "Unknown":
+        keys.append(('ip', client_ip))
+    return keys
+
+
+def record_login_failure(client_ip, username):
+    """Count a failed login from ``client_ip`` for ``username``."""
+    failures = get_login_failures()
+    for key in login_failure_keys(client_ip, username):
+        failures.add(key)
+
+
+def login_blocked(client_ip, username):
+    """
+    Check whether logins from ``client_ip`` or for ``username`` are refused.
+
+    Args:
+        client_ip: Client IP address as returned by get_client_ip
+        username: Username or email being logged in with
+
+    Returns:
+        True if either has reached its failure limit within the window
+    """
+    failures = get_login_failures()
+    limits = {
+        'username': settings.LOGIN_FAILURE_LIMIT_PER_USERNAME,
+        'ip': settings.LOGIN_FAILURE_LIMIT_PER_IP,
+    }
+    for key in login_failure_keys(client_ip, username):
+        count = failures.count(key)
+        if count >= limits[key[0]]:
+            logger.warning(
+                f"Login blocked after {count} failures for {key[0]}: {key[1]}",
+                extra={'event': 'login_blocked', 'ip': client_ip, 'username': username,
+                       'failures': count},
+            )
+            return True
+    return False
+
+
+class LoginThrottleMetrics:
+    """Process-wide counts of login attempts let through or refused."""
+
+    def __init__(self):
+        self.allowed = 0
+        self.rejected_failures = 0
+        self.rejected_rate = 0
+
+    def snapshot(self):
+        return dict(vars(self))
+
+
+login_throttle_metrics = LoginThrottleMetrics()
+
+
+class TokenBucket:
+    """
+    Token buckets per key, kept in the Django cache and shared by every process.
+
+    Reads and writes of a bucket are not atomic, so concurrent attempts on
+    one key may both take its last token; bursts stay bounded regardless.
+
+    Args:
+        scope: Name keeping these buckets apart from others in the cache
+        rate: Tokens added per second
+        burst: Tokens a full bucket holds
+    """
+
+    def __init__(self, scope, rate, burst):
+        self.scope = scope
+        self.rate = rate
+        self.burst = burst
+
+    def cache_key(self, key):
+        digest = hashlib.sha256(str(key).encode()).hexdigest()
+        return LOGIN_BUCKET_KEY.format(scope=self.scope, digest=digest)
+
+    def consume(self, key, now=None):
+        """
+        Take a token from the bucket of ``key``.
+
+        Args:
+            key: Bucket to take from, e.g. a client IP
+            now: Current UNIX time, for tests
+
+        Returns:
+            True if a token was available, False if the bucket is empty
+        """
+        now = time.time() if now is None else now
+        cache_key = self.cache_key(key)
+        state = cache.get(cache_key)
+        if state is None:
+            tokens = self.burst
+        else:
+            tokens, updated = state
+            tokens = min(self.burst, tokens + max(now - updated, 0) * self.rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # An untouched bucket refills completely within the timeout
+        cache.set(cache_key, (tokens, now), math.ceil(self.burst / self.rate))
+        return allowed
+
+
+def get_login_buckets():
+    """Return the per-username and per-IP buckets from the LOGIN_ATTEMPT_* settings."""
+    return {
+        'username': TokenBucket(
+            'username', settings.LOGIN_ATTEMPT_RATE_PER_USERNAME, settings.LOGIN_ATTEMPT_BURST_PER_USERNAME
+        ),
+        'ip': TokenBucket('ip', settings.LOGIN_ATTEMPT_RATE_PER_IP, settings.LOGIN_ATTEMPT_BURST_PER_IP),
+    }
+
+
+def login_throttled(client_ip, username):
+    """
+    Check whether a login attempt must be refused before authenticating.
+
+    Args:
+        client_ip: Client IP address as returned by get_client_ip
+        username: Username or email being logged in with
+
+    Returns:
+        True if the attempt is refused for recent failures or its rate
+    """
+    if login_blocked(client_ip, username):
+        login_throttle_metrics.rejected_failures += 1
+        return True
+
+    buckets = get_login_buckets()
+    for scope, value in login_failure_keys(client_ip, username):
+        if not buckets[scope].consume(value):
+            login_throttle_metrics.rejected_rate += 1
+            logger.warning(
+                f"Login rate limited for {scope}: {value}",
+                extra={'event': 'login_rate_limited', 'ip': client_ip, 'username': username},
+            )
+            return True
+
+    login_throttle_metrics.allowed += 1
+    return False
@@ -1,27 +1,51 @@
+from django.conf import settings
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.generic import ListView
 from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.utils.http import parse_etags
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import APIException
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.authtoken.models import Token
-from django.db.models import Sum, F, Count, Avg
-from .models import Portfolio, Investment, Transaction, User
+from django.db.models import Sum, F, Count, Avg, Max, Prefetch
+from django.core.files.storage import default_storage
+from rest_framework.parsers import MultiPartParser
+from celery.result import AsyncResult
+from .models import Portfolio, Investment, Transaction, User, PortfolioStats
 from .serializers import (
     PortfolioSerializer, PortfolioCreateSerializer, PortfolioUpdateSerializer,
-    PortfolioDetailSerializer, InvestmentSerializer, TransactionSerializer
+    PortfolioDetailSerializer, InvestmentSerializer, TransactionSerializer,
+    InvestmentReadSerializer, TransactionReadSerializer
 )
+from .pagination import InvestmentCursorPagination, TransactionCursorPagination
+from .importers import IMPORT_FORMATS, TransactionImporter, TransactionImportError, detect_format
+from .tasks import import_transactions_file
+from .analytics import get_user_analytics
+from .cache_keys import (
+    ANALYTICS_SCHEMA_VERSION, analytics_page_key, import_owner_key, portfolio_summary_key,
+)
+from .data_versions import get_user_data_version, version_last_modified
+from .outbound import websocket_metrics
+from .routers import replica_reads
+from .throttling import get_client_ip, login_throttle_metrics, login_throttled
+import hashlib
+import uuid
+from contextlib import ExitStack
 import json
 
 # Create your views here.
@@ -37,20 +61,181 @@ def api_health(request):
     return Response({
         'status': 'healthy',
         'message': 'FinFlow API is running',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        # Outbound queue counters of the WebSocket connections in this process
+        'websockets': websocket_metrics.snapshot(),
+        # Login attempts let through or refused by this process's throttle
+        'login_throttle': login_throttle_metrics.snapshot()
     }, status=status.HTTP_200_OK)
 
 
-class PortfolioViewSet(ModelViewSet):
+# Analytics pages and portfolio summaries are cached under the user's data
+# version, so they can be kept long and are still never served after the
+# user's data changed
+ANALYTICS_PAGE_TIMEOUT = 60 * 60 * 6
+PORTFOLIO_SUMMARY_TIMEOUT = 60 * 60 * 6
+
+# Background imports stay readable for longer than their results are kept
+IMPORT_OWNER_TIMEOUT = 60 * 60 * 24
+
+
+def request_data_version(request):
+    """Return the requesting user's data version, read once per request."""
+    if not hasattr(request, '_user_data_version'):
+        request._user_data_version = get_user_data_version(request.user.id)
+    return request._user_data_version
+
+
+class ReadSerializerMixin:
+    """
+    Serve list requests from ``.values()`` rows with a fast read serializer.
+    
+    Every other action, including the forms of the browsable API, keeps using
+    ``serializer_class`` and model instances.
+    """
+    read_serializer_class = None
+    
+    def uses_read_serializer(self):
+        return self.action == 'list' and self.request.method == 'GET'
+    
+    def get_serializer_class(self):
+        if self.uses_read_serializer():
+            return self.read_serializer_class
+        return super().get_serializer_class()
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.uses_read_serializer():
+            return self.read_serializer_class.values_queryset(queryset)
+        return queryset
+
+
+class NotModified(APIException):
+    """Raised once a request is authenticated if the client's copy is still current."""
+    status_code = status.HTTP_304_NOT_MODIFIED
+    default_detail = 'Not modified.'
+
+
+def etag_matches(if_none_match, etag):
+    """Return True if an If-None-Match header matches ``etag``, comparing weakly."""
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in etags]
+
+
+class ConditionalGetMixin:
+    """
+    Answer repeated GETs with ``304 Not Modified`` while the user's data is unchanged.
+    
+    ETags are derived from the requesting user's data version, the URL and
+    the negotiated media type, so they are known without evaluating the
+    queryset or serializing anything. ``If-None-Match`` is checked as soon
+    as the request is authenticated, before the handler runs. Data versions
+    are only trusted when every process shares the cache; otherwise a write
+    handled by another process would never change the ETag, so it is built
+    from one aggregate query over the user's portfolios' ``updated_at``
+    instead.
+    
+    Only the actions in ``conditional_actions`` are covered, and never the
+    browsable API, whose pages embed forms and CSRF tokens.
+    """
+    conditional_actions = ('list', 'retrieve')
+    response_etag = None
+    
+    def get_data_state(self, request):
+        """Return a string that changes whenever the requesting user's data changes."""
+        if settings.CACHE_IS_SHARED:
+            return f'v{request_data_version(request)}'
+        # Deleted portfolios change the count; other writes refresh a stats row
+        state = Portfolio.objects.filter(user=request.user).aggregate(
+            count=Count('id'), portfolio=Max('updated_at'), stats=Max('stats__updated_at')
+        )
+        return 'u{count}-{portfolio}-{stats}'.format(**state)
+    
+    def get_response_etag(self, request):
+        """
+        Return the ETag of the response to ``request``.
+        
+        The day is included because some fields, such as ``days_held`` and
+        ``age_days``, move on without any write.
+        """
+        parts = [
+            request.user.id, request.user.updated_at, self.get_data_state(request),
+            timezone.localdate(), request.accepted_media_type, request.get_full_path(),
+        ]
+        digest = hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()[:32]
+        return f'W/"{digest}"'
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return
+        if request.accepted_renderer.format == 'api':
+            return
+        self.response_etag = self.get_response_etag(request)
+        if etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), self.response_etag):
+            raise NotModified()
+    
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.response_etag and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = self.response_etag
+            # Clients may keep the response but must revalidate it every time
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class ReplicaReadMixin:
+    """
+    Read the actions in ``replica_actions`` from a read replica.
+    
+    Users who wrote within REPLICA_STICKY_WINDOW keep reading from the
+    primary, so a list fetched right after a create shows the new row; see
+    ``finflow.core.routers``.
+    """
+    replica_actions = ()
+    
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self.replica_scope:
+            return super().dispatch(request, *args, **kwargs)
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and self.action in self.replica_actions:
+            self.replica_scope.enter_context(replica_reads(user_ids=[request.user.id]))
+
+
+class PortfolioViewSet(ReplicaReadMixin, ConditionalGetMixin, ModelViewSet):
     """
     ViewSet for managing portfolios with user-restricted access.
     Supports list, retrieve, create, update, delete operations.
     """
     permission_classes = [IsAuthenticated]
+    conditional_actions = ('list', 'retrieve', 'summary', 'investments', 'my_portfolios')
+    replica_actions = ('list', 'retrieve', 'summary', 'investments', 'my_portfolios')
     
     def get_queryset(self):
-        """Restrict queryset to portfolios owned by the logged-in user."""
-        return Portfolio.objects.filter(user=self.request.user).prefetch_related('investments')
+        """
+        Restrict queryset to portfolios owned by the logged-in user.
+        
+        Counts and totals come from the joined stats row and investments are
+        prefetched together with their transactions, so listing portfolios
+        takes the same number of queries however much they hold.
+        """
+        investments = Investment.objects.prefetch_related(
+            Prefetch('transactions', queryset=Transaction.objects.all())
+        )
+        return Portfolio.objects.filter(
+            user=self.request.user
+        ).select_related('user', 'stats').prefetch_related(
+            Prefetch('investments', queryset=investments)
+        )
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
@@ -104,36 +289,43 @@ class PortfolioViewSet(ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def summary(self, request, pk=None):
-        """Get portfolio summary with financial metrics."""
-        portfolio = self.get_object()
-        investments = portfolio.investments.all()
+        """
+        Get portfolio summary with financial metrics.
         
-        # Calculate financial metrics
-        from django.db.models import F
-        total_invested = investments.aggregate(
-            total=Sum(F('quantity') * F('purchase_price'))
-        )['total'] or 0
+        Summaries are cached under the owner's data version, so one is only
+        rebuilt after the owner's portfolios, investments or transactions change.
+        """
+        cache_key = portfolio_summary_key(request.user.id, pk, request_data_version(request))
+        summary_data = cache.get(cache_key)
         
-        # Get investment count by symbol
-        symbol_counts = {}
-        for investment in investments:
-            symbol = investment.symbol
-            if symbol in symbol_counts:
-                symbol_counts[symbol] += investment.quantity
-            else:
-                symbol_counts[symbol] = investment.quantity
-        
-        summary_data = {
-            'portfolio_id': portfolio.id,
-            'portfolio_name': portfolio.name,
-            'total_investments': investments.count(),
-            'total_invested': float(total_invested),
-            'unique_symbols': len(symbol_counts),
-            'holdings_by_symbol': symbol_counts,
-            'created_at': portfolio.created_at,
-            'age_days': portfolio.age_days
-        }
+        if summary_data is None:
+            portfolio = self.get_object()
+            stats = PortfolioStats.objects.for_portfolio(portfolio)
+            
+            # Get investment count by symbol
+            symbol_counts = {}
+            for investment in portfolio.investments.all():
+                symbol = investment.symbol
+                if symbol in symbol_counts:
+                    symbol_counts[symbol] += investment.quantity
+                else:
+                    symbol_counts[symbol] = investment.quantity
+            
+            summary_data = {
+                'portfolio_id': portfolio.id,
+                'portfolio_name': portfolio.name,
+                'total_investments': stats.investment_count,
+                'total_invested': float(stats.total_invested),
+                'unique_symbols': stats.unique_symbols,
+                'transaction_counts': stats.transaction_counts,
+                'last_activity': stats.last_activity,
+                'holdings_by_symbol': symbol_counts,
+                'created_at': portfolio.created_at,
+            }
+            cache.set(cache_key, summary_data, PORTFOLIO_SUMMARY_TIMEOUT)
         
+        # The age moves on without any write, so it is never cached
+        summary_data['age_days'] = (timezone.now() - summary_data['created_at']).days
         return Response(summary_data)
     
     @action(detail=False, methods=['get'])
@@ -144,18 +336,24 @@ class PortfolioViewSet(ModelViewSet):
         return Response(serializer.data)
 
 
-class InvestmentViewSet(ModelViewSet):
+class InvestmentViewSet(ReplicaReadMixin, ConditionalGetMixin, ReadSerializerMixin, ModelViewSet):
     """
     ViewSet for managing investments within portfolios.
     """
     permission_classes = [IsAuthenticated]
+    conditional_actions = ('list', 'retrieve', 'transactions')
+    replica_actions = ('list', 'retrieve', 'transactions')
     serializer_class = InvestmentSerializer
+    read_serializer_class = InvestmentReadSerializer
+    pagination_class = InvestmentCursorPagination
     
     def get_queryset(self):
         """Restrict queryset to investments in portfolios owned by the logged-in user."""
         return Investment.objects.filter(
             portfolio__user=self.request.user
-        ).select_related('portfolio')
+        ).select_related('portfolio').prefetch_related(
+            Prefetch('transactions', queryset=Transaction.objects.all())
+        )
     
     def perform_create(self, serializer):
         """Ensure the portfolio belongs to the current user."""
@@ -194,25 +392,99 @@ class InvestmentViewSet(ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class TransactionViewSet(ModelViewSet):
+class TransactionViewSet(ReplicaReadMixin, ConditionalGetMixin, ReadSerializerMixin, ModelViewSet):
     """
     ViewSet for managing transactions.
     """
     permission_classes = [IsAuthenticated]
+    replica_actions = ('list', 'retrieve')
     serializer_class = TransactionSerializer
+    read_serializer_class = TransactionReadSerializer
+    pagination_class = TransactionCursorPagination
     
     def get_queryset(self):
         """Restrict queryset to transactions for investments owned by the logged-in user."""
         return Transaction.objects.filter(
             investment__portfolio__user=self.request.user
         ).select_related('investment', 'investment__portfolio')
+    
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_transactions(self, request):
+        """
+        Bulk import transactions from an uploaded CSV or NDJSON file.
+        
+        The file is imported right away unless ``background`` is true, in
+        which case a Celery task imports it and its ID is returned for
+        polling the import status.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'detail': 'Upload a CSV or NDJSON file in the "file" field.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        file_format = request.data.get('file_format') or detect_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            return Response(
+                {'detail': f"Set file_format to one of: {', '.join(IMPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if str(request.data.get('background', '')).lower() in ('1', 'true', 'yes'):
+            path = default_storage.save(f'imports/{uuid.uuid4().hex}.{file_format}', upload)
+            # Record the owner before the task can report any progress
+            task_id = str(uuid.uuid4())
+            cache.set(import_owner_key(task_id), request.user.id, IMPORT_OWNER_TIMEOUT)
+            import_transactions_file.apply_async(
+                (request.user.id, path, file_format), task_id=task_id
+            )
+            return Response(
+                {'task_id': task_id, 'status': 'queued'},
+                status=status.HTTP_202_ACCEPTED
+            )
+        
+        try:
+            result = TransactionImporter(request.user).run(upload, file_format)
+        except TransactionImportError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+    
+    @action(detail=False, methods=['get'], url_path=r'import/(?P<task_id>[0-9a-f-]+)')
+    def import_status(self, request, task_id=None):
+        """Get the state and progress of a background import queued by the user."""
+        if cache.get(import_owner_key(task_id)) != request.user.id:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        task = AsyncResult(task_id)
+        info = task.info if isinstance(task.info, dict) else {}
+        return Response({'task_id': task_id, 'state': task.state, **info})
+
 
+def analytics_etag(request, *args, **kwargs):
+    """ETag of the analytics page, derived from the user's data version."""
+    if not request.user.is_authenticated:
+        return None
+    return f'analytics-v{ANALYTICS_SCHEMA_VERSION}-{request.user.id}-{request_data_version(request)}'
 
-@method_decorator(cache_page(60 * 15), name='dispatch')  # Cache for 15 minutes
+
+def analytics_last_modified(request, *args, **kwargs):
+    """Last-Modified of the analytics page: the user's last write."""
+    if not request.user.is_authenticated:
+        return None
+    return version_last_modified(request_data_version(request))
+
+
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(condition(etag_func=analytics_etag, last_modified_func=analytics_last_modified),
+                  name='dispatch')
 class PortfolioAnalyticsView(ListView):
     """
     Class-based view for portfolio analytics dashboard.
-    Caches the entire page for 15 minutes.
+    
+    The analytics are cached per user and data version for hours, and the
+    page carries an ETag and Last-Modified from the same version, so
+    browsers revalidating an unchanged page get a 304. They are computed
+    from a read replica unless the user just wrote.
     """
     model = Portfolio
     template_name = 'core/portfolio_analytics.html'
@@ -227,46 +499,31 @@ class PortfolioAnalyticsView(ListView):
     def get_context_data(self, **kwargs):
         """Add analytics data to context."""
         context = super().get_context_data(**kwargs)
+        if not self.request.user.is_authenticated:
+            context['analytics'] = {}
+            return context
         
-        # Get cached analytics or generate new ones
-        cache_key = f"portfolio_analytics_{self.request.user.id}"
+        cache_key = analytics_page_key(self.request.user.id, request_data_version(self.request))
         analytics = cache.get(cache_key)
-        
         if analytics is None:
-            analytics = self._generate_analytics()
-            cache.set(cache_key, analytics, 60 * 15)  # Cache for 15 minutes
+            with replica_reads(user_ids=[self.request.user.id]):
+                analytics = self._generate_analytics()
+            cache.set(cache_key, analytics, ANALYTICS_PAGE_TIMEOUT)
         
         context['analytics'] = analytics
         return context
     
     def _generate_analytics(self):
-        """Generate analytics data for the user's portfolios."""
+        """
+        Generate analytics data for the user's portfolios.
+        
+        The metrics come from the payload the analytics tasks precompute for
+        every user, which is only computed here when it is missing or stale.
+        """
         if not self.request.user.is_authenticated:
             return {}
         
-        portfolios = self.get_queryset()
-        investments = Investment.objects.filter(portfolio__in=portfolios)
-        transactions = Transaction.objects.filter(
-            investment__portfolio__in=portfolios
-        )
-        
-        # Basic portfolio metrics
-        total_portfolios = portfolios.count()
-        active_portfolios = portfolios.filter(is_active=True).count()
-        
-        # Investment metrics
-        total_investments = investments.count()
-        unique_symbols = investments.values('symbol').distinct().count()
-        
-        # Financial metrics
-        total_invested = investments.aggregate(
-            total=Sum(F('quantity') * F('purchase_price'))
-        )['total'] or 0
-        
-        # Transaction metrics
-        total_transactions = transactions.count()
-        buy_transactions = transactions.filter(transaction_type='buy').count()
-        sell_transactions = transactions.filter(transaction_type='sell').count()
+        payload = get_user_analytics(self.request.user)
         
         # Top performing symbols (mock data for now)
         top_symbols = [
@@ -317,15 +574,17 @@ class PortfolioAnalyticsView(ListView):
         }
         
         return {
+            # The precomputed payload only covers active portfolios, and so
+            # does every figure taken from it
             'overview': {
-                'total_portfolios': total_portfolios,
-                'active_portfolios': active_portfolios,
-                'total_investments': total_investments,
-                'unique_symbols': unique_symbols,
-                'total_invested': float(total_invested),
-                'total_transactions': total_transactions,
-                'buy_transactions': buy_transactions,
-                'sell_transactions': sell_transactions,
+                'total_portfolios': self.object_list.count(),
+                'active_portfolios': payload['portfolios_count'],
+                'active_investments': payload['investments_count'],
+                'active_unique_symbols': payload['unique_symbols'],
+                'active_invested': payload['total_invested'],
+                'active_transactions': payload['transactions_count'],
+                'active_buy_transactions': payload['buy_transactions'],
+                'active_sell_transactions': payload['sell_transactions'],
             },
             'top_symbols': top_symbols,
             'portfolio_performance': portfolio_performance,
@@ -354,9 +613,14 @@ def api_login(request):
     - 200: Successful authentication with user data and token
     - 400: Invalid credentials or missing fields
     - 401: Authentication failed
+    - 429: Too many recent attempts or failures for this IP or username
     """
     try:
         data = json.loads(request.body)
+        if not isinstance(data, dict):
+            return Response({
+                'error': 'Invalid JSON format'
+            }, status=status.HTTP_400_BAD_REQUEST)
         username = data.get('username')
         password = data.get('password')
         
@@ -364,6 +628,16 @@ def api_login(request):
             return Response({
                 'error': 'Username and password are required'
             }, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(username, str) or not isinstance(password, str):
+            return Response({
+                'error': 'Username and password must be strings'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Refuse throttled attempts before any query or password hashing
+        if login_throttled(get_client_ip(request), username):
+            return Response({
+                'error': 'Too many login attempts, please try again later'
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS)
         
         # Use Django's authenticate function which will use our custom backend
         user = authenticate(request=request, username=username, password=password)
@@ -476,6 +750,12 @@ def login_view(request):
         password = request.POST.get('password')
         
         if username and password:
+            if login_throttled(get_client_ip(request), username):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Too many login attempts, please try again later'
+                }, status=429)
+            
             # Use Django's authenticate function which will use our custom backend
             user = authenticate(request=request, username=username, password=password)
             
@@ -526,10 +806,14 @@ def dashboard_view(request):
     Protected dashboard view that requires authentication.
     """
     user = request.user
+    totals = Portfolio.objects.filter(user=user).aggregate(
+        portfolios_count=Count('id'),
+        investments_count=Sum('stats__investment_count'),
+    )
     context = {
         'user': user,
-        'portfolios_count': Portfolio.objects.filter(user=user).count(),
-        'investments_count': Investment.objects.filter(portfolio__user=user).count(),
+        'portfolios_count': totals['portfolios_count'],
+        'investments_count': totals['investments_count'] or 0,
     }
     return render(request, 'core/dashboard.html', context)
 
@@ -0,0 +1,169 @@
+"""
+Database settings for finflow, read from the environment.
+
+``DATABASE_URL`` selects the backend. Without it, finflow runs on SQLite at
+``db.sqlite3`` through the tuned ``finflow.sqlite`` backend. That suits
+development and single-node installs, but every write, Celery's included,
+still waits behind one lock. In production, point it at PostgreSQL::
+
+    DATABASE_URL=postgres://finflow:secret@db:5432/finflow?sslmode=require
+
+PostgreSQL connections are reused in one of two ways. Django cannot
+combine them:
+- With ``DATABASE_POOL_MAX_SIZE`` set, every web, ASGI and Celery process
+  keeps its own pool of up to that many connections, opened on first use.
+  psycopg and psycopg_pool come with ``requirements.txt``.
+- Otherwise each thread keeps its connection for ``DATABASE_CONN_MAX_AGE``
+  seconds.
+Either way, connections are checked before being reused.
+
+``DATABASE_REPLICA_URLS`` adds PostgreSQL read replicas, which
+``finflow.core.routers.ReplicaRouter`` sends heavy reads to.
+"""
+
+from urllib.parse import parse_qsl, unquote, urlsplit
+from django.core.exceptions import ImproperlyConfigured
+
+POSTGRES_SCHEMES = ('postgres', 'postgresql', 'pgsql')
+
+
+def _env_number(environ, name, default, cast=int):
+    value = environ.get(name, '')
+    if value == '':
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise ImproperlyConfigured(f"{name} must be a number, not {value!r}")
+
+
+def sqlite_config(path, busy_timeout=20, cache_size_kb=20000, mmap_size_mb=128):
+    """
+    Return the settings of a SQLite database tuned for concurrent access.
+
+    Connections open with the pragmas of ``finflow.sqlite``. WAL lets readers
+    carry on while a connection writes, and transactions take the write lock
+    when they begin. Otherwise, two transactions that both read first and
+    then write would deadlock. A connection waits up to ``busy_timeout``
+    seconds for the lock before failing with "database is locked".
+
+    Args:
+        path: Path of the database file
+        busy_timeout: Seconds to wait for another connection's write lock
+        cache_size_kb: Page cache of each connection in KiB
+        mmap_size_mb: Size of the file mapped into memory for reads, in MiB
+
+    Returns:
+        Dict for an entry of DATABASES
+    """
+    return {
+        'ENGINE': 'finflow.sqlite',
+        'NAME': path,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': int(busy_timeout * 1000),
+                # Negative sizes are in KiB rather than pages
+                'cache_size': -cache_size_kb,
+                'mmap_size': mmap_size_mb * 1024 * 1024,
+                # Keeps PRAGMA optimize on close cheap on large tables
+                'analysis_limit': 400,
+            },
+        },
+    }
+
+
+def postgres_config(url, conn_max_age=60, pool_min_size=2, pool_max_size=0, pool_timeout=10):
+    """
+    Return the settings of a PostgreSQL database from a ``postgres://`` URL.
+
+    Args:
+        url: URL of the database; query parameters such as ``sslmode`` are
+            passed on to psycopg
+        conn_max_age: Seconds a thread keeps its connection when not pooling
+        pool_min_size: Connections each process's pool keeps open
+        pool_max_size: Connections each process's pool opens at most; 0
+            disables pooling
+        pool_timeout: Seconds to wait for a free pooled connection
+
+    Returns:
+        Dict for an entry of DATABASES
+    """
+    parts = urlsplit(url)
+    options = dict(parse_qsl(parts.query))
+    if pool_max_size:
+        options['pool'] = {
+            'min_size': min(pool_min_size, pool_max_size),
+            'max_size': pool_max_size,
+            'timeout': pool_timeout,
+        }
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': unquote(parts.path.lstrip('/')),
+        'USER': unquote(parts.username or ''),
+        'PASSWORD': unquote(parts.password or ''),
+        'HOST': parts.hostname or '',
+        'PORT': str(parts.port or ''),
+        # Pooled connections go back to the pool after each request instead
+        'CONN_MAX_AGE': 0 if pool_max_size else conn_max_age,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': options,
+    }
+
+
+def database_from_environ(environ, default_sqlite_path):
+    """
+    Return the ``default`` database settings configured in the environment.
+
+    Args:
+        environ: Mapping of environment variables, e.g. os.environ
+        default_sqlite_path: SQLite file used when DATABASE_URL is unset
+
+    Returns:
+        Dict for DATABASES['default']
+    """
+    url = environ.get('DATABASE_URL', '')
+    scheme = urlsplit(url).scheme
+    if scheme in POSTGRES_SCHEMES:
+        return postgres_config(
+            url,
+            conn_max_age=_env_number(environ, 'DATABASE_CONN_MAX_AGE', 60),
+            pool_min_size=_env_number(environ, 'DATABASE_POOL_MIN_SIZE', 2),
+            pool_max_size=_env_number(environ, 'DATABASE_POOL_MAX_SIZE', 0),
+            pool_timeout=_env_number(environ, 'DATABASE_POOL_TIMEOUT', 10, float),
+        )
+
+    busy_timeout = _env_number(environ, 'SQLITE_BUSY_TIMEOUT', 20, float)
+    if not url:
+        return sqlite_config(default_sqlite_path, busy_timeout)
+    if scheme == 'sqlite':
+        # sqlite:////absolute/path.db or sqlite:///relative/path.db
+        return sqlite_config(unquote(url[len('sqlite:///'):]), busy_timeout)
+    raise ImproperlyConfigured(f"Unsupported DATABASE_URL scheme {scheme!r}; use postgres:// or sqlite:///")
+
+
+def replicas_from_environ(environ):
+    """
+    Return the read replica databases configured in the environment.
+
+    ``DATABASE_REPLICA_URLS`` lists the PostgreSQL replicas, separated by
+    commas. They share the connection settings of the primary, and test
+    runs mirror them to the test database rather than creating their own.
+
+    Args:
+        environ: Mapping of environment variables, e.g. os.environ
+
+    Returns:
+        Dict of DATABASES entries keyed by alias, ``replica_1`` onwards
+    """
+    urls = [url.strip() for url in environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    replicas = {}
+    for index, url in enumerate(urls, start=1):
+        if urlsplit(url).scheme not in POSTGRES_SCHEMES:
+            raise ImproperlyConfigured(f"DATABASE_REPLICA_URLS must list postgres:// URLs, not {url!r}")
+        replica = database_from_environ({**environ, 'DATABASE_URL': url}, None)
+        replica['TEST'] = {'MIRROR': 'default'}
+        replicas[f'replica_{index}'] = replica
+    return replicas
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from finflow.database import database_from_environ, replicas_from_environ
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -40,6 +43,7 @@ INSTALLED_APPS = [
     
     # Third-party apps
     'rest_framework',
+    'rest_framework.authtoken',
     'channels',
     'django_celery_beat',
     'django_celery_results',
@@ -80,14 +84,23 @@ WSGI_APPLICATION = 'finflow.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Set DATABASE_URL (and optionally DATABASE_POOL_MAX_SIZE or
+# DATABASE_CONN_MAX_AGE) to run on PostgreSQL; see finflow/database.py.
+# Without it, SQLite at db.sqlite3 is used in WAL mode.
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_environ(os.environ, BASE_DIR / 'db.sqlite3'),
+    **replicas_from_environ(os.environ),
 }
 
+# Read replicas from DATABASE_REPLICA_URLS. List and detail API reads, the
+# analytics page and the analytics and report tasks read from them, except
+# for users who wrote within the last REPLICA_STICKY_WINDOW seconds; keep
+# it above the replicas' usual replication lag
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['finflow.core.routers.ReplicaRouter']
+REPLICA_STICKY_WINDOW = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -147,7 +160,7 @@ AUTHENTICATION_BACKENDS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'finflow.core.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -156,11 +169,83 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# API token lookups: seconds a token stays resolved in the shared cache, and
+# the size and lifetime of each process's local LRU in front of it
+TOKEN_AUTH_CACHE_TIMEOUT = 60
+TOKEN_AUTH_LOCAL_CACHE_SIZE = 10000
+TOKEN_AUTH_LOCAL_CACHE_TIMEOUT = 5
+
+# Reverse proxies in front of finflow that append to X-Forwarded-For. Login
+# throttling reads the client IP that many entries from the right of the
+# header; with 0 the header is ignored and REMOTE_ADDR is used
+TRUSTED_PROXY_COUNT = 0
+
+# Failed logins counted per IP and per username over LOGIN_FAILURE_WINDOW
+# seconds; reaching either limit refuses further logins until failures age out
+LOGIN_FAILURE_WINDOW = 60 * 15
+LOGIN_FAILURE_LIMIT_PER_IP = 50
+LOGIN_FAILURE_LIMIT_PER_USERNAME = 10
+
+# Token buckets limiting all login attempts per IP and per username, shared
+# through the cache: up to BURST attempts at once, refilled at RATE per second
+LOGIN_ATTEMPT_BURST_PER_IP = 30
+LOGIN_ATTEMPT_RATE_PER_IP = 1
+LOGIN_ATTEMPT_BURST_PER_USERNAME = 10
+LOGIN_ATTEMPT_RATE_PER_USERNAME = 1 / 6
+
 # Channels
 ASGI_APPLICATION = 'finflow.asgi.application'
 
 # Redis Configuration
-REDIS_URL = 'redis://localhost:6379/0'
+REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+
+# Shared state for incremental portfolio analytics (dirty users, contributions)
+ANALYTICS_REDIS_URL = REDIS_URL
+
+# Cache
+# Shared cache every web, ASGI and Celery process reads and writes. It uses
+# REDIS_URL unless CACHE_REDIS_URL names another instance, e.g.
+# 'redis://cache-redis:6379/2'. CACHE_REDIS_URL=locmem:// opts into a
+# per-process in-memory cache for development without Redis, in which web
+# workers never see what Celery tasks cached. Test runs always use it:
+# manage.py test switches over in finflow.test_runner, and other runners,
+# such as pytest, need FINFLOW_TESTING=1.
+TESTING = os.environ.get('FINFLOW_TESTING') == '1'
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL') or REDIS_URL
+USE_LOCAL_CACHE = TESTING or CACHE_REDIS_URL == 'locmem://'
+
+# Whether every process reads and writes the same cache, which per-user data
+# versions rely on; a test run is a single process
+CACHE_IS_SHARED = TESTING or not USE_LOCAL_CACHE
+
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+TEST_RUNNER = 'finflow.test_runner.TestRunner'
+
+if not USE_LOCAL_CACHE:
+    CACHES = {
+        # Read-heavy keys are also kept in each process for a few seconds
+        'default': {
+            'BACKEND': 'finflow.core.cache_backends.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'L1_TIMEOUT': 5,
+                'L1_MAX_ENTRIES': 10000,
+                'L1_KEY_PREFIXES': ['auth_user_', 'portfolio_analytics_', 'portfolio_report_'],
+            },
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'finflow',
+        },
+    }
+else:
+    CACHES = LOCAL_CACHES
 
 # Celery Configuration
 CELERY_BROKER_URL = REDIS_URL
@@ -209,22 +294,76 @@ CELERY_TASK_QUEUES = {
         'exchange': 'monitoring',
         'routing_key': 'monitoring',
     },
+    'prices': {
+        'exchange': 'prices',
+        'routing_key': 'prices',
+    },
 }
 
 # Celery Task Routes
 CELERY_TASK_ROUTES = {
     'finflow.core.tasks.refresh_portfolio_analytics': {'queue': 'analytics'},
+    'finflow.core.tasks.rebuild_portfolio_analytics': {'queue': 'analytics'},
+    'finflow.core.tasks.refresh_user_analytics_chunk': {'queue': 'analytics'},
+    'finflow.core.tasks.reduce_portfolio_analytics': {'queue': 'analytics'},
     'finflow.core.tasks.cleanup_old_logs': {'queue': 'maintenance'},
     'finflow.core.tasks.health_check': {'queue': 'monitoring'},
+    'finflow.core.tasks.publish_price_ticks': {'queue': 'prices'},
     'finflow.core.tasks.*': {'queue': 'default'},
 }
 
-# Channels Configuration (using in-memory for testing)
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# Channels Configuration
+# Redis instances the channel layer shards channels and groups over, listed
+# in CHANNEL_REDIS_URLS separated by commas, e.g.
+# 'redis://ws-redis-1:6379/1,redis://ws-redis-2:6379/1'. Leave it unset to
+# use the in-memory layer, which only reaches consumers in the same process.
+CHANNEL_REDIS_HOSTS = [
+    url.strip() for url in os.environ.get('CHANNEL_REDIS_URLS', '').split(',') if url.strip()
+]
+
+if CHANNEL_REDIS_HOSTS:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': CHANNEL_REDIS_HOSTS,
+                'prefix': 'finflow',
+                'serializer_format': 'msgpack',
+                'capacity': 200,  # messages queued per channel before sends are dropped
+                'expiry': 10,  # seconds; a price tick is stale long before the default 60
+                'group_expiry': 86400,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+# Market price feed
+PRICE_SOURCE = 'finflow.core.prices.SimulatedPriceSource'
+PRICE_TICK_INTERVAL = 5  # seconds
+
+# Ticks queued within a flush are coalesced per symbol and sent as
+# concurrent group sends, at most this many at a time
+PRICE_FEED_SEND_CONCURRENCY = 50
+
+# Seconds between the full snapshots sent to clients receiving delta frames
+PORTFOLIO_SNAPSHOT_INTERVAL = 60
+
+# Frames that may wait for a slow WebSocket client before it is disconnected;
+# a newer tick replaces a waiting tick of the same symbol instead of queueing
+WEBSOCKET_OUTBOUND_QUEUE_SIZE = 256
+
+# Seconds a single WebSocket send may block before the client is disconnected
+WEBSOCKET_SLOW_CLIENT_TIMEOUT = 10
+
+# Publish ticks from a task inside each ASGI process. The in-memory channel
+# layer cannot reach other processes, so with Redis hosts configured the
+# publish_price_ticks beat task feeds the shared channel layer instead.
+PRICE_FEED_IN_PROCESS = not CHANNEL_REDIS_HOSTS
 
 # Logging Configuration
 LOGGING = {
@@ -239,11 +378,16 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'finflow.core.logs.JSONFormatter',
+        },
     },
+    # File handlers queue records for a background writer thread instead of
+    # writing on the request path
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'finflow.core.logs.QueueFileHandler',
             'filename': BASE_DIR / 'logs' / 'django.log',
             'formatter': 'verbose',
         },
@@ -254,9 +398,9 @@ LOGGING = {
         },
         'auth_file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'finflow.core.logs.QueueFileHandler',
             'filename': BASE_DIR / 'logs' / 'auth.log',
-            'formatter': 'verbose',
+            'formatter': 'json',
         },
     },
     'loggers': {
@@ -270,5 +414,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'finflow.core.throttling': {
+            'handlers': ['auth_file', 'console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
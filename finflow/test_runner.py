@@ -0,0 +1,25 @@
+"""
+Test runner for finflow.
+
+Settings pick the Redis cache unless told otherwise, and a test run should
+never need Redis or share its cache with a running instance. The runner
+switches every test over to the in-memory LOCAL_CACHES, which is shared by
+the whole run since it is a single process.
+"""
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner that runs the tests on a per-process in-memory cache."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.local_cache = override_settings(CACHES=settings.LOCAL_CACHES, CACHE_IS_SHARED=True)
+        self.local_cache.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.local_cache.disable()
+        super().teardown_test_environment(**kwargs)